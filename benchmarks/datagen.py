@@ -0,0 +1,159 @@
+# Deterministic synthetic data for the benchmark suite: the same seed and
+# scale always produce the same products, people and sales history.
+import datetime
+import math
+import random
+
+from supershop import CATEGORIES, EMPLOYEE_ROLES, PAYMENT_METHODS, WEIGHED_UNITS, writes
+from supershop.inventory import open_inventory
+from supershop.rollups import rebuild_rollups
+
+# ---------------- SCALES ----------------
+SCALES = {
+    "small":  dict(products=500,    customers=200,    employees=10, sales=5_000,   max_lines=5,  days=90),
+    "medium": dict(products=5_000,  customers=2_000,  employees=25, sales=50_000,  max_lines=8,  days=365),
+    "large":  dict(products=20_000, customers=10_000, employees=50, sales=200_000, max_lines=10, days=730),
+}
+SALES_CHUNK = 5_000  # sales written per transaction
+HISTORY_END = datetime.datetime(2024, 12, 31, 22, 0, 0)  # fixed so runs are comparable
+LOW_STOCK_SHARE = 0.02  # products generated below their minimum stock
+
+BRANDS = ["Pran", "Fresh", "Radhuni", "Aarong", "Walton", "Square", "ACI", "Bashundhara",
+          "Teer", "Meril", "Keya", "Olympic", "Ispahani", "Matador", "Deshi", "Partex"]
+ITEMS = {
+    "Food": ["Biscuit", "Noodles", "Chanachur", "Cake", "Juice", "Chocolate", "Jam", "Chips"],
+    "Electronics": ["Bulb", "Charger", "Cable", "Battery", "Fan", "Extension Board", "Earphone"],
+    "Clothing": ["Lungi", "Gamcha", "T-Shirt", "Socks", "Panjabi", "Scarf", "Cap"],
+    "Stationery": ["Pen", "Notebook", "Pencil", "Eraser", "Marker", "Stapler", "Glue"],
+    "Groceries": ["Rice", "Lentil", "Sugar", "Salt", "Flour", "Onion", "Potato", "Oil"],
+    "Toiletries": ["Soap", "Shampoo", "Toothpaste", "Detergent", "Lotion", "Tissue"],
+}
+CATEGORY_UNITS = {
+    "Food": ["pcs", "pack", "box"],
+    "Electronics": ["pcs", "box"],
+    "Clothing": ["pcs"],
+    "Stationery": ["pcs", "pack", "box"],
+    "Groceries": ["kg", "gm", "liter"],
+    "Toiletries": ["pcs", "ml", "pack"],
+}
+
+
+def barcode_for(index):
+    return str(8_900_000_000_000 + index)
+
+
+def product_rows(rng, count):
+    for i in range(count):
+        category = CATEGORIES[i % len(CATEGORIES)]
+        unit = rng.choice(CATEGORY_UNITS[category])
+        name = f"{rng.choice(BRANDS)} {rng.choice(ITEMS[category])} {i + 1}"
+        purchase = round(rng.uniform(10, 500), 2)
+        selling = round(purchase * rng.uniform(1.1, 1.4), 2)
+        minimum = float(rng.randint(5, 50))
+        # Almost everything is deeply stocked so the checkout scenario never runs dry
+        stock = float(rng.randint(0, 4)) if rng.random() < LOW_STOCK_SHARE else 1_000_000.0
+        yield (name, barcode_for(i), category, unit, purchase, selling, stock, minimum)
+
+
+def sale_quantity(rng, unit):
+    if unit in WEIGHED_UNITS:
+        return rng.choice([0.25, 0.5, 1.0, 2.0])
+    return float(rng.randint(1, 5))
+
+
+def cash_received(total):
+    # Customers hand over the next round hundred
+    return float(math.ceil(total / 100.0) * 100) if total else 0.0
+
+
+def sale_rows(rng, products, params):
+    # Yields (customer_id, employee_id, created_at, payment_method, lines) with
+    # lines as (product_id, name, unit, quantity, unit_price, unit_cost)
+    start = HISTORY_END - datetime.timedelta(days=params["days"])
+    span = int((HISTORY_END - start).total_seconds())
+    offsets = sorted(rng.randrange(span) for _ in range(params["sales"]))
+    for offset in offsets:
+        picked = rng.sample(products, rng.randint(1, min(params["max_lines"], len(products))))
+        lines = [(p["product_id"], p["name"], p["unit"], sale_quantity(rng, p["unit"]),
+                  p["selling_price"], p["purchase_price"]) for p in picked]
+        created_at = (start + datetime.timedelta(seconds=offset)).strftime("%Y-%m-%d %H:%M:%S")
+        yield (rng.randint(1, params["customers"]), rng.randint(1, params["employees"]),
+               created_at, rng.choice(PAYMENT_METHODS), lines)
+
+
+# ---------------- WRITE JOBS ----------------
+@writes("products")
+def insert_products(cursor, rows):
+    cursor.executemany("""
+        INSERT INTO products
+        (name, barcode, category, unit, purchase_price, selling_price, stock_quantity, minimum_stock)
+        VALUES (?,?,?,?,?,?,?,?)
+    """, rows)
+
+
+@writes("customers", "employees")
+def insert_people(cursor, customers, employees):
+    # Replaces the seeded walk-in customer and admin so ids run 1..n
+    cursor.execute("DELETE FROM customers")
+    cursor.execute("DELETE FROM employees")
+    cursor.executemany("INSERT INTO customers (customer_id, name, phone, address) VALUES (?,?,?,?)",
+                       customers)
+    cursor.executemany("INSERT INTO employees (employee_id, name, role, salary, hired_date) VALUES (?,?,?,?,?)",
+                       employees)
+    if cursor.dialect == "postgresql":
+        # Explicit ids don't advance SERIAL sequences
+        for table, column in (("customers", "customer_id"), ("employees", "employee_id")):
+            cursor.execute(f"SELECT setval(pg_get_serial_sequence('{table}', '{column}'), MAX({column})) FROM {table}")
+
+
+@writes("sales", "sale_items")
+def insert_sales(cursor, sales):
+    # Bypasses record_sale: history is loaded raw and the rollups rebuilt once at the end
+    for customer_id, employee_id, created_at, payment_method, lines in sales:
+        total = round(sum(qty * price for _, _, _, qty, price, _ in lines), 2)
+        received = cash_received(total) if payment_method == "Cash" else total
+        cursor.execute("""
+            INSERT INTO sales
+            (customer_id, employee_id, total_amount, payment_method, amount_received, change_amount, created_at)
+            VALUES (?,?,?,?,?,?,?)
+            RETURNING sale_id
+        """, (customer_id, employee_id, total, payment_method, received, received - total, created_at))
+        sale_id = cursor.fetchone()[0]
+        cursor.executemany("""
+            INSERT INTO sale_items
+            (sale_id, product_id, product_name, unit, quantity, unit_price, total_price, unit_cost)
+            VALUES (?,?,?,?,?,?,?,?)
+        """, [(sale_id, pid, name, unit, qty, price, qty * price, cost)
+              for pid, name, unit, qty, price, cost in lines])
+
+
+# ---------------- GENERATOR ----------------
+def populate(shop, params, seed=0):
+    # Fills a freshly migrated shop; returns the generated products as dicts
+    rng = random.Random(seed)
+    shop.db.write(insert_products, list(product_rows(rng, params["products"])))
+
+    customers = [(i, f"Customer {i}", f"01{rng.randint(300_000_000, 999_999_999)}", f"House {i}, Dhaka")
+                 for i in range(1, params["customers"] + 1)]
+    hired = HISTORY_END.date() - datetime.timedelta(days=params["days"])
+    employees = [(i, f"Employee {i}", EMPLOYEE_ROLES[i % len(EMPLOYEE_ROLES)],
+                  float(rng.randint(12, 40) * 1000), hired.isoformat())
+                 for i in range(1, params["employees"] + 1)]
+    shop.db.write(insert_people, customers, employees)
+
+    products = [dict(row) for row in shop.db.read_connection().execute(
+        "SELECT * FROM products ORDER BY product_id"
+    )]
+    chunk = []
+    for sale in sale_rows(rng, products, params):
+        chunk.append(sale)
+        if len(chunk) == SALES_CHUNK:
+            shop.db.write(insert_sales, chunk)
+            chunk = []
+    if chunk:
+        shop.db.write(insert_sales, chunk)
+
+    shop.db.write(rebuild_rollups)
+    shop.db.write(open_inventory)  # generated history predates the ledger, like a migrated shop's
+    shop.catalog.index.invalidate()
+    return products
@@ -0,0 +1,213 @@
+# Benchmark suite: builds a synthetic shop per scale and times the POS hot paths.
+#
+#     python -m benchmarks.run --scales small,medium
+#     python -m benchmarks.run --scales small --compare benchmarks/results/<earlier>.json
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+from supershop import WEIGHED_UNITS, Cart, Shop, generate_cash_memo_bytes, generate_receipt_escpos
+
+from .datagen import HISTORY_END, ITEMS, SCALES, cash_received, populate
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+DEFAULT_ITERATIONS = 200
+MEMO_ITERATIONS = 50  # PDF rendering is far slower than everything else
+
+
+# ---------------- TIMING ----------------
+def summarize(durations):
+    ordered = sorted(durations)
+    total = sum(ordered)
+
+    def pct(p):
+        return ordered[min(len(ordered) - 1, int(round(p * (len(ordered) - 1))))] * 1000
+
+    return {
+        "n": len(ordered),
+        "p50_ms": round(pct(0.50), 4),
+        "p95_ms": round(pct(0.95), 4),
+        "mean_ms": round(statistics.fmean(ordered) * 1000, 4),
+        "max_ms": round(ordered[-1] * 1000, 4),
+        "ops_per_sec": round(len(ordered) / total, 2) if total else None,
+    }
+
+
+def timed(fn, iterations, before=None):
+    # before() runs untimed ahead of every call, e.g. to drop the query cache
+    durations = []
+    for i in range(iterations):
+        if before is not None:
+            before()
+        start = time.perf_counter()
+        fn(i)
+        durations.append(time.perf_counter() - start)
+    return summarize(durations)
+
+
+# ---------------- SCENARIOS ----------------
+def random_cart(rng, products, max_lines):
+    cart = Cart()
+    for product in rng.sample(products, rng.randint(1, max_lines)):
+        cart.add(product, 0.5 if product["unit"] in WEIGHED_UNITS else rng.randint(1, 3))
+    return cart
+
+
+def run_scenarios(shop, products, params, iterations, seed):
+    rng = random.Random(seed + 1)
+    cold = shop.cache.invalidate  # dashboard/search numbers are for a cache miss
+    stocked = [p for p in products if p["stock_quantity"] > p["minimum_stock"]]
+    barcodes = [rng.choice(products)["barcode"] for _ in range(iterations)]
+    # Name fragments and partly typed barcodes: search matches term prefixes
+    terms = [rng.choice([rng.choice(words)[:4] for words in ITEMS.values()] +
+                        [rng.choice(products)["barcode"][:-2]])
+             for _ in range(iterations)]
+    carts = [random_cart(rng, stocked, params["max_lines"]) for _ in range(iterations)]
+    memo_carts = carts[:MEMO_ITERATIONS]
+
+    # Warm the product index so lookups are measured, not the initial load
+    shop.catalog.lookup_barcode(barcodes[0])
+
+    results = {}
+    results["barcode_lookup"] = timed(lambda i: shop.catalog.lookup_barcode(barcodes[i]), iterations)
+    results["product_search"] = timed(lambda i: shop.catalog.search(terms[i]), iterations, before=cold)
+
+    def confirm(i):
+        method = rng.choice(["Cash", "Card", "Bkash"])
+        received = cash_received(carts[i].total) if method == "Cash" else None
+        shop.checkout.confirm(carts[i], rng.randint(1, params["customers"]),
+                              rng.randint(1, params["employees"]), method, received)
+
+    results["confirm_sale"] = timed(confirm, iterations)
+
+    results["dashboard_totals"] = timed(lambda i: shop.reports.totals(), iterations, before=cold)
+    results["dashboard_revenue_by_product"] = timed(lambda i: shop.reports.revenue_by_product(),
+                                                    iterations, before=cold)
+    results["dashboard_daily_sales"] = timed(lambda i: shop.reports.daily_sales(), iterations, before=cold)
+
+    # Velocity window ending with the generated history rather than today
+    as_of = HISTORY_END.date()
+
+    def reorder_cold():
+        cold()
+        shop.reorder.invalidate()
+
+    def sell_one():
+        shop.checkout.confirm(random_cart(rng, stocked, 3), 1, 1, "Card")
+
+    results["reorder_full"] = timed(lambda i: shop.reorder.suggestions(as_of), iterations, before=reorder_cold)
+    results["reorder_after_sale"] = timed(lambda i: shop.reorder.suggestions(as_of), iterations, before=sell_one)
+
+    def dashboard_page(i):
+        shop.reports.totals()
+        shop.reports.revenue_by_product()
+        shop.reorder.suggestions(as_of)
+        shop.reports.daily_sales()
+
+    results["dashboard_page_cached"] = timed(dashboard_page, iterations)
+
+    # The generated history went in after migrations, so close it off as one
+    # shift first; then each shift holds the one sale made before it
+    shop.shifts.close(1, 0.0, 0.0)
+    results["shift_x_report"] = timed(lambda i: shop.shifts.current(), iterations, before=sell_one)
+    results["shift_close"] = timed(lambda i: shop.shifts.close(1, 0.0, 0.0), iterations, before=sell_one)
+
+    results["cash_memo"] = timed(
+        lambda i: generate_cash_memo_bytes(i + 1, "Customer", memo_carts[i].items,
+                                           memo_carts[i].total, "Cash"),
+        len(memo_carts)
+    )
+    results["thermal_receipt"] = timed(
+        lambda i: generate_receipt_escpos(i + 1, "Customer", memo_carts[i].items,
+                                          memo_carts[i].total, "Cash"),
+        len(memo_carts)
+    )
+    return results
+
+
+def run_scale(name, iterations, seed, workdir):
+    params = SCALES[name]
+    path = os.path.join(workdir, f"bench-{name}.db")
+    with Shop(path) as shop:
+        start = time.perf_counter()
+        products = populate(shop, params, seed)
+        setup = time.perf_counter() - start
+        scenarios = run_scenarios(shop, products, params, iterations, seed)
+    return {"params": params, "setup_seconds": round(setup, 3), "scenarios": scenarios}
+
+
+# ---------------- REPORTING ----------------
+def print_results(results, previous=None):
+    for scale, result in results.items():
+        print(f"\n== {scale} ({result['params']['sales']} sales, setup {result['setup_seconds']}s) ==")
+        print(f"{'scenario':32} {'p50 ms':>10} {'p95 ms':>10} {'ops/s':>10}  vs previous p50")
+        old = (previous or {}).get(scale, {}).get("scenarios", {})
+        for scenario, stats in result["scenarios"].items():
+            delta = ""
+            if scenario in old and old[scenario]["p50_ms"]:
+                delta = f"{stats['p50_ms'] / old[scenario]['p50_ms']:.2f}x"
+            print(f"{scenario:32} {stats['p50_ms']:>10.3f} {stats['p95_ms']:>10.3f} "
+                  f"{stats['ops_per_sec'] or 0:>10.1f}  {delta}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the Sarder Super Shop POS core.")
+    parser.add_argument("--scales", default="small,medium",
+                        help=f"comma-separated, from: {', '.join(SCALES)}")
+    parser.add_argument("--iterations", type=int, default=DEFAULT_ITERATIONS)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="JSON results file (default: benchmarks/results/<timestamp>.json)")
+    parser.add_argument("--compare", help="earlier JSON results to compare p50 against")
+    parser.add_argument("--workdir", help="keep the generated databases here instead of a temp dir")
+    args = parser.parse_args(argv)
+
+    scales = [s.strip() for s in args.scales.split(",") if s.strip()]
+    unknown = [s for s in scales if s not in SCALES]
+    if unknown:
+        parser.error(f"unknown scale(s): {', '.join(unknown)}")
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        workdir = args.workdir or tmp
+        os.makedirs(workdir, exist_ok=True)
+        for scale in scales:
+            print(f"Running {scale}...", file=sys.stderr)
+            results[scale] = run_scale(scale, args.iterations, args.seed, workdir)
+
+    report = {
+        "meta": {
+            "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+            "seed": args.seed,
+            "iterations": args.iterations,
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+        },
+        "results": results,
+    }
+
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, datetime.datetime.now().strftime("%Y%m%d-%H%M%S") + ".json")
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+
+    previous = None
+    if args.compare:
+        with open(args.compare) as f:
+            previous = json.load(f)["results"]
+    print_results(results, previous)
+    print(f"\nResults written to {output}")
+
+
+if __name__ == "__main__":
+    main()
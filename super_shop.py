@@ -1,187 +1,276 @@
 import streamlit as st
-import pandas as pd
 import plotly.express as px
-import sqlite3
-from fpdf import FPDF
 from PIL import Image
-from io import BytesIO
 import datetime
 import os
+import math
+
+from supershop import (CATEGORIES, UNITS, EMPLOYEE_ROLES, PAYMENT_METHODS, EXPORT_DATASETS,
+                       INTEGRITY_ERRORS, MEMO_FORMATS, WEIGHED_UNITS, Cart, CheckoutError,
+                       InventoryError, SHIFT_GROUPS, ShiftError, Shop, generate_receipt_escpos,
+                       generate_receipt_text, metrics, z_report_text)
+from supershop.archive import ARCHIVE_FORMATS, ArchiveError, parse_sale_ids
+from supershop.catalog import CATALOG_PAGE_SIZES, CATALOG_SORTS, IMPORT_COLUMNS, SEARCH_LIMIT
+
+# ---------------- POS CORE ----------------
+# Opened, configured and migrated once per process; every rerun reuses it.
+# Set SUPERSHOP_TILL=<name> to run this instance as an offline-tolerant till.
+@st.cache_resource
+def get_shop():
+    return Shop(till=os.environ.get("SUPERSHOP_TILL") or None)
+
+shop = get_shop()
+catalog = shop.catalog
+directory = shop.directory
+checkout = shop.checkout
+reports = shop.reports
+inventory = shop.inventory
+reorder = shop.reorder
+shifts = shop.shifts
+
+# ---------------- PRODUCT CATALOG ----------------
+def render_product_catalog(categories):
+    cols = st.columns([2, 2, 1, 1])
+    sort_label = cols[0].selectbox("Sort by", list(CATALOG_SORTS), key="catalog_sort")
+    category = cols[1].selectbox("Category", ["All"] + categories, key="catalog_category")
+    page_size = cols[2].selectbox("Page size", CATALOG_PAGE_SIZES, index=1, key="catalog_page_size")
+    low_stock = cols[3].checkbox("Low stock only", key="catalog_low_stock")
+
+    sort_column, direction = CATALOG_SORTS[sort_label]
+    category = None if category == "All" else category
+
+    # Stack of page-start keys; any filter change starts again from page 1
+    filters = (sort_label, category, page_size, low_stock)
+    if st.session_state.get("catalog_filters") != filters:
+        st.session_state.catalog_filters = filters
+        st.session_state.catalog_cursors = [None]
+    cursors = st.session_state.catalog_cursors
+
+    page, has_more = catalog.page(sort_column, direction, cursors[-1],
+                                  category, low_stock, page_size)
+    total = catalog.count(category, low_stock)
+
+    st.dataframe(page, use_container_width=True)
+
+    nav = st.columns([1, 1, 4])
+    if nav[0].button("◀ Previous", key="catalog_prev", disabled=len(cursors) == 1):
+        cursors.pop()
+        st.rerun()
+    if nav[1].button("Next ▶", key="catalog_next", disabled=not has_more):
+        last = page.iloc[-1]
+        # .item() turns numpy scalars back into plain values sqlite can bind
+        cursors.append(tuple(getattr(v, "item", lambda v=v: v)()
+                             for v in (last[sort_column], last['product_id'])))
+        st.rerun()
+    pages = max(1, math.ceil(total / page_size))
+    nav[2].caption(f"Page {len(cursors)} of {pages} · {total} products")
+
+# ---------------- POS PANELS ----------------
+# The scan panel and the cart each rerun on their own (st.fragment), so typing
+# a barcode or editing one cart line doesn't rerun the whole page. Line widgets
+# are keyed by product_id and write straight into the cart from their callbacks.
+def forget_line_widgets(product_id):
+    # Line widgets keep their own state; drop it when the cart changes the line
+    # elsewhere so the widgets pick up the cart's values on the next render
+    for key in (f"qty_{product_id}", f"price_{product_id}"):
+        st.session_state.pop(key, None)
+
+
+def update_cart_line(cart, product_id, weighed):
+    new_qty = st.session_state[f"qty_{product_id}"]
+    if weighed:
+        new_qty = new_qty / 1000
+    cart.set_line(product_id, new_qty, st.session_state[f"price_{product_id}"])
+    if cart.find(product_id) is None:
+        forget_line_widgets(product_id)
+
+
+def remove_cart_line(cart, product_id):
+    cart.remove(product_id)
+    forget_line_widgets(product_id)
+
+
+@st.fragment
+@metrics.instrument("fragment")
+def render_scan_panel(cart):
+    st.subheader("➕ Add Product to Cart")
+
+    if st.session_state.pop('cart_added', False):
+        st.success("✅ Product Added to Cart!")
+
+    selected_product = None
+
+    # --- Grocery dropdown
+    grocery_names = catalog.grocery_names()
+    if grocery_names:
+        product_name = st.selectbox("Select Grocery Product", [""] + grocery_names)
+
+        if product_name != "":
+            found = catalog.lookup_name(product_name)
+            if found is not None and found['category'] == 'Groceries':
+                selected_product = found
+            else:
+                st.error("❌ Grocery product not found!")
+
+    # --- Non-grocery barcode scanning
+    barcode = st.text_input("Scan Barcode (Non-Grocery)")
+    if barcode:
+        found = catalog.lookup_barcode(barcode)
+        if found is not None and found['category'] != 'Groceries':
+            selected_product = found
+        else:
+            st.error("❌ Product not found!")
+
+    # --- Quantity input and Add to Cart ---
+    if selected_product is not None:
+        st.success(f"Product: {selected_product['name']}")
+        st.write(f"Price: ৳{selected_product['selling_price']} per {selected_product['unit']}")
+
+        # Quantity input
+        if selected_product['unit'] in WEIGHED_UNITS:
+            grams = st.number_input("Quantity in grams", min_value=0.0, step=50.0)
+            qty = grams / 1000
+        else:
+            qty = st.number_input("Quantity (pcs)", min_value=1, step=1)
+
+        if st.button("Add Product"):
+
+            if qty <= 0:
+                st.warning("Please enter valid quantity.")
+            elif qty > float(selected_product['stock_quantity']):
+                st.warning("Not enough stock available!")
+            else:
+                cart.add(selected_product, qty)
+                forget_line_widgets(selected_product['product_id'])
+                st.session_state.cart_added = True
+                st.rerun()  # the cart panel is a separate fragment
+
+
+@st.fragment
+@metrics.instrument("fragment")
+def render_cart_panel(cart, customer, customer_id, employee_id):
+    if not cart:
+        return
+
+    st.subheader("🛒 Cart Items")
+
+    for item in cart:
+        product_id = item['product_id']
+        weighed = item['unit'] in WEIGHED_UNITS
+        cols = st.columns([2,1,1,1,1,1])
+        cols[0].write(item['product'])
+        cols[1].write(item['unit'])
+
+        if weighed:
+            cols[2].number_input(
+                "Grams",
+                value=float(item['quantity']) * 1000,
+                step=50.0,
+                key=f"qty_{product_id}",
+                on_change=update_cart_line,
+                args=(cart, product_id, weighed)
+            )
+        else:
+            cols[2].number_input(
+                "Qty",
+                value=int(item['quantity']),
+                step=1,
+                key=f"qty_{product_id}",
+                on_change=update_cart_line,
+                args=(cart, product_id, weighed)
+            )
+
+        cols[3].number_input(
+            "Price",
+            value=float(item['unit_price']),
+            key=f"price_{product_id}",
+            on_change=update_cart_line,
+            args=(cart, product_id, weighed)
+        )
+
+        cols[4].write(f"{item['total_price']:.2f}")
+
+        cols[5].button("❌", key=f"remove_{product_id}",
+                       on_click=remove_cart_line, args=(cart, product_id))
+
+    if not cart:
+        return  # a quantity set to 0 emptied it
+
+    total = cart.total
+    st.metric("Total Amount", f"{total:.2f}")
+
+    # ---------------- PAYMENT ----------------
+    payment_method = st.selectbox("Payment Method", PAYMENT_METHODS)
+
+    amount_received = 0.0
+    change_amount = 0.0
+
+    if payment_method == "Cash":
+        amount_received = st.number_input("Amount Received", 0.0)
+
+        if amount_received >= total:
+            change_amount = amount_received - total
+            st.success(f"Change: {change_amount:.2f}")
+        else:
+            st.warning("Insufficient cash!")
+    else:
+        amount_received = total
+        st.info(f"Paid via {payment_method}")
+
+    memo_format = st.radio("Memo", MEMO_FORMATS, horizontal=True, key="memo_format")
+
+    # ---------------- CANCEL ----------------
+    if st.button("Cancel Sale"):
+        cart.clear()
+        st.success("Sale Cancelled ✅")
+
+    # ---------------- CONFIRM ----------------
+    if st.button("Confirm Sale"):
+
+        if payment_method == "Cash" and amount_received < total:
+            st.error("❌ Insufficient cash received!")
+            return
+
+        try:
+            if shop.till is not None:
+                # Journaled locally; the sync worker records it centrally
+                sale_id = shop.till.receipt_number(
+                    shop.till.confirm(cart, customer_id, employee_id,
+                                      payment_method, amount_received))
+            else:
+                sale_id = checkout.confirm(cart, customer_id, employee_id,
+                                           payment_method, amount_received)
+
+            if memo_format == "80 mm receipt":
+                # Plain text, no PDF: shown right away, downloaded as ESC/POS for the printer
+                st.code(generate_receipt_text(sale_id, customer, cart.items, total, payment_method))
+                st.download_button(
+                    "🧾 Download Receipt (ESC/POS)",
+                    generate_receipt_escpos(sale_id, customer, cart.items, total, payment_method),
+                    file_name=f"SSS-{sale_id}.prn",
+                    mime="application/octet-stream"
+                )
+            else:
+                # Cash memo PDF, rendered in the background; the download waits for it
+                memo = shop.memos.submit(sale_id, customer, cart.items, total, payment_method)
+                st.download_button(
+                    "📥 Download Cash Memo",
+                    memo.result,
+                    file_name=f"SSS-{sale_id}.pdf",
+                    mime="application/pdf"
+                )
+
+            cart.clear()
+            st.success("✅ Sale Completed Successfully!")
+
+        except CheckoutError as e:
+            st.error("❌ Sale not completed:")
+            for failure in e.failures:
+                st.error(f"• {failure}")
+        except Exception as e:
+            st.error(f"❌ Error: {e}")
 
-# ---------------- DATABASE CONNECTION ----------------
-def get_connection():
-    conn = sqlite3.connect("supershop.db", check_same_thread=False)
-    conn.row_factory = sqlite3.Row  # allows dict-like access
-    return conn
-
-conn = get_connection()
-cursor = conn.cursor()
-
-# ---------------- CREATE TABLES IF NOT EXISTS ----------------
-cursor.execute("""
-CREATE TABLE IF NOT EXISTS products(
-    product_id INTEGER PRIMARY KEY AUTOINCREMENT,
-    name TEXT,
-    barcode TEXT UNIQUE,
-    category TEXT,
-    unit TEXT,
-    purchase_price REAL,
-    selling_price REAL,
-    stock_quantity REAL,
-    minimum_stock REAL
-)
-""")
-
-cursor.execute("""
-CREATE TABLE IF NOT EXISTS customers(
-    customer_id INTEGER PRIMARY KEY AUTOINCREMENT,
-    name TEXT,
-    phone TEXT,
-    address TEXT,
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-)
-""")
-
-cursor.execute("""
-CREATE TABLE IF NOT EXISTS employees(
-    employee_id INTEGER PRIMARY KEY AUTOINCREMENT,
-    name TEXT,
-    role TEXT,
-    salary REAL,
-    hired_date DATE
-)
-""")
-
-cursor.execute("""
-CREATE TABLE IF NOT EXISTS suppliers(
-    supplier_id INTEGER PRIMARY KEY AUTOINCREMENT,
-    name TEXT,
-    phone TEXT,
-    address TEXT
-)
-""")
-
-cursor.execute("""
-CREATE TABLE IF NOT EXISTS sales(
-    sale_id INTEGER PRIMARY KEY AUTOINCREMENT,
-    customer_id INTEGER,
-    employee_id INTEGER,
-    total_amount REAL,
-    payment_method TEXT,
-    amount_received REAL,
-    change_amount REAL,
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-)
-""")
-
-cursor.execute("""
-CREATE TABLE IF NOT EXISTS sale_items(
-    item_id INTEGER PRIMARY KEY AUTOINCREMENT,
-    sale_id INTEGER,
-    product_id INTEGER,
-    quantity REAL,
-    unit_price REAL,
-    total_price REAL
-)
-""")
-conn.commit()
-# ---------------- AUTO INSERT DEFAULT DATA ----------------
-def seed_default_data():
-
-    # Default Customer
-    cursor.execute("SELECT COUNT(*) FROM customers")
-    if cursor.fetchone()[0] == 0:
-        cursor.execute("""
-            INSERT INTO customers (name, phone, address)
-            VALUES ('Walk-in Customer', 'N/A', 'Local')
-        """)
-
-    # Default Employee
-    cursor.execute("SELECT COUNT(*) FROM employees")
-    if cursor.fetchone()[0] == 0:
-        cursor.execute("""
-            INSERT INTO employees (name, role, salary, hired_date)
-            VALUES ('Admin', 'Manager', 0, DATE('now'))
-        """)
-
-    conn.commit()
-
-seed_default_data()
-from fpdf import FPDF
-from io import BytesIO
-import os
-import datetime
 
-# ---------------- CASH MEMO FUNCTION ----------------
-def generate_cash_memo_bytes(sale_id, customer_name, cart_items, total_amount, payment_method):
-    pdf = FPDF()
-    pdf.set_auto_page_break(auto=True, margin=15)
-    pdf.add_page()
-
-    # -------- LOGO --------
-    if os.path.exists("Sarder Super Shop logo design.png"):
-        pdf.image("Sarder Super Shop logo design.png", x=10, y=8, w=30)
-        pdf.ln(20)
-
-    # -------- SHOP HEADER --------
-    pdf.set_font("Arial", 'B', 18)
-    pdf.cell(0, 10, "SARDER SUPER SHOP", ln=True, align='C')
-    pdf.set_font("Arial", '', 11)
-    pdf.cell(0, 6, "Kaligonj Bazar, Kalkini, Madaripur", ln=True, align='C')
-    pdf.cell(0, 6, "Mobile: 01922388130", ln=True, align='C')
-    pdf.cell(0, 6, "Email: mdarafathossen62@gmail.com", ln=True, align='C')
-    pdf.ln(5)
-
-    pdf.set_font("Arial", 'B', 12)
-    pdf.cell(0, 8, "CASH MEMO / INVOICE", ln=True, align='C')
-    pdf.ln(5)
-
-    # -------- INVOICE INFO --------
-    pdf.set_font("Arial", '', 11)
-    pdf.cell(95, 6, f"Invoice No: SSS-{sale_id}")
-    pdf.cell(95, 6, f"Date: {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}", ln=True)
-    pdf.cell(95, 6, f"Customer: {customer_name}")
-    pdf.cell(95, 6, f"Payment Method: {payment_method}", ln=True)
-    pdf.ln(8)
-
-    # -------- TABLE HEADER --------
-    pdf.set_font("Arial", 'B', 11)
-    pdf.cell(60, 8, "Product", 1)
-    pdf.cell(25, 8, "Unit", 1, align='C')
-    pdf.cell(25, 8, "Qty", 1, align='C')
-    pdf.cell(30, 8, "Unit Price", 1, align='C')
-    pdf.cell(30, 8, "Total", 1, align='C')
-    pdf.ln()
-
-    # -------- TABLE BODY --------
-    pdf.set_font("Arial", '', 10)
-    for item in cart_items:
-        pdf.cell(60, 8, str(item['product']), 1)
-        pdf.cell(25, 8, str(item['unit']), 1, align='C')
-        pdf.cell(25, 8, f"{item['quantity']}", 1, align='C')
-        pdf.cell(30, 8, f"{item['unit_price']:.2f}", 1, align='R')
-        pdf.cell(30, 8, f"{item['total_price']:.2f}", 1, align='R')
-        pdf.ln()
-
-    # -------- GRAND TOTAL --------
-    pdf.set_font("Arial", 'B', 13)
-    pdf.cell(110, 10, "")
-    pdf.cell(40, 10, "GRAND TOTAL", 1)
-    pdf.cell(30, 10, f"{total_amount:.2f}", 1, align='R')
-    pdf.ln(15)
-
-    # -------- FOOTER --------
-    pdf.set_font("Arial", 'I', 10)
-    pdf.cell(0, 6, "----------------------------------------------", ln=True, align='C')
-    pdf.cell(0, 6, "Thank You For Shopping With Us!", ln=True, align='C')
-    pdf.cell(0, 6, "Goods once sold are not refundable without receipt.", ln=True, align='C')
-    pdf.cell(0, 6, "Powered by Sarder POS System", ln=True, align='C')
-
-    # -------- FIXED: Save PDF to BytesIO --------
-    pdf_str = pdf.output(dest='S').encode('latin1')  # returns PDF as bytes
-    pdf_bytes = BytesIO(pdf_str)
-    pdf_bytes.seek(0)
-    return pdf_bytes
 # ---------------- HEADER ----------------
 st.set_page_config(page_title="SARDER SUPER SHOP", layout="wide")
 if os.path.exists("Sarder Super Shop logo design.png"):
@@ -197,10 +286,13 @@ else:
     st.caption("Super Shop Management System")
 
 menu = st.sidebar.selectbox("Select Module",
-                            ["Products","Customers","Employees","Suppliers","Sales","Dashboard"])
+                            ["Products","Customers","Employees","Suppliers","Inventory","Sales","Shift Close",
+                             "Dashboard","Diagnostics"])
+
 
 # ================= PRODUCTS =================
-if menu == "Products":
+@metrics.instrument("rerun", "Products")
+def products_page():
     st.header("📦 Product Management")
 
     # ---------- ADD PRODUCT ----------
@@ -209,10 +301,10 @@ if menu == "Products":
     name = st.text_input("Product Name", key="add_name")
     barcode = st.text_input("Barcode (Unique for scanning)", key="add_barcode")
 
-    category_list = ["Food","Electronics","Clothing","Stationery","Groceries","Toiletries"]
+    category_list = CATEGORIES
     category = st.selectbox("Category", category_list, key="add_category")
 
-    unit_list = ["pcs","kg","gm","liter","ml","pack","box","cup"]
+    unit_list = UNITS
     unit = st.selectbox("Unit", unit_list, key="add_unit")
 
     purchase_price = st.number_input("Purchase Price", 0.0, key="add_purchase")
@@ -221,23 +313,52 @@ if menu == "Products":
     minimum_stock = st.number_input("Minimum Stock", 0, key="add_min")
 
     if st.button("Add Product", key="add_btn"):
-        cursor.execute("SELECT 1 FROM products WHERE barcode=?", (barcode,))
-        if cursor.fetchone():
+        if catalog.barcode_exists(barcode):
             st.warning("This barcode already exists! Use a unique barcode.")
         elif not name or not barcode:
             st.warning("Product Name and Barcode are required!")
         else:
-            cursor.execute("""
-                INSERT INTO products
-                (name, barcode, category, unit, purchase_price, selling_price, stock_quantity, minimum_stock)
-                VALUES (?,?,?,?,?,?,?,?)
-            """, (name, barcode, category, unit,
-                  purchase_price, selling_price,
-                  stock_quantity, minimum_stock))
-            conn.commit()
+            try:
+                catalog.add(name, barcode, category, unit,
+                            purchase_price, selling_price,
+                            stock_quantity, minimum_stock)
+            except INTEGRITY_ERRORS:
+                # Another till registered the same barcode after our check
+                st.warning("This barcode already exists! Use a unique barcode.")
+                st.stop()
             st.success("Product Added Successfully!")
             st.rerun()
 
+    # ---------- BULK IMPORT ----------
+    with st.expander("📥 Bulk Import Products (CSV / Excel)"):
+        st.caption(
+            "Columns: " + ", ".join(IMPORT_COLUMNS) + ". "
+            "Existing barcodes are updated; blank numbers keep the current value."
+        )
+        upload = st.file_uploader("Product file", type=["csv", "xlsx"], key="import_file")
+
+        if upload is not None and st.button("Import Products", key="import_btn"):
+            bar = st.progress(0.0)
+
+            def report(fraction, stats):
+                bar.progress(fraction, text=f"{stats['imported']} imported, {stats['rejected']} rejected")
+
+            try:
+                stats, rejected_csv = catalog.import_file(upload, upload.name, category_list, unit_list,
+                                                          progress=report)
+            except ValueError as e:
+                st.error(f"❌ {e}")
+            else:
+                st.success(f"✅ Imported {stats['imported']} products, rejected {stats['rejected']}.")
+                if rejected_csv:
+                    st.download_button(
+                        "📥 Download Rejected Rows",
+                        rejected_csv,
+                        file_name="rejected_products.csv",
+                        mime="text/csv",
+                        key="import_rejected"
+                    )
+
     st.markdown("---")
 
     # ---------- SEARCH PRODUCT ----------
@@ -245,15 +366,11 @@ if menu == "Products":
     search = st.text_input("Search by name or barcode", key="search_box")
 
     if search:
-        products_df = pd.read_sql(
-            "SELECT * FROM products WHERE name LIKE ? OR barcode LIKE ?",
-            conn,
-            params=(f"%{search}%", f"%{search}%")
-        )
+        products_df = catalog.search(search)
+        st.caption(f"Showing the best {len(products_df)} matches (max {SEARCH_LIMIT}).")
+        st.dataframe(products_df, use_container_width=True)
     else:
-        products_df = pd.read_sql("SELECT * FROM products", conn)
-
-    st.dataframe(products_df, use_container_width=True)
+        st.caption("Type a name, barcode or category. Browse everything in the Product List below.")
 
     st.markdown("---")
 
@@ -268,11 +385,10 @@ if menu == "Products":
     )
 
     if st.button("Load Product", key="load_btn"):
-        cursor.execute("SELECT * FROM products WHERE product_id=?", (product_id,))
-        product = cursor.fetchone()
+        product = catalog.get(product_id)
 
         if product:
-            st.session_state.edit_product = dict(product)
+            st.session_state.edit_product = product
         else:
             st.warning("Product not found!")
 
@@ -324,25 +440,17 @@ if menu == "Products":
 
             # ✅ Only check duplicate if barcode changed
             if new_barcode != ep["barcode"]:
-                cursor.execute(
-                    "SELECT 1 FROM products WHERE barcode=?",
-                    (new_barcode,)
-                )
-                if cursor.fetchone():
+                if catalog.barcode_exists(new_barcode):
                     st.warning("This barcode already exists!")
                     st.stop()
 
-            cursor.execute("""
-                UPDATE products SET
-                name=?, barcode=?, category=?, unit=?,
-                purchase_price=?, selling_price=?,
-                stock_quantity=?, minimum_stock=?
-                WHERE product_id=?
-            """, (
-                new_name, new_barcode, new_category, new_unit,
-                new_purchase, new_selling, new_stock, new_min, product_id
-            ))
-            conn.commit()
+            try:
+                catalog.update(product_id,
+                               new_name, new_barcode, new_category, new_unit,
+                               new_purchase, new_selling, new_stock, new_min)
+            except INTEGRITY_ERRORS:
+                st.warning("This barcode already exists!")
+                st.stop()
 
             st.success("Product Updated!")
             st.session_state.pop("edit_product")
@@ -366,8 +474,7 @@ if menu == "Products":
         if not confirm_delete:
             st.warning("Please confirm deletion!")
         else:
-            cursor.execute("DELETE FROM products WHERE product_id=?", (del_id,))
-            conn.commit()
+            catalog.delete(del_id)
             st.success("Product Deleted!")
             st.rerun()
 
@@ -375,14 +482,12 @@ if menu == "Products":
 
     # ---------- PRODUCT LIST ----------
     st.subheader("📋 Product List")
+    render_product_catalog(category_list)
+
 
-    products_df = pd.read_sql(
-        "SELECT * FROM products ORDER BY product_id DESC",
-        conn
-    )
-    st.dataframe(products_df, use_container_width=True)
 # ================= CUSTOMERS =================
-elif menu == "Customers":
+@metrics.instrument("rerun", "Customers")
+def customers_page():
     st.header("👤 Add Customer")
 
     cust_name = st.text_input("Customer Name", key="cust_name")
@@ -393,43 +498,39 @@ elif menu == "Customers":
         if not cust_name:
             st.warning("Customer name required!")
         else:
-            cursor.execute(
-                "INSERT INTO customers (name, phone, address) VALUES (?,?,?)",
-                (cust_name, phone, address)
-            )
-            conn.commit()
+            directory.add_customer(cust_name, phone, address)
             st.success("Customer Added Successfully!")
             st.rerun()
 
     st.subheader("Customer List")
 
-    customers_df = pd.read_sql(
-        "SELECT * FROM customers ORDER BY customer_id DESC",
-        conn
-    )
+    customers_df = directory.customers()
     st.dataframe(customers_df, use_container_width=True)
 
+
 # ================= EMPLOYEES =================
-elif menu == "Employees":
+@metrics.instrument("rerun", "Employees")
+def employees_page():
     st.header("👨‍💼 Add Employee")
     name = st.text_input("Employee Name")
-    role = st.selectbox("Role", ["Manager", "Cashier", "Salesman"])
+    role = st.selectbox("Role", EMPLOYEE_ROLES)
     salary = st.number_input("Salary", 0.0)
     hired_date = st.date_input("Hired Date")
     if st.button("Add Employee"):
         if not name:
             st.warning("Employee name required!")
         else:
-            cursor.execute("INSERT INTO employees (name, role, salary, hired_date) VALUES (?,?,?,?)", (name, role, salary, hired_date))
-            conn.commit()
+            directory.add_employee(name, role, salary, hired_date)
             st.success("Employee Added Successfully!")
             st.rerun()
     st.subheader("Employee List")
-    employees_df = pd.read_sql("SELECT * FROM employees ORDER BY employee_id DESC", conn)
+    employees_df = directory.employees()
     st.dataframe(employees_df)
 
+
 # ================= SUPPLIERS =================
-elif menu == "Suppliers":
+@metrics.instrument("rerun", "Suppliers")
+def suppliers_page():
     st.header("🚚 Add Supplier")
     name = st.text_input("Supplier Name")
     phone = st.text_input("Phone")
@@ -438,41 +539,125 @@ elif menu == "Suppliers":
         if not name:
             st.warning("Supplier name required!")
         else:
-            cursor.execute("INSERT INTO suppliers (name, phone, address) VALUES (?,?,?)", (name, phone, address))
-            conn.commit()
+            directory.add_supplier(name, phone, address)
             st.success("Supplier Added Successfully!")
             st.rerun()
     st.subheader("Supplier List")
-    suppliers_df = pd.read_sql("SELECT * FROM suppliers ORDER BY supplier_id DESC", conn)
+    suppliers_df = directory.suppliers()
     st.dataframe(suppliers_df)
 
+
+# ================= INVENTORY =================
+@metrics.instrument("rerun", "Inventory")
+def inventory_page():
+    st.header("📦 Inventory")
+
+    # ---------- RECEIVE FROM SUPPLIER ----------
+    st.subheader("🚚 Receive Stock")
+    suppliers_df = directory.suppliers()
+
+    if suppliers_df.empty:
+        st.info("Add a supplier first to receive stock.")
+    else:
+        supplier_names = dict(zip(suppliers_df['supplier_id'].astype(int), suppliers_df['name']))
+        supplier_id = st.selectbox("Supplier", list(supplier_names),
+                                   format_func=supplier_names.get, key="recv_supplier")
+        recv_id = st.number_input("Product ID", min_value=0, step=1, key="recv_product")
+        recv_qty = st.number_input("Quantity Received", min_value=0.0, step=1.0, key="recv_qty")
+        recv_cost = st.number_input("Unit Cost (0 keeps the current purchase price)",
+                                    min_value=0.0, key="recv_cost")
+        recv_note = st.text_input("Note (e.g. invoice number)", key="recv_note")
+
+        if st.button("Receive Stock", key="recv_btn"):
+            if recv_qty <= 0:
+                st.warning("Please enter valid quantity.")
+            else:
+                try:
+                    inventory.receive(supplier_id, [(int(recv_id), recv_qty, recv_cost or None)],
+                                      recv_note or None)
+                    st.success("Stock Received!")
+                except InventoryError as e:
+                    st.warning(str(e))
+
+    st.markdown("---")
+
+    # ---------- ADJUSTMENT / RETURN ----------
+    st.subheader("🧮 Stock Adjustment / Return")
+    adj_id = st.number_input("Product ID", min_value=0, step=1, key="adj_product")
+    adj_type = st.radio("Type", ["adjustment", "return"], format_func=str.capitalize,
+                        horizontal=True, key="adj_type")
+    adj_qty = st.number_input("Quantity Change (+ adds to stock, - removes)", value=0.0,
+                              step=1.0, key="adj_qty")
+    adj_note = st.text_input("Reason", key="adj_note")
+
+    if st.button("Apply", key="adj_btn"):
+        if adj_qty == 0:
+            st.warning("Please enter valid quantity.")
+        else:
+            try:
+                inventory.adjust(int(adj_id), adj_qty, adj_type, adj_note or None)
+                st.success("Stock Updated!")
+            except InventoryError as e:
+                st.warning(str(e))
+
+    st.markdown("---")
+
+    # ---------- MOVEMENT HISTORY ----------
+    st.subheader("📜 Stock Movements")
+    hist_id = st.number_input("Product ID (0 for all products)", min_value=0, step=1, key="hist_product")
+    st.dataframe(inventory.movements(int(hist_id) or None), use_container_width=True)
+
+    # ---------- STOCK ON A PAST DATE ----------
+    st.subheader("📅 Closing Stock on a Date")
+    stock_date = st.date_input("Date", datetime.date.today(), key="stock_date")
+    st.dataframe(inventory.stock_levels(stock_date + datetime.timedelta(days=1)),
+                 use_container_width=True)
+
+
 # ================= SALES / POS =================
-elif menu == "Sales":
+@metrics.instrument("rerun", "Sales")
+def sales_page():
     st.header("🛒 POS Billing")
 
+    if shop.till is not None:
+        waiting = shop.till.pending_count()
+        st.caption(f"Till {shop.till.name}: {waiting} sale(s) waiting to sync")
+        conflicts = shop.till.conflicts()
+        if conflicts:
+            st.warning(f"{len(conflicts)} offline sale(s) could not be recorded, please review:")
+            for conflict in conflicts:
+                st.write(f"• {conflict['created_at']} {shop.till.receipt_number(conflict['sale_uuid'])}: "
+                         + "; ".join(conflict['failures']))
+
     # ---------------- LOAD DATA ----------------
-    customers_df = pd.read_sql("SELECT customer_id,name FROM customers", conn)
-    employees_df = pd.read_sql("SELECT employee_id,name FROM employees", conn)
-    products_df = pd.read_sql("SELECT * FROM products", conn)
+    # A till reads its local copy, so a sale never waits on the shared database
+    people = shop.till if shop.till is not None else directory
+    employees_df = people.employee_choices()
 
     # ---------------- SAFETY CHECK ----------------
-    if customers_df.empty or employees_df.empty or products_df.empty:
+    if not people.has_customers() or employees_df.empty or catalog.is_empty():
         st.error("Database tables are empty! Please check your data.")
         st.stop()
 
     # ---------------- CUSTOMER / EMPLOYEE ----------------
-    customer = st.selectbox("Customer", [""] + list(customers_df['name']))
+    # Customers are found by phone or name prefix and picked by id, so the
+    # list stays short and customers sharing a name stay apart
+    customer_query = st.text_input("Find Customer (phone or name)")
+    customer_matches = people.find_customers(customer_query)
+    customer_names = {}
+    customer_labels = {}
+    for cid, name, phone in customer_matches.itertuples(index=False):
+        customer_names[int(cid)] = name
+        customer_labels[int(cid)] = f"{name} ({phone})" if phone else name
+
+    customer_id = st.selectbox("Customer", [None] + list(customer_labels),
+                               format_func=lambda cid: "" if cid is None else customer_labels[cid])
     employee = st.selectbox("Employee", [""] + list(employees_df['name']))
 
-    if customer == "" or employee == "":
+    if customer_id is None or employee == "":
         st.warning("Please select a customer and an employee to continue.")
         st.stop()
-
-    customer_row = customers_df[customers_df['name'] == customer]
-    if customer_row.empty:
-        st.error("Selected customer not found in database!")
-        st.stop()
-    customer_id = int(customer_row['customer_id'].iloc[0])
+    customer = customer_names[customer_id]
 
     employee_row = employees_df[employees_df['name'] == employee]
     if employee_row.empty:
@@ -482,233 +667,93 @@ elif menu == "Sales":
 
     # ---------------- INITIALIZE CART ----------------
     if 'cart' not in st.session_state:
-        st.session_state.cart = []
+        st.session_state.cart = Cart()
+    cart = st.session_state.cart
 
-    # ---------------- ADD PRODUCT ----------------
-    st.subheader("➕ Add Product to Cart")
+    render_scan_panel(cart)
+    render_cart_panel(cart, customer, customer_id, employee_id)
 
-    # Split products
-    groceries = products_df[products_df['category'] == 'Groceries']
-    non_groceries = products_df[products_df['category'] != 'Groceries']
 
-    selected_product = None
-    selected_product_id = None
+# ================= SHIFT CLOSE =================
+@metrics.instrument("rerun", "Shift Close")
+def shift_close_page():
+    st.header("🧾 Shift Close")
 
-    # --- Grocery dropdown
-    if not groceries.empty:
-        grocery_list = [""] + list(groceries['name'].dropna().unique())
-        product_name = st.selectbox("Select Grocery Product", grocery_list)
+    closed_id = st.session_state.pop('shift_closed', None)
+    if closed_id is not None:
+        st.success(f"✅ Shift #{closed_id} closed! Its Z-report is under Past Shifts.")
+        st.session_state['shift_report_id'] = closed_id
 
-        if product_name != "":
-            filtered_product = groceries[
-                groceries['name'].str.strip().str.lower() == product_name.strip().lower()
-            ]
-            if not filtered_product.empty:
-                selected_product = filtered_product.iloc[0]
-                selected_product_id = int(selected_product['product_id'])
-            else:
-                st.error("❌ Grocery product not found!")
+    # ---------------- OPEN SHIFT (X-REPORT) ----------------
+    opening_float = st.number_input("Opening Float (cash in the drawer at the start)",
+                                    min_value=0.0, key="shift_float")
+    current = shifts.current(opening_float)
+    st.caption(f"Open since {str(current['opened_at'])[:19] if current['opened_at'] else 'the first sale'}")
 
-    # --- Non-grocery barcode scanning
-    barcode = st.text_input("Scan Barcode (Non-Grocery)")
-    if barcode:
-        product_row = non_groceries[non_groceries['barcode'] == barcode]
-        if not product_row.empty:
-            selected_product = product_row.iloc[0]
-            selected_product_id = int(selected_product['product_id'])
-        else:
-            st.error("❌ Product not found!")
-
-    # --- Quantity input and Add to Cart ---
-    if selected_product is not None:
-        st.success(f"Product: {selected_product['name']}")
-        st.write(f"Price: ৳{selected_product['selling_price']} per {selected_product['unit']}")
-
-        # Quantity input
-        if selected_product['unit'] in ['kg', 'gm']:
-            grams = st.number_input("Quantity in grams", min_value=0.0, step=50.0)
-            qty = grams / 1000
-        else:
-            qty = st.number_input("Quantity (pcs)", min_value=1, step=1)
-
-        if st.button("Add Product"):
-
-            if qty <= 0:
-                st.warning("Please enter valid quantity.")
-            elif qty > float(selected_product['stock_quantity']):
-                st.warning("Not enough stock available!")
-            else:
-                # Smart cart: update quantity if already in cart
-                existing = next(
-                    (i for i in st.session_state.cart
-                     if i['product_id'] == selected_product_id),
-                    None
-                )
-                if existing:
-                    existing['quantity'] += float(qty)
-                    existing['total_price'] = existing['quantity'] * existing['unit_price']
-                else:
-                    st.session_state.cart.append({
-                        'product_id': selected_product['product_id'],
-                        'product': selected_product['name'],
-                        'unit': selected_product['unit'],
-                        'quantity': float(qty),
-                        'unit_price': float(selected_product['selling_price']),
-                        'total_price': float(qty) * float(selected_product['selling_price'])
-                    })
-
-                st.success("✅ Product Added to Cart!")
-
-    # ---------------- SHOW CART ----------------
-    if st.session_state.cart:
-        st.subheader("🛒 Cart Items")
-        updated_cart = []
-
-        for idx, item in enumerate(st.session_state.cart):
-            cols = st.columns([2,1,1,1,1,1])
-            cols[0].write(item['product'])
-            cols[1].write(item['unit'])
-
-            if item['unit'] in ['kg','gm']:
-                grams = cols[2].number_input(
-                    "Grams",
-                    value=float(item['quantity']) * 1000,
-                    step=50.0,
-                    key=f"qty_{idx}"
-                )
-                new_qty = grams / 1000
-            else:
-                new_qty = cols[2].number_input(
-                    "Qty",
-                    value=int(item['quantity']),
-                    step=1,
-                    key=f"qty_{idx}"
-                )
-
-            new_price = cols[3].number_input(
-                "Price",
-                value=float(item['unit_price']),
-                key=f"price_{idx}"
-            )
-
-            new_total = new_qty * new_price
-            cols[4].write(f"{new_total:.2f}")
-
-            remove = cols[5].button("❌", key=f"remove_{idx}")
-
-            if not remove and new_qty > 0:
-                updated_cart.append({
-                    'product_id': item['product_id'],
-                    'product': item['product'],
-                    'unit': item['unit'],
-                    'quantity': new_qty,
-                    'unit_price': new_price,
-                    'total_price': new_total
-                })
-
-        st.session_state.cart = updated_cart
-        total = sum(i['total_price'] for i in updated_cart)
-        st.metric("Total Amount", f"{total:.2f}")
-
-        # ---------------- PAYMENT ----------------
-        payment_method = st.selectbox("Payment Method",
-                                      ["Cash","Card","Bkash","Nagad","Rocket"])
-
-        amount_received = 0.0
-        change_amount = 0.0
-
-        if payment_method == "Cash":
-            amount_received = st.number_input("Amount Received", 0.0)
-
-            if amount_received >= total:
-                change_amount = amount_received - total
-                st.success(f"Change: {change_amount:.2f}")
-            else:
-                st.warning("Insufficient cash!")
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("Sales", current['sale_count'])
+    with col2:
+        st.metric("Total Amount", f"{current['total_amount']:.2f}")
+    with col3:
+        st.metric("Cash Expected in Drawer", f"{current['cash_expected']:.2f}")
+
+    for group, heading in SHIFT_GROUPS.items():
+        st.subheader(f"By {heading}")
+        st.dataframe(current[group].drop(columns="group_key"), use_container_width=True, hide_index=True)
+
+    # ---------------- CLOSE ----------------
+    st.subheader("🔒 Close Shift")
+    employees_df = directory.employee_choices()
+    employee_names = dict(zip(employees_df['employee_id'].astype(int), employees_df['name']))
+    closed_by = st.selectbox("Closed By", [None] + list(employee_names),
+                             format_func=lambda eid: "" if eid is None else employee_names[eid],
+                             key="shift_closed_by")
+    cash_counted = st.number_input("Cash Counted", min_value=0.0, key="shift_counted")
+    difference = cash_counted - current['cash_expected']
+    if abs(difference) >= 0.005:
+        st.warning(f"Drawer is {'over' if difference > 0 else 'short'} by {abs(difference):.2f}")
+    shift_note = st.text_input("Note", key="shift_note")
+
+    if st.button("Close Shift", key="shift_close_btn"):
+        if closed_by is None:
+            st.warning("Please select who is closing the shift.")
         else:
-            amount_received = total
-            st.info(f"Paid via {payment_method}")
-
-        # ---------------- CANCEL ----------------
-        if st.button("Cancel Sale"):
-            st.session_state.cart = []
-            st.success("Sale Cancelled ✅")
-
-        # ---------------- CONFIRM ----------------
-        if st.button("Confirm Sale"):
-
-            if payment_method == "Cash" and amount_received < total:
-                st.error("❌ Insufficient cash received!")
-                st.stop()
-
             try:
-                cursor.execute("""
-                    INSERT INTO sales
-                    (customer_id, employee_id, total_amount,
-                     payment_method, amount_received, change_amount)
-                    VALUES (?,?,?,?,?,?)
-                """, (customer_id, employee_id, total,
-                      payment_method, amount_received, change_amount))
-
-                sale_id = cursor.lastrowid
-
-                for item in st.session_state.cart:
-                    cursor.execute("""
-                        INSERT INTO sale_items
-                        (sale_id, product_id, quantity, unit_price, total_price)
-                        VALUES (?,?,?,?,?)
-                    """, (sale_id, item['product_id'],
-                          item['quantity'], item['unit_price'],
-                          item['total_price']))
-
-                    cursor.execute("""
-                        UPDATE products
-                        SET stock_quantity = stock_quantity - ?
-                        WHERE product_id = ?
-                    """, (item['quantity'], item['product_id']))
-
-                conn.commit()
-
-                # Generate cash memo PDF
-                pdf_bytes = generate_cash_memo_bytes(
-                    sale_id, customer,
-                    st.session_state.cart,
-                    total, payment_method
-                )
+                st.session_state['shift_closed'] = shifts.close(closed_by, opening_float, cash_counted,
+                                                                shift_note or None)
+                st.rerun()
+            except ShiftError as e:
+                st.warning(str(e))
 
-                st.download_button(
-                    "📥 Download Cash Memo",
-                    pdf_bytes,
-                    file_name=f"SSS-{sale_id}.pdf"
-                )
+    st.markdown("---")
+
+    # ---------------- PAST SHIFTS (Z-REPORTS) ----------------
+    st.subheader("📜 Past Shifts")
+    history_df = shifts.history()
+    st.dataframe(history_df, use_container_width=True, hide_index=True)
+    if not history_df.empty:
+        shift_id = st.selectbox("Z-Report for Shift", list(history_df['shift_id'].astype(int)),
+                                key="shift_report_id")
+        z_report = z_report_text(shifts.report(shift_id))
+        st.code(z_report)
+        st.download_button(
+            "📥 Download Z-Report",
+            z_report,
+            file_name=f"z-report-{shift_id}.txt",
+            mime="text/plain",
+            key="shift_report_download"
+        )
 
-                st.session_state.cart = []
-                st.success("✅ Sale Completed Successfully!")
 
-            except Exception as e:
-                conn.rollback()
-                st.error(f"❌ Error: {e}")
 # ================= DASHBOARD =================
-elif menu == "Dashboard":
+@metrics.instrument("rerun", "Dashboard")
+def dashboard_page():
     st.header("📊 Dashboard")
 
     # ---------------- SALES DATA ----------------
-    sales_df = pd.read_sql("""
-        SELECT p.name, si.quantity, si.total_price, p.purchase_price
-        FROM sale_items si
-        JOIN products p ON si.product_id = p.product_id
-    """, conn)
-
-    if not sales_df.empty:
-        # Calculate profit per item
-        sales_df['profit'] = sales_df['total_price'] - (sales_df['purchase_price'] * sales_df['quantity'])
-        total_revenue = sales_df['total_price'].sum()
-        total_profit = sales_df['profit'].sum()
-    else:
-        # No sales yet
-        total_revenue = 0
-        total_profit = 0
-        sales_df = pd.DataFrame(columns=['name', 'total_price', 'profit'])
+    # Everything below reads the rollup tables maintained by checkout
+    total_revenue, total_profit = reports.totals()
 
     # ---------------- KEY METRICS ----------------
     col1, col2 = st.columns(2)
@@ -719,8 +764,8 @@ elif menu == "Dashboard":
 
     # ---------------- REVENUE BY PRODUCT ----------------
     st.subheader("💰 Revenue by Product")
-    if not sales_df.empty:
-        revenue_by_product = sales_df.groupby('name')['total_price'].sum().reset_index()
+    revenue_by_product = reports.revenue_by_product()
+    if not revenue_by_product.empty:
         fig = px.bar(
             revenue_by_product,
             x='name',
@@ -733,28 +778,24 @@ elif menu == "Dashboard":
     else:
         st.info("No sales data available to display revenue by product.")
 
-    # ---------------- LOW STOCK ALERT ----------------
-    st.subheader("⚠ Low Stock Products")
-    low_stock = pd.read_sql("""
-        SELECT name, stock_quantity, minimum_stock
-        FROM products
-        WHERE stock_quantity <= minimum_stock
-        ORDER BY stock_quantity ASC
-    """, conn)
-
-    if not low_stock.empty:
-        st.dataframe(low_stock)
+    # ---------------- REORDER SUGGESTIONS ----------------
+    st.subheader("⚠ Low Stock / Reorder Suggestions")
+    suggestions = reorder.suggestions()
+
+    if not suggestions.empty:
+        if st.checkbox("Group by supplier", key="reorder_by_supplier"):
+            st.dataframe(reorder.by_supplier(suggestions))
+        else:
+            st.dataframe(suggestions.drop(columns="purchase_price"))
+        st.caption(f"Velocity is average daily sales over the last {reorder.window_days} days; "
+                   f"suggestions cover a {reorder.lead_time_days}-day lead time plus "
+                   f"{reorder.cover_days} days of stock, never below the minimum stock.")
     else:
         st.success("All products have sufficient stock.")
 
     # ---------------- DAILY SALES REPORT ----------------
     st.subheader("📅 Daily Sales Report")
-    daily_sales = pd.read_sql("""
-        SELECT DATE(created_at) AS sale_date, SUM(total_amount) AS total_sales
-        FROM sales
-        GROUP BY DATE(created_at)
-        ORDER BY sale_date
-    """, conn)
+    daily_sales = reports.daily_sales()
 
     if not daily_sales.empty:
         st.dataframe(daily_sales)
@@ -770,10 +811,137 @@ elif menu == "Dashboard":
     else:
         st.info("No daily sales data available.")
 
-# NOTE: Do NOT close the connection here! Keep `conn` and `cursor` open
-    
-cursor.close()
-conn.close()
+    # ---------------- EXPORT ----------------
+    with st.expander("📤 Export Sales History"):
+        today = datetime.date.today()
+        cols = st.columns(2)
+        export_from = cols[0].date_input("From", today.replace(day=1), key="export_from")
+        export_to = cols[1].date_input("To", today, key="export_to")
+        dataset = st.radio("Data", list(EXPORT_DATASETS), horizontal=True, key="export_dataset")
+        export_format = st.radio("Format", ["CSV", "Parquet"], horizontal=True, key="export_format")
+        compress = st.checkbox("Compress (gzip)", key="export_gzip")
+
+        if st.button("Export", key="export_btn"):
+            if export_from > export_to:
+                st.warning("'From' date must be on or before 'To' date!")
+            else:
+                path, rows = reports.export_sales(dataset, export_from, export_to,
+                                                  export_format.lower(), compress)
+                st.success(f"✅ Exported {rows} rows to {path}")
+                with open(path, "rb") as f:
+                    st.download_button(
+                        "📥 Download Export",
+                        f,
+                        file_name=os.path.basename(path),
+                        key="export_download"
+                    )
+
+    # ---------------- MEMO ARCHIVE ----------------
+    with st.expander("🗂 Reprint / Archive Cash Memos"):
+        st.caption("Re-renders the cash memos of past sales, e.g. a whole day's at closing.")
+        by = st.radio("Sales", ["By date", "By sale number"], horizontal=True, key="archive_by")
+        if by == "By date":
+            cols = st.columns(2)
+            archive_from = cols[0].date_input("From", datetime.date.today(), key="archive_from")
+            archive_to = cols[1].date_input("To", datetime.date.today(), key="archive_to")
+        else:
+            archive_sales = st.text_input("Sale numbers", placeholder="e.g. 12, 15, 20-25",
+                                          key="archive_sales")
+        archive_format = st.radio("Output", list(ARCHIVE_FORMATS), horizontal=True,
+                                  format_func=ARCHIVE_FORMATS.get, key="archive_format")
+
+        if st.button("Render Memos", key="archive_btn"):
+            try:
+                if by == "By date":
+                    if archive_from > archive_to:
+                        raise ArchiveError("'From' date must be on or before 'To' date!")
+                    path, count = reports.archive_memos(archive_from, archive_to, fmt=archive_format)
+                else:
+                    path, count = reports.archive_memos(sale_ids=parse_sale_ids(archive_sales),
+                                                        fmt=archive_format)
+            except ArchiveError as e:
+                st.warning(str(e))
+            else:
+                st.success(f"✅ {count} memos written to {path}")
+                with open(path, "rb") as f:
+                    st.download_button(
+                        "📥 Download Memos",
+                        f,
+                        file_name=os.path.basename(path),
+                        key="archive_download"
+                    )
+
+    # ---------------- MAINTENANCE ----------------
+    with st.expander("🛠 Rebuild sales summaries"):
+        st.caption("Recomputes the dashboard summaries from the full sales history.")
+        if st.button("Rebuild", key="rebuild_rollups_btn"):
+            reports.rebuild_rollups()
+            st.success("Sales summaries rebuilt!")
+            st.rerun()
+
+
+# ================= DIAGNOSTICS =================
+@metrics.instrument("rerun", "Diagnostics")
+def diagnostics_page():
+    st.header("🩺 Diagnostics")
+    st.caption(f"Timings in this POS process since {metrics.started_at:%Y-%m-%d %H:%M:%S}: "
+               "SQL statements, building their DataFrames, cash memos, the POS panels "
+               "and full page runs per module.")
+
+    kind = st.radio("Show", ["All", "sql", "dataframe", "memo", "fragment", "rerun"],
+                    horizontal=True, key="diag_kind")
+    summary = metrics.summary(None if kind == "All" else kind)
+    if summary.empty:
+        st.info("Nothing timed yet.")
+    else:
+        st.dataframe(summary, use_container_width=True)
+
+        # ---------- LATENCY HISTOGRAM ----------
+        st.subheader("📊 Latency Histogram")
+        timing = st.selectbox("Timing", list(zip(summary["kind"], summary["name"])),
+                              format_func=lambda t: f"{t[0]} · {t[1][:150]}", key="diag_timing")
+        fig = px.bar(metrics.histogram(*timing), x="latency", y="count")
+        st.plotly_chart(fig, use_container_width=True)
+
+    # ---------- SLOW QUERIES ----------
+    st.subheader(f"🐢 Slow Queries (≥ {metrics.slow_ms:g} ms)")
+    slow = metrics.slow_queries()
+    if slow.empty:
+        st.success("No slow queries.")
+    else:
+        st.dataframe(slow, use_container_width=True)
+
+    stats = shop.cache.stats()
+    st.caption(f"Query cache: {stats['hits']} hits, {stats['misses']} misses, "
+               f"{stats['entries']} entries.")
+    if metrics.log_path:
+        st.caption(f"Every timing is also appended to {metrics.log_path}.")
+
+    cols = st.columns(2)
+    cols[0].download_button("📥 Download (JSON lines)", metrics.to_jsonl(),
+                            file_name="supershop-metrics.jsonl", key="diag_download")
+    if cols[1].button("Reset timings", key="diag_reset"):
+        metrics.reset()
+        st.rerun()
+
+
+# ---------------- PAGE DISPATCH ----------------
+# Each page run is timed as a "rerun", however it ends: st.stop() and
+# st.rerun() leave by raising through metrics.instrument
+PAGES = {
+    "Products": products_page,
+    "Customers": customers_page,
+    "Employees": employees_page,
+    "Suppliers": suppliers_page,
+    "Inventory": inventory_page,
+    "Sales": sales_page,
+    "Shift Close": shift_close_page,
+    "Dashboard": dashboard_page,
+    "Diagnostics": diagnostics_page,
+}
+PAGES[menu]()
+
+# NOTE: Do NOT close the shop here! `shop` is shared by every rerun and session
 
 
 
@@ -0,0 +1,17 @@
+# Headless core of the Sarder Super Shop POS; super_shop.py is the Streamlit UI on top.
+from .cache import QueryCache
+from .cart import Cart, WEIGHED_UNITS
+from .catalog import CATEGORIES, UNITS, Catalog, ProductIndex
+from .checkout import PAYMENT_METHODS, Checkout, CheckoutError
+from .db import DATABASE, DB_PATH, INTEGRITY_ERRORS, ConnectionManager, open_connection, writes
+from .diagnostics import Metrics, metrics
+from .directory import EMPLOYEE_ROLES, Directory
+from .inventory import MOVEMENT_TYPES, Inventory, InventoryError
+from .journal import Till, TillJournal, TillSync
+from .memo import (MEMO_FORMATS, MemoRenderer, generate_cash_memo_bytes, generate_receipt_escpos,
+                   generate_receipt_text)
+from .migrations import run_migrations
+from .reorder import ReorderEngine
+from .reports import EXPORT_DATASETS, Reports
+from .shifts import SHIFT_GROUPS, ShiftError, Shifts, z_report_text
+from .shop import Shop
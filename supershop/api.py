@@ -0,0 +1,322 @@
+# Local HTTP/JSON checkout service for networked barcode tills.
+#
+#     python -m supershop.api --port 8765
+#
+#     GET    /health
+#     GET    /products/<barcode>
+#     POST   /carts                               -> {"cart_id": ...}
+#     GET    /carts/<cart_id>
+#     DELETE /carts/<cart_id>
+#     POST   /carts/<cart_id>/items               {"barcode" | "product_id", "quantity"}
+#     PUT    /carts/<cart_id>/items/<product_id>  {"quantity", "unit_price"?}
+#     DELETE /carts/<cart_id>/items/<product_id>
+#     POST   /carts/<cart_id>/checkout            {"customer_id", "employee_id",
+#                                                  "payment_method", "amount_received"?}
+#
+# Quantities are in the product's own unit (kg for weighed goods, not grams).
+# Checking out a cart again (a retry, a double tap) returns the same sale.
+# Checkout goes through the same Checkout.confirm / record_sale path as the
+# Streamlit Sales page, so stock is decremented under the same guards.
+import argparse
+import json
+import logging
+import math
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote
+
+from .cart import Cart
+from .checkout import PAYMENT_METHODS, CheckoutError
+from .db import DATABASE
+from .shop import Shop
+
+API_HOST = "127.0.0.1"
+API_PORT = 8765
+CART_TTL = 4 * 60 * 60  # seconds an untouched cart is kept before it's dropped
+MAX_BODY = 64 * 1024
+
+log = logging.getLogger(__name__)
+
+
+class ApiError(Exception):
+    def __init__(self, status, message, **extra):
+        super().__init__(message)
+        self.status = status
+        self.body = {"error": message, **extra}
+
+
+# ---------------- OPEN CARTS ----------------
+class OpenCart:
+    # Hold lock while reading or changing the cart. Once checked out, sale is
+    # the checkout response: the cart stays around, read-only, so a retried
+    # checkout gets that same sale back instead of ringing it up twice.
+
+    def __init__(self):
+        self.cart = Cart()
+        self.lock = threading.Lock()
+        self.used = time.monotonic()
+        self.sale = None
+
+    def check_open(self):
+        if self.sale is not None:
+            raise ApiError(409, "Cart already checked out", sale_id=self.sale["sale_id"])
+
+
+class CartStore:
+    # Open carts live in memory, one lock each, so tills never block each other
+
+    def __init__(self, ttl=CART_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._carts = {}  # cart_id -> OpenCart
+
+    def _expire(self, now):
+        stale = [cid for cid, entry in self._carts.items() if now - entry.used > self.ttl]
+        for cid in stale:
+            del self._carts[cid]
+
+    def create(self):
+        cart_id = uuid.uuid4().hex
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            self._carts[cart_id] = OpenCart()
+        return cart_id
+
+    def open(self, cart_id):
+        with self._lock:
+            entry = self._carts.get(cart_id)
+            if entry is None:
+                raise ApiError(404, "Cart not found")
+            entry.used = time.monotonic()
+            return entry
+
+    def drop(self, cart_id):
+        with self._lock:
+            if self._carts.pop(cart_id, None) is None:
+                raise ApiError(404, "Cart not found")
+
+
+def cart_json(cart_id, cart):
+    return {"cart_id": cart_id, "items": [dict(i) for i in cart], "total": cart.total}
+
+
+def number(body, key, required=True, default=None, positive=False):
+    # Never negative; positive=True rules out zero too
+    value = body.get(key, default)
+    if value is None:
+        if required:
+            raise ApiError(400, f"'{key}' is required")
+        return None
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        raise ApiError(400, f"'{key}' must be a number")
+    if not math.isfinite(value):  # "nan", "inf" would reach the cart and the JSON
+        raise ApiError(400, f"'{key}' must be a finite number")
+    if value < 0 or (positive and value == 0):
+        raise ApiError(400, f"'{key}' must be {'positive' if positive else 'zero or more'}")
+    return value
+
+
+def integer(body, key):
+    value = number(body, key)
+    if value != int(value):
+        raise ApiError(400, f"'{key}' must be an integer")
+    return int(value)
+
+
+# ---------------- HANDLERS ----------------
+class PosApi:
+    # Routing and business rules, independent of the HTTP plumbing
+
+    def __init__(self, shop):
+        self.shop = shop
+        self.carts = CartStore()
+
+    def handle(self, method, parts, body):
+        if parts == ["health"] and method == "GET":
+            return 200, {"status": "ok"}
+        if len(parts) == 2 and parts[0] == "products" and method == "GET":
+            return 200, self.product(parts[1])
+        if parts == ["carts"] and method == "POST":
+            return 201, cart_json(self.carts.create(), Cart())
+        if len(parts) >= 2 and parts[0] == "carts":
+            cart_id, rest = parts[1], parts[2:]
+            if not rest:
+                if method == "GET":
+                    entry = self.carts.open(cart_id)
+                    with entry.lock:
+                        if entry.sale is not None:
+                            return 200, {**cart_json(cart_id, entry.cart), "sale_id": entry.sale["sale_id"]}
+                        return 200, cart_json(cart_id, entry.cart)
+                if method == "DELETE":
+                    self.carts.drop(cart_id)
+                    return 200, {"cart_id": cart_id, "deleted": True}
+            elif rest == ["items"] and method == "POST":
+                return 200, self.add_item(cart_id, body)
+            elif len(rest) == 2 and rest[0] == "items" and method in ("PUT", "DELETE"):
+                try:
+                    product_id = int(rest[1])
+                except ValueError:
+                    raise ApiError(404, "Not found")
+                return 200, self.change_item(cart_id, product_id, body if method == "PUT" else None)
+            elif rest == ["checkout"] and method == "POST":
+                return 200, self.checkout(cart_id, body)
+        raise ApiError(404, "Not found")
+
+    def product(self, barcode):
+        product = self.shop.catalog.lookup_barcode(barcode)
+        if product is None:
+            raise ApiError(404, "Product not found")
+        return product
+
+    def add_item(self, cart_id, body):
+        quantity = number(body, "quantity", default=1, positive=True)
+        if body.get("barcode") is not None:
+            product = self.shop.catalog.lookup_barcode(str(body["barcode"]))
+        else:
+            product = self.shop.catalog.get(integer(body, "product_id"))
+        if product is None:
+            raise ApiError(404, "Product not found")
+
+        entry = self.carts.open(cart_id)
+        with entry.lock:
+            entry.check_open()
+            cart = entry.cart
+            line = cart.find(product["product_id"])
+            in_cart = line["quantity"] if line else 0.0
+            if in_cart + quantity > float(product["stock_quantity"] or 0):
+                raise ApiError(409, "Not enough stock available!",
+                               stock_quantity=product["stock_quantity"])
+            cart.add(product, quantity)
+            return cart_json(cart_id, cart)
+
+    def change_item(self, cart_id, product_id, body):
+        entry = self.carts.open(cart_id)
+        with entry.lock:
+            entry.check_open()
+            cart = entry.cart
+            line = cart.find(product_id)
+            if line is None:
+                raise ApiError(404, "Product not in cart")
+            if body is None:
+                cart.remove(product_id)
+            else:
+                quantity = number(body, "quantity", positive=True)  # DELETE removes a line
+                unit_price = number(body, "unit_price", default=line["unit_price"])
+                cart.set_line(product_id, quantity, unit_price)
+            return cart_json(cart_id, cart)
+
+    def checkout(self, cart_id, body):
+        customer_id = integer(body, "customer_id")
+        employee_id = integer(body, "employee_id")
+        payment_method = body.get("payment_method", "Cash")
+        if payment_method not in PAYMENT_METHODS:
+            raise ApiError(400, f"'payment_method' must be one of {', '.join(PAYMENT_METHODS)}")
+        amount_received = number(body, "amount_received", required=False)
+        conn = self.shop.db.read_connection()
+        if conn.execute("SELECT 1 FROM customers WHERE customer_id=?", (customer_id,)).fetchone() is None:
+            raise ApiError(404, "Customer not found")
+        if conn.execute("SELECT 1 FROM employees WHERE employee_id=?", (employee_id,)).fetchone() is None:
+            raise ApiError(404, "Employee not found")
+
+        entry = self.carts.open(cart_id)
+        with entry.lock:
+            # Overlapping or retried checkouts queue on the lock; all but the
+            # first get the first one's sale
+            if entry.sale is not None:
+                return entry.sale
+            cart = entry.cart
+            total = cart.total
+            try:
+                received, change = self.shop.checkout.settle(total, payment_method, amount_received)
+                sale_id = self.shop.checkout.confirm(cart, customer_id, employee_id,
+                                                     payment_method, amount_received)
+            except CheckoutError as e:
+                raise ApiError(409, "Sale not completed", failures=e.failures)
+            entry.sale = {"sale_id": sale_id, "items": [dict(i) for i in cart], "total": total,
+                          "amount_received": received, "change_amount": change}
+            return entry.sale
+
+
+class RequestHandler(BaseHTTPRequestHandler):
+    # Keep-alive, so a scanner reuses one connection (and one server thread,
+    # with its pooled read connection) for its whole session
+    protocol_version = "HTTP/1.1"
+    api = None
+
+    def _dispatch(self, method):
+        try:
+            body = {}
+            length = int(self.headers.get("Content-Length") or 0)
+            if length > MAX_BODY:
+                raise ApiError(413, "Request body too large")
+            if length:
+                try:
+                    body = json.loads(self.rfile.read(length))
+                except ValueError:
+                    raise ApiError(400, "Body must be JSON")
+                if not isinstance(body, dict):
+                    raise ApiError(400, "Body must be a JSON object")
+            # Decoded per segment, so an escaped "/" in a barcode stays in the barcode
+            parts = [unquote(p) for p in self.path.split("?", 1)[0].split("/") if p]
+            status, payload = self.api.handle(method, parts, body)
+        except ApiError as e:
+            status, payload = e.status, e.body
+        except Exception:
+            # Details go to the server log, not to the till
+            log.exception("%s %s failed", method, self.path)
+            status, payload = 500, {"error": "Internal server error"}
+        data = json.dumps(payload, default=str).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def do_PUT(self):
+        self._dispatch("PUT")
+
+    def do_DELETE(self):
+        self._dispatch("DELETE")
+
+    def log_message(self, format, *args):
+        pass  # one line per scan is noise at hundreds of scans a minute
+
+
+def make_server(shop, host=API_HOST, port=API_PORT):
+    handler = type("PosRequestHandler", (RequestHandler,), {"api": PosApi(shop)})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Sarder Super Shop checkout API")
+    parser.add_argument("--host", default=API_HOST)
+    parser.add_argument("--port", type=int, default=API_PORT)
+    parser.add_argument("--db", default=DATABASE, help="SQLite path or SQLAlchemy URL")
+    args = parser.parse_args(argv)
+
+    with Shop(args.db) as shop:
+        server = make_server(shop, args.host, args.port)
+        print(f"Checkout API listening on http://{args.host}:{args.port}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+
+
+if __name__ == "__main__":
+    main()
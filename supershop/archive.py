@@ -0,0 +1,292 @@
+# Batch reprint / archive of cash memos for past sales.
+#
+#     python -m supershop.archive --from 2024-12-31 --to 2024-12-31 --format zip
+#     python -m supershop.archive --sales 120-180,200 --format pdf
+#
+# Cart lines come back from sale_items; memos are rendered in chunks across a
+# process pool and each finished chunk goes straight to the output file, so
+# only the chunks in flight are ever held in memory.
+import argparse
+import datetime
+import multiprocessing
+import os
+import re
+import zipfile
+import zlib
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from .db import DATABASE, ConnectionManager
+from .diagnostics import metrics
+from .memo import build_cash_memo, generate_cash_memo_bytes, memo_template
+
+# ---------------- MEMO ARCHIVE ----------------
+ARCHIVE_DIR = "memo_archive"
+ARCHIVE_CHUNK = 100  # memos rendered per worker task
+ARCHIVE_WORKERS = os.cpu_count() or 1
+ARCHIVE_FORMATS = {"zip": "ZIP of PDF memos", "pdf": "One merged PDF"}
+ARCHIVE_MAX_SALES = 10000  # most memos one request by sale number may ask for
+SALE_RANGE = re.compile(r"^\s*(\d+)\s*(?:-\s*(\d+)\s*)?$")
+
+SALES_SQL = """
+    SELECT s.sale_id, c.name, s.total_amount, s.payment_method, CAST(s.created_at AS TEXT)
+    FROM sales s
+    LEFT JOIN customers c ON c.customer_id = s.customer_id
+"""
+
+
+class ArchiveError(Exception):
+    pass
+
+
+def parse_sale_ids(text):
+    # "12, 15, 20-25" -> [12, 15, 20, 21, 22, 23, 24, 25]
+    ids = set()
+    for part in text.split(","):
+        if not part.strip():
+            continue
+        match = SALE_RANGE.match(part)
+        if match is None:
+            raise ArchiveError(f"Not a sale number or range: {part.strip()}")
+        first, last = int(match.group(1)), int(match.group(2) or match.group(1))
+        if last < first:
+            raise ArchiveError(f"Range runs backwards: {part.strip()}")
+        # Checked before expanding, so a typo like 1-999999999 can't eat the memory
+        if last - first + 1 > ARCHIVE_MAX_SALES:
+            raise ArchiveError(f"Range is over {ARCHIVE_MAX_SALES} sales: {part.strip()}")
+        ids.update(range(first, last + 1))
+        if len(ids) > ARCHIVE_MAX_SALES:
+            raise ArchiveError(f"More than {ARCHIVE_MAX_SALES} sales; archive by date range instead")
+    return sorted(ids)
+
+
+def iter_memo_chunks(conn, start_date=None, end_date=None, sale_ids=None, chunk_size=ARCHIVE_CHUNK):
+    # Yields lists of (sale_id, customer_name, items, total_amount, payment_method, created_at)
+    def with_items(sales):
+        ids = [row[0] for row in sales]
+        items = {sale_id: [] for sale_id in ids}
+        for row in conn.execute(f"""
+            SELECT sale_id, product_name, unit, quantity, unit_price, total_price
+            FROM sale_items
+            WHERE sale_id IN ({','.join('?' * len(ids))})
+            ORDER BY sale_id, item_id
+        """, ids).fetchall():
+            items[row[0]].append({"product": row[1], "unit": row[2], "quantity": row[3],
+                                  "unit_price": row[4], "total_price": row[5]})
+        return [(sale_id, name or "", items[sale_id], total, method, created_at)
+                for sale_id, name, total, method, created_at in sales]
+
+    if sale_ids is not None:
+        for i in range(0, len(sale_ids), chunk_size):
+            batch = sale_ids[i:i + chunk_size]
+            sales = [tuple(row) for row in conn.execute(
+                SALES_SQL + f" WHERE s.sale_id IN ({','.join('?' * len(batch))}) ORDER BY s.sale_id",
+                batch).fetchall()]
+            if sales:
+                yield with_items(sales)
+        return
+
+    end = end_date + datetime.timedelta(days=1)
+    cursor = conn.cursor()  # streams on both backends, like the sales export
+    try:
+        cursor.execute(SALES_SQL + " WHERE s.created_at >= ? AND s.created_at < ? ORDER BY s.sale_id",
+                       (start_date.isoformat(), end.isoformat()))
+        while True:
+            sales = [tuple(row) for row in cursor.fetchmany(chunk_size)]
+            if not sales:
+                break
+            yield with_items(sales)
+    finally:
+        cursor.close()
+
+
+# ---------------- RENDERING ----------------
+# Runs in the worker processes: zip gets whole PDFs, the merged PDF just each
+# memo's compressed page contents and the fonts they use
+def render_chunk(fmt, chunk):
+    if fmt == "zip":
+        return [(memo[0], generate_cash_memo_bytes(*memo).getvalue()) for memo in chunk]
+    rendered = []
+    for memo in chunk:
+        pdf = build_cash_memo(*memo)
+        fonts = tuple(sorted((font["i"], font["name"]) for font in pdf.fonts.values()))
+        pages = [zlib.compress(pdf.pages[n].encode("latin1")) for n in range(1, pdf.page + 1)]
+        rendered.append((memo[0], fonts, pages))
+    return rendered
+
+
+def render_chunks(fmt, chunks, workers):
+    # Rendered chunks in order, at most two per worker in flight
+    if workers <= 1:
+        for chunk in chunks:
+            yield render_chunk(fmt, chunk)
+        return
+    # spawn: forking would copy the parent's threads' locks mid-use (e.g. the DB writer's)
+    with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(pool.submit(render_chunk, fmt, chunk))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+class MergedPdfWriter:
+    # Writes memo pages to one PDF as they arrive: fonts and the logo once,
+    # then each page and its content stream; the page tree, catalog and xref
+    # come last, so only object offsets are kept in memory
+
+    def __init__(self, f):
+        template = memo_template()
+        self.f = f
+        self.position = 0
+        self.offsets = [None]  # object 1 is the page tree, written at the end
+        self.kids = []
+        self.media_box = f"[0 0 {template.w_pt:.2f} {template.h_pt:.2f}]"
+        self._fonts = {}  # font name -> object id
+        self._resources = {}  # fonts used -> resources object id
+        self._write(b"%PDF-1.3\n")
+        self._images = {info["i"]: self._image(info) for info in template.images.values()}
+
+    def _write(self, data):
+        self.f.write(data)
+        self.position += len(data)
+
+    def _object(self, body, data=None, object_id=None):
+        if object_id is None:
+            self.offsets.append(None)
+            object_id = len(self.offsets)
+        self.offsets[object_id - 1] = self.position
+        if data is not None:
+            body = f"<<{body}/Length {len(data)}>>\nstream\n".encode("latin1") + data + b"\nendstream"
+        else:
+            body = body.encode("latin1")
+        self._write(f"{object_id} 0 obj\n".encode("latin1") + body + b"\nendobj\n")
+        return object_id
+
+    def _image(self, info):
+        # The template's logo: a plain RGB/grey PNG, as memo_template() makes it
+        body = (f"/Type /XObject /Subtype /Image /Width {info['w']} /Height {info['h']} "
+                f"/ColorSpace /{info['cs']} /BitsPerComponent {info['bpc']} ")
+        if "f" in info:
+            body += f"/Filter /{info['f']} "
+        if "dp" in info:
+            body += f"/DecodeParms <<{info['dp']}>> "
+        return self._object(body, info["data"])
+
+    def _resource_dict(self, fonts):
+        if fonts not in self._resources:
+            refs = []
+            for i, name in fonts:
+                if name not in self._fonts:
+                    encoding = "" if name in ("Symbol", "ZapfDingbats") else " /Encoding /WinAnsiEncoding"
+                    self._fonts[name] = self._object(f"<</Type /Font /BaseFont /{name} /Subtype /Type1{encoding}>>")
+                refs.append(f"/F{i} {self._fonts[name]} 0 R")
+            images = " ".join(f"/I{i} {object_id} 0 R" for i, object_id in self._images.items())
+            self._resources[fonts] = self._object(
+                f"<</ProcSet [/PDF /Text /ImageB /ImageC /ImageI] /Font <<{' '.join(refs)}>> "
+                f"/XObject <<{images}>>>>")
+        return self._resources[fonts]
+
+    def add_memo(self, fonts, pages):
+        resources = self._resource_dict(fonts)
+        for content in pages:
+            contents = self._object("/Filter /FlateDecode ", content)
+            self.kids.append(self._object(f"<</Type /Page /Parent 1 0 R /MediaBox {self.media_box} "
+                                          f"/Resources {resources} 0 R /Contents {contents} 0 R>>"))
+
+    def close(self):
+        kids = " ".join(f"{kid} 0 R" for kid in self.kids)
+        self._object(f"<</Type /Pages /Kids [{kids}] /Count {len(self.kids)}>>", object_id=1)
+        catalog = self._object("<</Type /Catalog /Pages 1 0 R>>")
+        xref = self.position
+        entries = "".join(f"{offset:010d} 00000 n \n" for offset in self.offsets)
+        self._write((f"xref\n0 {len(self.offsets) + 1}\n0000000000 65535 f \n{entries}"
+                     f"trailer\n<</Size {len(self.offsets) + 1} /Root {catalog} 0 R>>\n"
+                     f"startxref\n{xref}\n%%EOF\n").encode("latin1"))
+
+
+def write_memo_zip(chunks, path):
+    count = 0
+    # PDFs are already compressed
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_STORED) as archive:
+        for chunk in chunks:
+            for sale_id, pdf in chunk:
+                archive.writestr(f"SSS-{sale_id}.pdf", pdf)
+                count += 1
+    return count
+
+
+def write_memo_pdf(chunks, path):
+    count = 0
+    with open(path, "wb") as f:
+        writer = MergedPdfWriter(f)
+        for chunk in chunks:
+            for _, fonts, pages in chunk:
+                writer.add_memo(fonts, pages)
+                count += 1
+        writer.close()
+    return count
+
+
+def archive_memos(conn, start_date=None, end_date=None, sale_ids=None, fmt="zip",
+                  directory=ARCHIVE_DIR, workers=ARCHIVE_WORKERS, chunk_size=ARCHIVE_CHUNK):
+    # Either a date range or a list of sale ids; returns (path, memos written)
+    if fmt not in ARCHIVE_FORMATS:
+        raise ArchiveError(f"Unknown archive format: {fmt}")
+    if sale_ids is None and (start_date is None or end_date is None):
+        raise ArchiveError("Give a date range or sale numbers")
+    os.makedirs(directory, exist_ok=True)
+    if sale_ids is not None:
+        sale_ids = sorted(set(sale_ids))
+        if not sale_ids:
+            raise ArchiveError("No sale numbers given")
+        if len(sale_ids) > ARCHIVE_MAX_SALES:
+            raise ArchiveError(f"More than {ARCHIVE_MAX_SALES} sales; archive by date range instead")
+        name = f"memos_SSS-{sale_ids[0]}_SSS-{sale_ids[-1]}.{fmt}"
+    else:
+        name = f"memos_{start_date}_{end_date}.{fmt}"
+    path = os.path.join(directory, name)
+
+    with metrics.timed("memo", f"archive_memos ({fmt})"):
+        chunks = render_chunks(fmt, iter_memo_chunks(conn, start_date, end_date, sale_ids, chunk_size),
+                               workers)
+        if fmt == "zip":
+            count = write_memo_zip(chunks, path)
+        else:
+            count = write_memo_pdf(chunks, path)
+    if not count:
+        os.remove(path)
+        raise ArchiveError("No sales found")
+    return path, count
+
+
+# ---------------- CLI ----------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Reprint or archive cash memos for past sales.")
+    parser.add_argument("--database", default=DATABASE, help="SQLite path or SQLAlchemy URL")
+    parser.add_argument("--from", dest="start", type=datetime.date.fromisoformat, help="first day, YYYY-MM-DD")
+    parser.add_argument("--to", dest="end", type=datetime.date.fromisoformat, help="last day (default: --from)")
+    parser.add_argument("--sales", help="sale numbers instead, e.g. 12,15,20-25")
+    parser.add_argument("--format", choices=list(ARCHIVE_FORMATS), default="zip")
+    parser.add_argument("--directory", default=ARCHIVE_DIR)
+    parser.add_argument("--workers", type=int, default=ARCHIVE_WORKERS)
+    args = parser.parse_args(argv)
+    if (args.sales is None) == (args.start is None):
+        parser.error("give either --from (and optionally --to) or --sales")
+
+    db = ConnectionManager(args.database)
+    try:
+        sale_ids = parse_sale_ids(args.sales) if args.sales else None
+        path, count = archive_memos(db.read_connection(), args.start, args.end or args.start, sale_ids,
+                                    args.format, args.directory, args.workers)
+    except ArchiveError as e:
+        parser.error(str(e))
+    finally:
+        db.close()
+    print(f"{count} memos written to {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+from .diagnostics import metrics
+
+# ---------------- QUERY CACHE ----------------
+QUERY_CACHE_SIZE = 256
+
+
+class QueryCache:
+    # LRU cache of read_sql results. An entry is valid while the versions of
+    # the tables it reads are unchanged; the writer bumps them after commits.
+
+    def __init__(self, db, max_entries=QUERY_CACHE_SIZE):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._versions = {}
+        self._epoch = 0  # bumped when everything must be considered stale
+        db.add_commit_listener(self.invalidate)
+
+    def invalidate(self, tables=None):
+        with self._lock:
+            if tables is None:
+                self._epoch += 1
+            else:
+                for table in tables:
+                    self._versions[table] = self._versions.get(table, 0) + 1
+
+    def _version(self, tables):
+        return (self._epoch,) + tuple(self._versions.get(t, 0) for t in tables)
+
+    def read_sql(self, sql, conn, params=(), tables=()):
+        # Callers must treat the returned DataFrame as read-only: it is shared
+        key = (sql, tuple(params), tuple(tables))
+        with self._lock:
+            version = self._version(tables)
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == version:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+
+        cursor = conn.execute(sql, params)
+        try:
+            columns = [d[0] for d in cursor.description]
+            rows = cursor.fetchall()
+            # What pd.read_sql does, minus its need for a SQLAlchemy connectable off SQLite
+            with metrics.timed("dataframe", sql):
+                df = pd.DataFrame.from_records([tuple(row) for row in rows],
+                                               columns=columns, coerce_float=True)
+        finally:
+            cursor.close()
+
+        with self._lock:
+            # Only store if nothing was written while we were reading
+            if self._version(tables) == version:
+                self._entries[key] = (version, df)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return df
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries)}
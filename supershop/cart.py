@@ -0,0 +1,75 @@
+# ---------------- CART ----------------
+WEIGHED_UNITS = ["kg", "gm"]  # entered in grams, stored in kg/gm units of 1000 g
+
+
+class Cart:
+    # Lines are dicts: product_id, product, unit, quantity, unit_price, total_price
+    # (the shape record_sale and the cash memo expect), kept in scan order and
+    # keyed by product_id. The total is kept running, so changing one line
+    # costs the same however big the basket is.
+
+    def __init__(self, items=None):
+        self._lines = {}
+        self._total = 0.0
+        for item in items or []:
+            line = dict(item)
+            self._lines[line['product_id']] = line
+            self._total += line['total_price']
+
+    @property
+    def items(self):
+        return list(self._lines.values())
+
+    def find(self, product_id):
+        return self._lines.get(product_id)
+
+    def add(self, product, quantity):
+        # Smart cart: scanning a product again adds to its line
+        existing = self.find(product['product_id'])
+        if existing:
+            self.set_line(existing['product_id'], existing['quantity'] + float(quantity),
+                          existing['unit_price'])
+        else:
+            line = {
+                'product_id': int(product['product_id']),
+                'product': product['name'],
+                'unit': product['unit'],
+                'quantity': float(quantity),
+                'unit_price': float(product['selling_price']),
+                'total_price': float(quantity) * float(product['selling_price'])
+            }
+            self._lines[line['product_id']] = line
+            self._total += line['total_price']
+
+    def set_line(self, product_id, quantity, unit_price):
+        if quantity <= 0:
+            self.remove(product_id)
+            return
+        item = self.find(product_id)
+        if item is not None:
+            total_price = quantity * unit_price
+            self._total += total_price - item['total_price']
+            item['quantity'] = quantity
+            item['unit_price'] = unit_price
+            item['total_price'] = total_price
+
+    def remove(self, product_id):
+        item = self._lines.pop(product_id, None)
+        if item is not None:
+            self._total -= item['total_price']
+        if not self._lines:
+            self._total = 0.0  # no float residue on an empty cart
+
+    def clear(self):
+        self._lines = {}
+        self._total = 0.0
+
+    @property
+    def total(self):
+        return self._total
+
+    def __iter__(self):
+        return iter(list(self._lines.values()))
+
+    def __len__(self):
+        return len(self._lines)
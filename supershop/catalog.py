@@ -0,0 +1,496 @@
+import bisect
+import math
+import os
+import re
+import threading
+from io import StringIO
+
+import pandas as pd
+
+from .cache import QueryCache
+from .db import writes
+from .inventory import INVENTORY_TABLES, record_movements
+
+CATEGORIES = ["Food","Electronics","Clothing","Stationery","Groceries","Toiletries"]
+UNITS = ["pcs","kg","gm","liter","ml","pack","box","cup"]
+
+# ---------------- PRODUCT SEARCH ----------------
+SEARCH_LIMIT = 50
+
+
+def fts_query(text):
+    # Quote every term so user input can't inject FTS syntax; prefix-match each one
+    terms = [t.replace('"', '""') for t in text.split()]
+    return " ".join(f'"{t}"*' for t in terms)
+
+
+# PostgreSQL equivalent of products_fts: a weighted document (name > barcode
+# > category) with a GIN expression index; queries must use it verbatim
+PRODUCT_TSVECTOR = ("setweight(to_tsvector('simple', coalesce(name, '')), 'A') || "
+                    "setweight(to_tsvector('simple', coalesce(barcode, '')), 'B') || "
+                    "setweight(to_tsvector('simple', coalesce(category, '')), 'D')")
+
+
+def tsquery(text):
+    # Word characters only, so input can't inject tsquery syntax; prefix-match each term
+    return " & ".join(f"{t}:*" for t in re.findall(r"\w+", text.lower()))
+
+
+# ---------------- PRODUCT CATALOG ----------------
+# label -> (column, direction); every sort key is indexed (product_id is the tiebreak)
+CATALOG_SORTS = {
+    "Newest first": ("product_id", "DESC"),
+    "Name (A-Z)": ("name", "ASC"),
+    "Lowest stock": ("stock_quantity", "ASC"),
+    "Highest price": ("selling_price", "DESC"),
+}
+CATALOG_PAGE_SIZES = [25, 50, 100, 200]
+# What a NULL sorts as (SQL literal): a row comparison with NULL is NULL,
+# which would make keyset paging skip those rows
+CATALOG_SORT_NULLS = {"name": "''", "stock_quantity": "0", "selling_price": "0"}
+
+
+def sort_key(column):
+    # Spelled exactly like migration 13's indexes, so they serve the sort
+    if column in CATALOG_SORT_NULLS:
+        return f"COALESCE({column}, {CATALOG_SORT_NULLS[column]})"
+    return column
+
+
+def catalog_where(category=None, low_stock=False):
+    clauses, params = [], []
+    if category:
+        clauses.append("category = ?")
+        params.append(category)
+    if low_stock:
+        clauses.append("stock_quantity <= minimum_stock")
+    return clauses, params
+
+
+# ---------------- PRODUCT LOOKUP CACHE ----------------
+def normalize_name(name):
+    return (name or "").strip().lower()
+
+
+class ProductIndex:
+    # Process-wide barcode -> product and name -> product maps for the POS page.
+    # Built on first use; every product write patches it through refresh().
+    # A till passes loader (its local copy of products, None until it has
+    # one) so a reload doesn't wait on the shared database.
+
+    def __init__(self, db, loader=None):
+        self.db = db
+        self.loader = loader
+        self._lock = threading.Lock()
+        self._by_id = None
+        self._by_barcode = {}
+        self._by_name = {}
+        self._grocery_names = None
+        # Our own writes patch the index via refresh(); foreign ones force a
+        # reload. A till's copy only changes when its sync worker invalidates it.
+        if loader is None:
+            db.add_commit_listener(lambda tables: self.invalidate() if tables is None else None)
+
+    def _ensure_loaded(self):
+        if self._by_id is None:
+            rows = self.loader() if self.loader is not None else None
+            if rows is None:
+                rows = [dict(row) for row in self.db.read_connection().execute(
+                    "SELECT * FROM products ORDER BY product_id"
+                ).fetchall()]
+            self._by_id, self._by_barcode, self._by_name = {}, {}, {}
+            self._grocery_names = None
+            for product in rows:
+                self._add(product)
+
+    def _add(self, product):
+        product_id = product["product_id"]
+        self._by_id[product_id] = product
+        if product["barcode"]:
+            self._by_barcode[product["barcode"]] = product
+        # Lowest product_id wins on duplicate names, like the old DataFrame filter
+        bisect.insort(self._by_name.setdefault(normalize_name(product["name"]), []), product_id)
+        self._grocery_names = None
+
+    def _discard(self, product_id):
+        product = self._by_id.pop(product_id, None)
+        if product is None:
+            return
+        if self._by_barcode.get(product["barcode"]) is product:
+            del self._by_barcode[product["barcode"]]
+        key = normalize_name(product["name"])
+        ids = self._by_name[key]
+        ids.remove(product_id)
+        if not ids:
+            del self._by_name[key]
+        self._grocery_names = None
+
+    def refresh(self, product_ids):
+        # Re-read just these rows after a committed write; missing rows were deleted
+        product_ids = [int(pid) for pid in product_ids]
+        with self._lock:
+            if self._by_id is None or not product_ids:
+                return
+            placeholders = ",".join("?" * len(product_ids))
+            rows = self.db.read_connection().execute(
+                f"SELECT * FROM products WHERE product_id IN ({placeholders})",
+                product_ids
+            ).fetchall()
+            for product_id in product_ids:
+                self._discard(product_id)
+            for row in rows:
+                self._add(dict(row))
+
+    def invalidate(self):
+        with self._lock:
+            self._by_id = None
+
+    def lookup_barcode(self, barcode):
+        with self._lock:
+            self._ensure_loaded()
+            product = self._by_barcode.get(barcode.strip())
+            return dict(product) if product else None
+
+    def lookup_name(self, name):
+        with self._lock:
+            self._ensure_loaded()
+            ids = self._by_name.get(normalize_name(name))
+            return dict(self._by_id[ids[0]]) if ids else None
+
+    def grocery_names(self):
+        with self._lock:
+            self._ensure_loaded()
+            if self._grocery_names is None:
+                names = (p["name"] for p in self._by_id.values()
+                         if p["category"] == "Groceries" and p["name"])
+                self._grocery_names = list(dict.fromkeys(names))
+            return list(self._grocery_names)
+
+    def __len__(self):
+        with self._lock:
+            self._ensure_loaded()
+            return len(self._by_id)
+
+
+# ---------------- WRITE JOBS ----------------
+# Run on the writer thread via db.write(job, ...); the cursor is its transaction.
+@writes("products", *INVENTORY_TABLES)
+def insert_product(cursor, name, barcode, category, unit, purchase_price,
+                   selling_price, stock_quantity, minimum_stock):
+    cursor.execute("""
+        INSERT INTO products
+        (name, barcode, category, unit, purchase_price, selling_price, stock_quantity, minimum_stock)
+        VALUES (?,?,?,?,?,?,?,?)
+        RETURNING product_id
+    """, (name, barcode, category, unit,
+          purchase_price, selling_price,
+          stock_quantity, minimum_stock))
+    product_id = cursor.fetchone()[0]
+    record_movements(cursor, [(product_id, "adjustment", stock_quantity, purchase_price,
+                               None, None, "opening stock", None)])
+    return product_id
+
+
+@writes("products", *INVENTORY_TABLES)
+def update_product(cursor, product_id, name, barcode, category, unit, purchase_price,
+                   selling_price, stock_quantity, minimum_stock):
+    old = cursor.execute("SELECT stock_quantity FROM products WHERE product_id=?", (product_id,)).fetchone()
+    cursor.execute("""
+        UPDATE products SET
+        name=?, barcode=?, category=?, unit=?,
+        purchase_price=?, selling_price=?,
+        stock_quantity=?, minimum_stock=?
+        WHERE product_id=?
+    """, (
+        name, barcode, category, unit,
+        purchase_price, selling_price, stock_quantity, minimum_stock, product_id
+    ))
+    if old is not None:
+        # Typing over the stock figure is a recount
+        record_movements(cursor, [(product_id, "adjustment", stock_quantity - (old[0] or 0.0), None,
+                                   None, None, "stock edited", None)])
+
+
+@writes("products")
+def delete_product(cursor, product_id):
+    cursor.execute("DELETE FROM products WHERE product_id=?", (product_id,))
+
+
+def stock_by_barcode(cursor, barcodes):
+    placeholders = ",".join("?" * len(barcodes))
+    return {row[0]: (row[1], row[2] or 0.0) for row in cursor.execute(
+        f"SELECT barcode, product_id, stock_quantity FROM products WHERE barcode IN ({placeholders})",
+        barcodes
+    )}
+
+
+@writes("products", *INVENTORY_TABLES)
+def upsert_products(cursor, rows):
+    # Blank numbers insert as 0 but leave an existing product's value alone
+    barcodes = [row["barcode"] for row in rows]
+    before = stock_by_barcode(cursor, barcodes)
+    cursor.executemany("""
+        INSERT INTO products
+        (name, barcode, category, unit, purchase_price, selling_price, stock_quantity, minimum_stock)
+        VALUES (:name, :barcode, :category, :unit,
+                COALESCE(:purchase_price, 0), COALESCE(:selling_price, 0),
+                COALESCE(:stock_quantity, 0), COALESCE(:minimum_stock, 0))
+        ON CONFLICT(barcode) DO UPDATE SET
+            name = excluded.name,
+            category = excluded.category,
+            unit = excluded.unit,
+            purchase_price = COALESCE(:purchase_price, products.purchase_price),
+            selling_price = COALESCE(:selling_price, products.selling_price),
+            stock_quantity = COALESCE(:stock_quantity, products.stock_quantity),
+            minimum_stock = COALESCE(:minimum_stock, products.minimum_stock)
+    """, rows)
+    # Stock the file added or overwrote goes in the ledger as adjustments
+    record_movements(cursor, [
+        (product_id, "adjustment", stock - before.get(barcode, (None, 0.0))[1], None,
+         None, None, "import", None)
+        for barcode, (product_id, stock) in stock_by_barcode(cursor, barcodes).items()
+    ])
+    return len(rows)
+
+
+# ---------------- BULK PRODUCT IMPORT ----------------
+IMPORT_CHUNK_SIZE = 1000
+IMPORT_COLUMNS = ["name", "barcode", "category", "unit",
+                  "purchase_price", "selling_price", "stock_quantity", "minimum_stock"]
+IMPORT_REQUIRED = IMPORT_COLUMNS[:4]
+IMPORT_NUMERIC = IMPORT_COLUMNS[4:]
+
+
+
+def file_size(file):
+    file.seek(0, os.SEEK_END)
+    size = file.tell()
+    file.seek(0)
+    return size or 1
+
+
+def read_csv_chunks(file, chunk_size):
+    size = file_size(file)
+    for chunk in pd.read_csv(file, chunksize=chunk_size, dtype=str, keep_default_na=False):
+        yield chunk, file.tell() / size
+
+
+def read_excel_chunks(file, chunk_size):
+    from openpyxl import load_workbook  # only needed for Excel imports
+
+    workbook = load_workbook(file, read_only=True, data_only=True)
+    try:
+        sheet = workbook.active
+        rows = sheet.iter_rows(values_only=True)
+        header = ["" if h is None else str(h) for h in next(rows, [])]
+        total = max((sheet.max_row or 2) - 1, 1)
+        batch, done = [], 0
+        for row in rows:
+            batch.append(row)
+            if len(batch) == chunk_size:
+                done += len(batch)
+                yield pd.DataFrame(batch, columns=header), done / total
+                batch = []
+        if batch:
+            yield pd.DataFrame(batch, columns=header), 1.0
+    finally:
+        workbook.close()
+
+
+def read_import_chunks(file, filename, chunk_size=IMPORT_CHUNK_SIZE):
+    if filename.lower().endswith((".xlsx", ".xlsm")):
+        return read_excel_chunks(file, chunk_size)
+    return read_csv_chunks(file, chunk_size)
+
+
+def clean_text(value):
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)  # Excel hands numeric barcodes back as floats
+    return str(value).strip()
+
+
+def validate_import_chunk(chunk, categories, units):
+    chunk.columns = [clean_text(c).lower().replace(" ", "_") for c in chunk.columns]
+    missing = [c for c in IMPORT_REQUIRED if c not in chunk.columns]
+    if missing:
+        raise ValueError(f"Missing required column(s): {', '.join(missing)}")
+
+    category_lookup = {c.lower(): c for c in categories}
+    unit_lookup = {u.lower(): u for u in units}
+
+    valid, rejected = [], []
+    for record in chunk.to_dict("records"):
+        row = {c: clean_text(record.get(c)) for c in IMPORT_REQUIRED}
+        errors = [f"{c} is required" for c in ("name", "barcode") if not row[c]]
+
+        category = category_lookup.get(row["category"].lower())
+        if category is None:
+            errors.append(f"unknown category '{row['category']}'")
+        unit = unit_lookup.get(row["unit"].lower())
+        if unit is None:
+            errors.append(f"unknown unit '{row['unit']}'")
+        row["category"], row["unit"] = category, unit
+
+        for column in IMPORT_NUMERIC:
+            text = clean_text(record.get(column))
+            if not text:
+                row[column] = None
+                continue
+            try:
+                row[column] = float(text)
+            except ValueError:
+                errors.append(f"{column} is not a number")
+                continue
+            if row[column] < 0:
+                errors.append(f"{column} is negative")
+
+        if errors:
+            rejected.append({**record, "rejection_reason": "; ".join(errors)})
+        else:
+            valid.append(row)
+    return valid, rejected
+
+
+# ---------------- CATALOG API ----------------
+class Catalog:
+    # Product reads, writes and lookups over an explicit ConnectionManager
+
+    def __init__(self, db, cache=None, loader=None):
+        self.db = db
+        self.cache = cache if cache is not None else QueryCache(db)
+        self.index = ProductIndex(db, loader)
+
+    # ---- reads ----
+    def get(self, product_id):
+        row = self.db.read_connection().execute(
+            "SELECT * FROM products WHERE product_id=?", (product_id,)
+        ).fetchone()
+        return dict(row) if row else None
+
+    def barcode_exists(self, barcode):
+        return self.db.read_connection().execute(
+            "SELECT 1 FROM products WHERE barcode=?", (barcode,)
+        ).fetchone() is not None
+
+    def search(self, text, limit=SEARCH_LIMIT):
+        if self.db.dialect == "postgresql":
+            query = tsquery(text)
+            if not query:
+                return pd.DataFrame()
+            return self.cache.read_sql(f"""
+                SELECT * FROM products
+                WHERE {PRODUCT_TSVECTOR} @@ to_tsquery('simple', ?)
+                ORDER BY ts_rank({PRODUCT_TSVECTOR}, to_tsquery('simple', ?)) DESC, product_id
+                LIMIT ?
+            """, self.db.read_connection(), params=(query, query, limit), tables=("products",))
+        query = fts_query(text)
+        if not query:
+            return pd.DataFrame()
+        # bm25 weights: name > barcode > category
+        return self.cache.read_sql("""
+            SELECT p.*
+            FROM products_fts
+            JOIN products p ON p.product_id = products_fts.rowid
+            WHERE products_fts MATCH ?
+            ORDER BY bm25(products_fts, 10.0, 5.0, 1.0)
+            LIMIT ?
+        """, self.db.read_connection(), params=(query, limit), tables=("products",))
+
+    def page(self, sort_column="product_id", direction="DESC", after=None,
+             category=None, low_stock=False, page_size=50):
+        # Keyset pagination: seek past the last row of the previous page
+        # (after = (sort value, product_id)) instead of using OFFSET
+        clauses, params = catalog_where(category, low_stock)
+        if after is not None:
+            op = "<" if direction == "DESC" else ">"
+            if sort_column == "product_id":
+                clauses.append(f"product_id {op} ?")
+                params.append(after[1])
+            else:
+                value, product_id = after
+                if value != value:  # NaN: how pandas shows a NULL number
+                    value = None
+                key, bound = sort_key(sort_column), f"COALESCE(?, {CATALOG_SORT_NULLS[sort_column]})"
+                # The plain bound is redundant, but SQLite only seeks an
+                # expression index on it, not on the row comparison
+                clauses.append(f"{key} {op}= {bound} AND ({key}, product_id) {op} ({bound}, ?)")
+                params.extend([value, value, product_id])
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        # One extra row tells us whether there is a next page
+        df = self.cache.read_sql(f"""
+            SELECT * FROM products
+            {where}
+            ORDER BY {sort_key(sort_column)} {direction}, product_id {direction}
+            LIMIT ?
+        """, self.db.read_connection(), params=params + [page_size + 1], tables=("products",))
+        return df.iloc[:page_size], len(df) > page_size
+
+    def count(self, category=None, low_stock=False):
+        clauses, params = catalog_where(category, low_stock)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        df = self.cache.read_sql(f"SELECT COUNT(*) AS n FROM products {where}",
+                                 self.db.read_connection(), params=params, tables=("products",))
+        return int(df['n'].iloc[0])
+
+    # ---- POS lookups (in-memory index) ----
+    def lookup_barcode(self, barcode):
+        return self.index.lookup_barcode(barcode)
+
+    def lookup_name(self, name):
+        return self.index.lookup_name(name)
+
+    def grocery_names(self):
+        return self.index.grocery_names()
+
+    def is_empty(self):
+        return len(self.index) == 0
+
+    def refresh(self, product_ids):
+        self.index.refresh(product_ids)
+
+    # ---- writes ----
+    def add(self, name, barcode, category, unit, purchase_price,
+            selling_price, stock_quantity, minimum_stock):
+        product_id = self.db.write(insert_product, name, barcode, category, unit,
+                                   purchase_price, selling_price,
+                                   stock_quantity, minimum_stock)
+        self.index.refresh([product_id])
+        return product_id
+
+    def update(self, product_id, name, barcode, category, unit, purchase_price,
+               selling_price, stock_quantity, minimum_stock):
+        self.db.write(update_product, product_id, name, barcode, category, unit,
+                      purchase_price, selling_price, stock_quantity, minimum_stock)
+        self.index.refresh([product_id])
+
+    def delete(self, product_id):
+        self.db.write(delete_product, product_id)
+        self.index.refresh([product_id])
+
+    def import_file(self, file, filename, categories=CATEGORIES, units=UNITS,
+                    chunk_size=IMPORT_CHUNK_SIZE, progress=None):
+        # Streams the file chunk by chunk; each chunk is one upsert write job.
+        # The next chunk is validated while the previous one commits.
+        stats = {"imported": 0, "rejected": 0}
+        rejected_out = StringIO()
+        pending = None
+        try:
+            for chunk, fraction in read_import_chunks(file, filename, chunk_size):
+                rows, rejected = validate_import_chunk(chunk, categories, units)
+                if pending is not None:
+                    stats["imported"] += pending.result()
+                    pending = None
+                if rows:
+                    pending = self.db.submit(upsert_products, rows)
+                if rejected:
+                    pd.DataFrame(rejected).to_csv(rejected_out, header=stats["rejected"] == 0, index=False)
+                    stats["rejected"] += len(rejected)
+                if progress:
+                    progress(min(fraction, 1.0), stats)
+            if pending is not None:
+                stats["imported"] += pending.result()
+        finally:
+            self.index.invalidate()
+        return stats, rejected_out.getvalue()
@@ -0,0 +1,128 @@
+from .db import writes
+from .inventory import INVENTORY_TABLES, STOCK_EPSILON, record_movements
+from .rollups import ROLLUP_TABLES, add_sale_to_rollups
+
+PAYMENT_METHODS = ["Cash","Card","Bkash","Nagad","Rocket"]
+
+# ---------------- CHECKOUT ----------------
+class CheckoutError(Exception):
+    def __init__(self, failures):
+        super().__init__("; ".join(failures))
+        self.failures = failures
+
+
+@writes("sales", "sale_items", "products", *ROLLUP_TABLES, *INVENTORY_TABLES)
+def record_sale(cursor, customer_id, employee_id, cart, total,
+                payment_method, amount_received, change_amount,
+                client_uuid=None, created_at=None):
+    # client_uuid/created_at come from till journals replaying offline sales
+    # Runs inside an open BEGIN IMMEDIATE transaction, so the stock we read
+    # here can't change underneath us before the decrement.
+    needed = {}
+    for item in cart:
+        pid = int(item['product_id'])
+        needed[pid] = needed.get(pid, 0.0) + float(item['quantity'])
+
+    placeholders = ",".join("?" * len(needed))
+    stock = {
+        row['product_id']: row
+        for row in cursor.execute(
+            f"SELECT product_id, name, unit, stock_quantity, purchase_price FROM products WHERE product_id IN ({placeholders})",
+            list(needed)
+        )
+    }
+
+    failures = []
+    for item in cart:
+        pid = int(item['product_id'])
+        row = stock.get(pid)
+        if row is None:
+            failures.append(f"{item['product']}: product no longer exists")
+        elif row['stock_quantity'] - needed[pid] < -STOCK_EPSILON:
+            failures.append(
+                f"{item['product']}: only {row['stock_quantity']:g} {item['unit']} in stock, "
+                f"{needed[pid]:g} requested"
+            )
+    if failures:
+        raise CheckoutError(failures)
+
+    cursor.execute("""
+        INSERT INTO sales
+        (customer_id, employee_id, total_amount,
+         payment_method, amount_received, change_amount, client_uuid, created_at)
+        VALUES (?,?,?,?,?,?,?,COALESCE(?, CURRENT_TIMESTAMP))
+        RETURNING sale_id, DATE(created_at), created_at
+    """, (customer_id, employee_id, total,
+          payment_method, amount_received, change_amount, client_uuid, created_at))
+    sale_id, sale_date, created_at = cursor.fetchone()
+
+    # Snapshot name, unit and cost so reports never need the products table
+    line_rows = []
+    for item in cart:
+        product = stock[int(item['product_id'])]
+        line_rows.append((sale_id, product['product_id'], product['name'], product['unit'],
+                          item['quantity'], item['unit_price'], item['total_price'],
+                          product['purchase_price'] or 0.0))
+    cursor.executemany("""
+        INSERT INTO sale_items
+        (sale_id, product_id, product_name, unit, quantity, unit_price, total_price, unit_cost)
+        VALUES (?,?,?,?,?,?,?,?)
+    """, line_rows)
+
+    # The WHERE clause is the real oversell guard: a row that would go
+    # below zero is simply not updated, and the rowcount check aborts the sale.
+    # Rows are locked in product_id order so concurrent PostgreSQL checkouts
+    # can't deadlock on each other.
+    cursor.executemany("""
+        UPDATE products
+        SET stock_quantity = stock_quantity - ?
+        WHERE product_id = ? AND stock_quantity - ? >= ?
+    """, [(qty, pid, qty, -STOCK_EPSILON) for pid, qty in sorted(needed.items())])
+    if cursor.rowcount != len(needed):
+        raise CheckoutError(["Stock changed during checkout, please try again"])
+
+    record_movements(cursor, [(pid, "sale", -qty, stock[pid]['purchase_price'], sale_id, None, None, created_at)
+                              for pid, qty in sorted(needed.items())])
+
+    revenue = {}
+    for item in cart:
+        pid = int(item['product_id'])
+        revenue[pid] = revenue.get(pid, 0.0) + float(item['total_price'])
+    lines = [(pid, stock[pid]['name'], qty, revenue[pid],
+              qty * (stock[pid]['purchase_price'] or 0.0))
+             for pid, qty in sorted(needed.items())]
+    add_sale_to_rollups(cursor, sale_date, payment_method, total,
+                        amount_received, change_amount, lines)
+
+    return sale_id
+
+
+# ---------------- CHECKOUT API ----------------
+class Checkout:
+    # Turns a cart into a recorded sale; catalog (optional) gets its
+    # product index patched with the new stock levels
+
+    def __init__(self, db, catalog=None):
+        self.db = db
+        self.catalog = catalog
+
+    def settle(self, total, payment_method, amount_received=None):
+        # Returns (amount_received, change_amount); only cash can be short
+        if payment_method != "Cash":
+            return total, 0.0
+        amount_received = float(amount_received or 0.0)
+        if amount_received < total:
+            raise CheckoutError(["Insufficient cash received!"])
+        return amount_received, amount_received - total
+
+    def confirm(self, cart, customer_id, employee_id, payment_method, amount_received=None):
+        items = list(cart)
+        if not items:
+            raise CheckoutError(["Cart is empty"])
+        total = sum(item['total_price'] for item in items)
+        amount_received, change_amount = self.settle(total, payment_method, amount_received)
+        sale_id = self.db.write(record_sale, customer_id, employee_id, items, total,
+                                payment_method, amount_received, change_amount)
+        if self.catalog is not None:
+            self.catalog.refresh(int(item['product_id']) for item in items)
+        return sale_id
@@ -0,0 +1,455 @@
+import logging
+import os
+import queue
+import re
+import select
+import sqlite3
+import threading
+import time
+import uuid
+import weakref
+from concurrent.futures import Future
+
+from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import QueuePool
+
+from .diagnostics import metrics
+
+# ---------------- DATABASE CONNECTION ----------------
+DB_PATH = "supershop.db"
+# A SQLAlchemy URL (e.g. postgresql+psycopg2://pos@localhost/supershop) or a
+# SQLite file path; a single till is fine on SQLite, a multi-till store wants PostgreSQL
+DATABASE = os.environ.get("SUPERSHOP_DATABASE_URL") or DB_PATH
+READ_POOL_SIZE = 4
+PG_POOL_SIZE = 10
+PG_MAX_OVERFLOW = 40
+BUSY_TIMEOUT_MS = 5000
+GROUP_COMMIT_MAX = 64  # most write jobs committed together in one transaction
+EXTERNAL_CHECK_INTERVAL = 1.0  # seconds between idle checks for other processes' commits
+NOTIFY_CHANNEL = "supershop_writes"
+
+log = logging.getLogger(__name__)
+
+# Catch these for constraint violations (e.g. a duplicate barcode) on either backend
+try:
+    import psycopg2  # only installed for PostgreSQL
+    INTEGRITY_ERRORS = (sqlite3.IntegrityError, psycopg2.IntegrityError)
+    DATA_ERRORS = (sqlite3.DataError, psycopg2.DataError)  # a value the column can't take
+except ImportError:
+    INTEGRITY_ERRORS = (sqlite3.IntegrityError,)
+    DATA_ERRORS = (sqlite3.DataError,)
+
+
+def open_connection(path=DB_PATH):
+    conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT_MS / 1000, check_same_thread=False,
+                           factory=SqliteConnection)
+    conn.row_factory = sqlite3.Row  # allows dict-like access
+    conn.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    return conn
+
+
+def database_url(database):
+    # A bare path means a SQLite file
+    return database if "://" in database else f"sqlite:///{database}"
+
+
+def create_db_engine(url, pool_size=None):
+    url = make_url(url)
+    if url.get_backend_name() == "sqlite":
+        path = url.database or DB_PATH
+        # Our own connect function keeps the pragmas and sqlite3.Row rows;
+        # overflow is unbounded because every thread holds one read connection
+        return create_engine("sqlite://", creator=lambda: open_connection(path),
+                             poolclass=QueuePool, pool_size=pool_size or READ_POOL_SIZE,
+                             max_overflow=-1)
+    return create_engine(url, pool_size=pool_size or PG_POOL_SIZE, max_overflow=PG_MAX_OVERFLOW,
+                         pool_pre_ping=True,
+                         connect_args={"options": "-c timezone=UTC"})  # CURRENT_TIMESTAMP in UTC, as on SQLite
+
+
+def writes(*tables):
+    # Declares the tables a write job modifies so the query cache can
+    # invalidate just those; undecorated jobs invalidate everything.
+    def mark(fn):
+        fn.tables = tables
+        return fn
+    return mark
+
+
+# ---------------- PORTABLE CURSORS ----------------
+# Write jobs and readers use sqlite3-style SQL (? or :name placeholders,
+# chained execute(), rows by index or column name) on either backend.
+# cursor.dialect lets the few dialect-specific statements branch.
+NAMED_PARAM = re.compile(r"(?<![:\w]):(\w+)")
+
+
+class StatementTimer:
+    # Times each statement from execute() until its last row is fetched (or
+    # the next execute/close) and reports it to diagnostics; SQLite only runs
+    # a query as its rows are read, so timing execute() alone would miss most
+    _sql = None
+    _elapsed = 0.0
+
+    def _timed(self, sql, call, *args):
+        self._finish()
+        start = time.perf_counter()
+        try:
+            return call(*args)
+        finally:
+            self._sql, self._elapsed = sql, time.perf_counter() - start
+            if self.description is None:  # no rows to wait for
+                self._finish()
+
+    def _fetched(self, start, rows, done):
+        self._elapsed += time.perf_counter() - start
+        if done:
+            self._finish()
+        return rows
+
+    def _finish(self):
+        if self._sql is not None:
+            metrics.record("sql", self._sql, self._elapsed)
+            self._sql = None
+
+
+class SqliteCursor(StatementTimer, sqlite3.Cursor):
+    dialect = "sqlite"
+
+    def execute(self, sql, params=()):
+        return self._timed(sql, super().execute, sql, params)
+
+    def executemany(self, sql, rows):
+        return self._timed(sql, super().executemany, sql, rows)
+
+    def fetchone(self):
+        start = time.perf_counter()
+        return self._fetched(start, super().fetchone(), True)
+
+    def fetchmany(self, size=None):
+        size = size or self.arraysize
+        start = time.perf_counter()
+        rows = super().fetchmany(size)
+        return self._fetched(start, rows, len(rows) < size)
+
+    def fetchall(self):
+        start = time.perf_counter()
+        return self._fetched(start, super().fetchall(), True)
+
+    def __next__(self):
+        start = time.perf_counter()
+        try:
+            row = super().__next__()
+        except StopIteration:
+            self._fetched(start, None, True)
+            raise
+        self._elapsed += time.perf_counter() - start
+        return row
+
+    def close(self):
+        self._finish()
+        super().close()
+
+
+class SqliteConnection(sqlite3.Connection):
+    # Hands out timed SqliteCursors, conn.execute() shortcuts included
+
+    def cursor(self, factory=SqliteCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, params=()):
+        return self.cursor().execute(sql, params)
+
+    def executemany(self, sql, rows):
+        return self.cursor().executemany(sql, rows)
+
+
+def to_pyformat(sql, named):
+    sql = sql.replace("%", "%%")
+    return NAMED_PARAM.sub(r"%(\1)s", sql) if named else sql.replace("?", "%s")
+
+
+class PortableCursor(StatementTimer):
+    # psycopg2 cursor speaking the SQLite placeholder styles
+    dialect = "postgresql"
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def execute(self, sql, params=()):
+        if params:
+            self._timed(sql, self._cursor.execute, to_pyformat(sql, isinstance(params, dict)), params)
+        else:
+            self._timed(sql, self._cursor.execute, sql)
+        return self
+
+    def executemany(self, sql, rows):
+        rows = list(rows)
+        if rows:
+            self._timed(sql, self._cursor.executemany, to_pyformat(sql, isinstance(rows[0], dict)), rows)
+        return self
+
+    def fetchone(self):
+        start = time.perf_counter()
+        return self._fetched(start, self._cursor.fetchone(), True)
+
+    def fetchmany(self, size):
+        start = time.perf_counter()
+        rows = self._cursor.fetchmany(size)
+        return self._fetched(start, rows, len(rows) < size)
+
+    def fetchall(self):
+        start = time.perf_counter()
+        return self._fetched(start, self._cursor.fetchall(), True)
+
+    def __iter__(self):
+        # Rows arrive with execute() unless server-side, which fetchmany() streams
+        while True:
+            rows = self.fetchmany(self._cursor.itersize)
+            yield from rows
+            if len(rows) < self._cursor.itersize:
+                return
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    def close(self):
+        self._finish()
+        self._cursor.close()
+
+
+class PortableConnection:
+    # Pooled psycopg2 read connection with sqlite3's conn.execute() shortcut
+
+    def __init__(self, conn):
+        self._conn = conn
+
+    def execute(self, sql, params=()):
+        from psycopg2.extras import DictCursor
+        return PortableCursor(self._conn.cursor(cursor_factory=DictCursor)).execute(sql, params)
+
+    def cursor(self):
+        # Server-side, so big exports stream in fetchmany() chunks instead of
+        # arriving all at once; WITH HOLD works outside a transaction
+        from psycopg2.extras import DictCursor
+        return PortableCursor(self._conn.cursor(name=f"supershop_{uuid.uuid4().hex}",
+                                                withhold=True, cursor_factory=DictCursor))
+
+    def close(self):
+        self._conn.close()
+
+
+class ConnectionManager:
+    # Built on a SQLAlchemy engine picked by URL (a bare path means SQLite).
+    # SQLite: a single writer thread owns the write connection and commits
+    # queued jobs in groups. PostgreSQL: each write runs in the caller's thread
+    # on a pooled connection, so tills write concurrently.
+    # On both, reads use pooled connections, each lent to one thread at a time.
+
+    def __init__(self, database=DATABASE, pool_size=None, max_batch=GROUP_COMMIT_MAX):
+        self.url = database_url(database)
+        self.engine = create_db_engine(self.url, pool_size)
+        self.dialect = self.engine.dialect.name
+        self.max_batch = max_batch
+        self._listeners = []
+        self._local = threading.local()
+        if self.dialect == "sqlite":
+            self._write_conn = self.engine.raw_connection()
+            self._write_conn.execute("PRAGMA journal_mode = WAL")
+            self._jobs = queue.Queue()
+            self._external_version = None
+            self._writer = threading.Thread(target=self._writer_loop, name="supershop-writer", daemon=True)
+        else:
+            self._token = uuid.uuid4().hex  # tags our own NOTIFYs
+            self._closed = threading.Event()
+            self._writer = threading.Thread(target=self._listen_loop, name="supershop-listener", daemon=True)
+        self._writer.start()
+
+    def read_connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self.engine.raw_connection()
+            if self.dialect != "sqlite":
+                conn.dbapi_connection.autocommit = True  # each read sees the latest commits
+                conn = PortableConnection(conn)
+            self._local.conn = conn
+            # Hand the connection back to the pool once the thread is gone
+            weakref.finalize(threading.current_thread(), conn.close)
+        return conn
+
+    # ---- writes ----
+    # A job is fn(cursor, *args) -> result. The future resolves only after the
+    # transaction holding it has committed, or with the job's own exception.
+    def submit(self, fn, *args, **kwargs):
+        future = Future()
+        if self.dialect == "sqlite":
+            self._jobs.put((fn, args, kwargs, future))
+        elif future.set_running_or_notify_cancel():
+            try:
+                future.set_result(self._run_job(fn, args, kwargs))
+            except Exception as e:
+                future.set_exception(e)
+        return future
+
+    def write(self, fn, *args, **kwargs):
+        return self.submit(fn, *args, **kwargs).result()
+
+    # Listeners are called after each commit with the set of tables written,
+    # or None when we can't tell (e.g. another process wrote).
+    def add_commit_listener(self, fn):
+        self._listeners.append(fn)
+
+    def _notify(self, tables):
+        # A broken listener must not take the writer thread down with it
+        for fn in self._listeners:
+            try:
+                fn(tables)
+            except Exception:
+                log.exception("Commit listener %r failed", fn)
+
+    # ---- PostgreSQL ----
+    def _run_job(self, fn, args, kwargs):
+        from psycopg2.extras import DictCursor
+        conn = self.engine.raw_connection()
+        try:
+            conn.dbapi_connection.autocommit = False
+            cursor = PortableCursor(conn.cursor(cursor_factory=DictCursor))
+            try:
+                result = fn(cursor, *args, **kwargs)
+                # Delivered at commit, so other processes drop their caches
+                cursor.execute("SELECT pg_notify(?, ?)", (NOTIFY_CHANNEL, self._token))
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+            finally:
+                cursor.close()
+        finally:
+            conn.close()
+        job_tables = getattr(fn, "tables", None)
+        self._notify(None if job_tables is None else set(job_tables))
+        return result
+
+    def _listen_loop(self):
+        # PostgreSQL's stand-in for data_version: every write job NOTIFYs,
+        # and any notification without our token is a foreign write
+        while not self._closed.is_set():
+            try:
+                conn = self.engine.raw_connection()
+            except Exception:
+                self._closed.wait(EXTERNAL_CHECK_INTERVAL)
+                continue
+            try:
+                pg = conn.dbapi_connection
+                pg.autocommit = True
+                pg.cursor().execute(f"LISTEN {NOTIFY_CHANNEL}")
+                self._notify(None)  # we weren't listening until now
+                while not self._closed.is_set():
+                    if select.select([pg], [], [], EXTERNAL_CHECK_INTERVAL)[0]:
+                        pg.poll()
+                        foreign = any(n.payload != self._token for n in pg.notifies)
+                        pg.notifies.clear()
+                        if foreign:
+                            self._notify(None)
+                pg.cursor().execute("UNLISTEN *")
+            except Exception:
+                self._closed.wait(EXTERNAL_CHECK_INTERVAL)
+            finally:
+                conn.close()
+
+    # ---- SQLite ----
+    def _check_external_writes(self):
+        # On the write connection data_version only moves when *another*
+        # connection commits, so any change here is a foreign write.
+        version = self._write_conn.execute("PRAGMA data_version").fetchone()[0]
+        if self._external_version is not None and version != self._external_version:
+            self._notify(None)
+        self._external_version = version
+
+    def _writer_loop(self):
+        while True:
+            try:
+                job = self._jobs.get(timeout=EXTERNAL_CHECK_INTERVAL)
+            except queue.Empty:
+                try:
+                    self._check_external_writes()
+                except Exception:
+                    log.exception("Checking for other processes' writes failed")
+                continue
+            if job is None:
+                break
+            batch = [job]
+            # Group commit: take whatever else is already waiting
+            while len(batch) < self.max_batch:
+                try:
+                    job = self._jobs.get_nowait()
+                except queue.Empty:
+                    break
+                if job is None:
+                    self._jobs.put(None)
+                    break
+                batch.append(job)
+            self._commit_batch(batch)
+        self._write_conn.close()
+
+    def _commit_batch(self, batch):
+        done = []
+        tables = set()
+        cursor = self._write_conn.cursor(SqliteCursor)
+        try:
+            cursor.execute("BEGIN IMMEDIATE")
+            # Nobody else can commit while we hold the write lock, so this
+            # catches every foreign write up to the start of our batch
+            self._check_external_writes()
+            for fn, args, kwargs, future in batch:
+                if not future.set_running_or_notify_cancel():
+                    continue
+                # Each job gets a savepoint so one failure doesn't sink the group
+                cursor.execute("SAVEPOINT job")
+                try:
+                    result = fn(cursor, *args, **kwargs)
+                except Exception as e:
+                    cursor.execute("ROLLBACK TO SAVEPOINT job")
+                    cursor.execute("RELEASE SAVEPOINT job")
+                    done.append((future, None, e))
+                else:
+                    cursor.execute("RELEASE SAVEPOINT job")
+                    done.append((future, result, None))
+                    job_tables = getattr(fn, "tables", None)
+                    tables = None if tables is None or job_tables is None else tables | set(job_tables)
+            self._write_conn.commit()
+        except BaseException as e:
+            self._write_conn.rollback()
+            # Jobs we never got to (e.g. BEGIN itself failed) are still pending
+            for _, _, _, future in batch:
+                if future.running() or future.set_running_or_notify_cancel():
+                    future.set_exception(e)
+            return
+        finally:
+            cursor.close()
+
+        # Invalidate caches before waking callers so they read their own writes;
+        # the batch is committed, so they wake whatever happens here
+        try:
+            if tables is None or tables:
+                self._notify(tables)
+        finally:
+            for future, result, error in done:
+                if error is not None:
+                    future.set_exception(error)
+                else:
+                    future.set_result(result)
+
+    def close(self):
+        if self.dialect == "sqlite":
+            self._jobs.put(None)
+        else:
+            self._closed.set()
+        self._writer.join()
+        self.engine.dispose()
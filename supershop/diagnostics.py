@@ -0,0 +1,168 @@
+import bisect
+import contextlib
+import datetime
+import functools
+import json
+import os
+import re
+import threading
+import time
+from collections import deque
+
+import pandas as pd
+
+# ---------------- DIAGNOSTICS ----------------
+# Process-wide timings, so a slow click can be split into SQL, pandas, PDF
+# rendering and Streamlit. Every timing lands in a latency histogram keyed by
+# (kind, name); kinds are "sql" (one statement, execute to last row fetched),
+# "dataframe" (building a query's DataFrame), "memo", "rerun" (a full script
+# run, per module) and "fragment". SQL is normalized first so a statement
+# counts once whatever its literals or IN-list length. Slow statements also
+# go to a bounded slow-query log.
+# Set SUPERSHOP_METRICS_LOG=<path> to append every timing there as a JSON line.
+LATENCY_BUCKETS_MS = [0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000]
+SLOW_QUERY_MS = 50.0
+SLOW_LOG_SIZE = 200
+SQL_KINDS = ("sql", "dataframe")
+METRICS_LOG = os.environ.get("SUPERSHOP_METRICS_LOG") or None
+
+SQL_LITERAL = re.compile(r"'(?:[^']|'')*'|(?<![\w.])\d+(?:\.\d+)?\b")
+PLACEHOLDER_LIST = re.compile(r"\(\s*(?:\?|%s)(?:\s*,\s*(?:\?|%s))+\s*\)")
+
+
+@functools.lru_cache(maxsize=1024)
+def normalize_sql(sql):
+    # "SELECT * FROM products WHERE product_id IN (?,?,?) LIMIT 50"
+    #   -> "SELECT * FROM products WHERE product_id IN (...) LIMIT ?"
+    sql = " ".join(SQL_LITERAL.sub("?", sql).split())
+    return PLACEHOLDER_LIST.sub("(...)", sql)
+
+
+def bucket_labels():
+    bounds = [f"{b:g}" for b in LATENCY_BUCKETS_MS]
+    return [f"≤{b} ms" for b in bounds] + [f">{bounds[-1]} ms"]
+
+
+class Histogram:
+    # Counts per latency bucket, plus exact count / total / max
+
+    def __init__(self):
+        self.buckets = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def add(self, ms):
+        self.buckets[bisect.bisect_left(LATENCY_BUCKETS_MS, ms)] += 1
+        self.count += 1
+        self.total_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+
+    def percentile(self, p):
+        # Upper bound of the bucket holding the p-th sample (max if it's the last)
+        rank = p * self.count
+        seen = 0
+        for i, n in enumerate(self.buckets):
+            seen += n
+            if n and seen >= rank:
+                return min(LATENCY_BUCKETS_MS[i], self.max_ms) if i < len(LATENCY_BUCKETS_MS) else self.max_ms
+        return self.max_ms
+
+
+class Metrics:
+
+    def __init__(self, slow_ms=SLOW_QUERY_MS, slow_log_size=SLOW_LOG_SIZE, log_path=METRICS_LOG):
+        self.slow_ms = slow_ms
+        self.log_path = log_path
+        self.started_at = datetime.datetime.now()
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._slow = deque(maxlen=slow_log_size)
+        self._log = None
+
+    def record(self, kind, name, seconds):
+        if kind in SQL_KINDS:
+            name = normalize_sql(name)
+        ms = seconds * 1000
+        with self._lock:
+            histogram = self._histograms.get((kind, name))
+            if histogram is None:
+                histogram = self._histograms[(kind, name)] = Histogram()
+            histogram.add(ms)
+            if kind == "sql" and ms >= self.slow_ms:
+                self._slow.append((datetime.datetime.now(), round(ms, 3), name))
+            if self.log_path:
+                if self._log is None:
+                    self._log = open(self.log_path, "a", encoding="utf-8")
+                self._log.write(json.dumps({"at": time.time(), "kind": kind, "name": name,
+                                            "ms": round(ms, 3)}) + "\n")
+                self._log.flush()
+
+    @contextlib.contextmanager
+    def timed(self, kind, name):
+        # Recorded however the block ends, st.stop() and st.rerun() included
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(kind, name, time.perf_counter() - start)
+
+    def instrument(self, kind, name=None):
+        # Decorator form of timed(), named after the function by default
+        def wrap(fn):
+            @functools.wraps(fn)
+            def timed_fn(*args, **kwargs):
+                with self.timed(kind, name or fn.__name__):
+                    return fn(*args, **kwargs)
+            return timed_fn
+        return wrap
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._slow.clear()
+            self.started_at = datetime.datetime.now()
+
+    # ---- reads ----
+    def _snapshot(self):
+        with self._lock:
+            return ([(kind, name, h.count, h.total_ms, h.max_ms, list(h.buckets),
+                      h.percentile(0.5), h.percentile(0.95), h.percentile(0.99))
+                     for (kind, name), h in self._histograms.items()],
+                    list(self._slow))
+
+    def summary(self, kind=None):
+        # One row per (kind, name), where the time went first
+        rows = [(k, name, count, total / count, p50, p95, p99, max_ms, total)
+                for k, name, count, total, max_ms, _, p50, p95, p99 in self._snapshot()[0]
+                if kind is None or k == kind]
+        df = pd.DataFrame(rows, columns=["kind", "name", "count", "mean_ms", "p50_ms", "p95_ms",
+                                         "p99_ms", "max_ms", "total_ms"])
+        return df.sort_values("total_ms", ascending=False, ignore_index=True).round(3)
+
+    def histogram(self, kind, name):
+        # Samples per latency bucket for one (kind, name)
+        for k, n, _, _, _, buckets, _, _, _ in self._snapshot()[0]:
+            if (k, n) == (kind, name):
+                return pd.DataFrame({"latency": bucket_labels(), "count": buckets})
+        return pd.DataFrame({"latency": bucket_labels(), "count": 0})
+
+    def slow_queries(self):
+        # Newest first
+        return pd.DataFrame(reversed(self._snapshot()[1]), columns=["at", "ms", "sql"])
+
+    def to_jsonl(self):
+        # Everything aggregated so far, one JSON object per line
+        histograms, slow = self._snapshot()
+        labels = bucket_labels()
+        lines = [{"type": "histogram", "kind": k, "name": name, "count": count,
+                  "total_ms": round(total, 3), "max_ms": round(max_ms, 3),
+                  "buckets": dict(zip(labels, buckets))}
+                 for k, name, count, total, max_ms, buckets, _, _, _ in histograms]
+        lines += [{"type": "slow_query", "at": at.isoformat(timespec="seconds"), "ms": ms, "sql": sql}
+                  for at, ms, sql in slow]
+        return "".join(json.dumps(line) + "\n" for line in lines)
+
+
+# Shared by every connection, cursor and UI run in the process
+metrics = Metrics()
@@ -0,0 +1,96 @@
+import re
+
+from .cache import QueryCache
+from .db import writes
+
+EMPLOYEE_ROLES = ["Manager", "Cashier", "Salesman"]
+CUSTOMER_LOOKUP_LIMIT = 20
+PHONE_PREFIX = re.compile(r"\+?[\d\s-]+")  # what a cashier types when looking up by phone
+
+# Customer typeahead, one prefix query per dialect and column. Each one
+# range-scans its migration 9 index in order, so LIMIT stops it early.
+CUSTOMER_LOOKUPS = {
+    ("sqlite", "phone"): "WHERE phone LIKE ? ESCAPE '\\' ORDER BY phone COLLATE NOCASE, customer_id",
+    ("sqlite", "name"): "WHERE name LIKE ? ESCAPE '\\' ORDER BY name COLLATE NOCASE, customer_id",
+    ("postgresql", "phone"): """WHERE phone COLLATE "C" LIKE ? ESCAPE '\\' ORDER BY phone COLLATE "C", customer_id""",
+    ("postgresql", "name"): """WHERE lower(name) COLLATE "C" LIKE lower(?) ESCAPE '\\'
+                               ORDER BY lower(name) COLLATE "C", customer_id""",
+}
+
+
+def like_prefix(text):
+    # LIKE pattern matching text literally at the start of the column
+    return re.sub(r"([\\%_])", r"\\\1", text) + "%"
+
+
+# ---------------- WRITE JOBS ----------------
+@writes("customers")
+def insert_customer(cursor, name, phone, address):
+    cursor.execute(
+        "INSERT INTO customers (name, phone, address) VALUES (?,?,?) RETURNING customer_id",
+        (name, phone, address)
+    )
+    return cursor.fetchone()[0]
+
+
+@writes("employees")
+def insert_employee(cursor, name, role, salary, hired_date):
+    cursor.execute(
+        "INSERT INTO employees (name, role, salary, hired_date) VALUES (?,?,?,?) RETURNING employee_id",
+        (name, role, salary, hired_date)
+    )
+    return cursor.fetchone()[0]
+
+
+@writes("suppliers")
+def insert_supplier(cursor, name, phone, address):
+    cursor.execute(
+        "INSERT INTO suppliers (name, phone, address) VALUES (?,?,?) RETURNING supplier_id",
+        (name, phone, address)
+    )
+    return cursor.fetchone()[0]
+
+# ---------------- DIRECTORY API ----------------
+class Directory:
+    # Customers, employees and suppliers over an explicit ConnectionManager
+
+    def __init__(self, db, cache=None):
+        self.db = db
+        self.cache = cache if cache is not None else QueryCache(db)
+
+    def _read(self, sql, table, params=()):
+        return self.cache.read_sql(sql, self.db.read_connection(), params=params, tables=(table,))
+
+    def add_customer(self, name, phone, address):
+        return self.db.write(insert_customer, name, phone, address)
+
+    def add_employee(self, name, role, salary, hired_date):
+        return self.db.write(insert_employee, name, role, salary, hired_date)
+
+    def add_supplier(self, name, phone, address):
+        return self.db.write(insert_supplier, name, phone, address)
+
+    def customers(self):
+        return self._read("SELECT * FROM customers ORDER BY customer_id DESC", "customers")
+
+    def employees(self):
+        return self._read("SELECT * FROM employees ORDER BY employee_id DESC", "employees")
+
+    def suppliers(self):
+        return self._read("SELECT * FROM suppliers ORDER BY supplier_id DESC", "suppliers")
+
+    def find_customers(self, text, limit=CUSTOMER_LOOKUP_LIMIT):
+        # By phone prefix when it looks like a number, else by name prefix;
+        # an empty search lists the first customers by name
+        text = (text or "").strip()
+        column = "phone" if PHONE_PREFIX.fullmatch(text) else "name"
+        return self._read(
+            f"SELECT customer_id, name, phone FROM customers {CUSTOMER_LOOKUPS[self.db.dialect, column]} LIMIT ?",
+            "customers", params=(like_prefix(text), limit)
+        )
+
+    def has_customers(self):
+        return self.db.read_connection().execute("SELECT 1 FROM customers LIMIT 1").fetchone() is not None
+
+    def employee_choices(self):
+        return self._read("SELECT employee_id,name FROM employees", "employees")
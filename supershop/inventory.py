@@ -0,0 +1,246 @@
+import datetime
+
+from sqlalchemy import Column, DateTime, Float, Integer, Table, Text
+
+from .cache import QueryCache
+from .db import writes
+from .schema import NOW, create_table, metadata
+
+# ---------------- INVENTORY LEDGER ----------------
+# Every change to products.stock_quantity is also written, in the same
+# transaction, as a signed row in inventory_movements. Each product gets at
+# most one snapshot a day, taken with its first movement that day. A snapshot
+# always holds the sum of the product's movements up to snapshot_at, so stock
+# at any past moment is its latest snapshot plus a short indexed delta scan.
+MOVEMENT_TYPES = ["sale", "receipt", "adjustment", "return"]
+INVENTORY_TABLES = ["inventory_movements", "stock_snapshots"]
+SNAPSHOT_INTERVAL = datetime.timedelta(days=1)
+MOVEMENT_HISTORY_LIMIT = 200
+STOCK_EPSILON = 1e-9  # tolerance for fractional kg/gm quantities
+
+# On PostgreSQL CURRENT_TIMESTAMP is the transaction start, which can be
+# older than a concurrent sale that committed before our snapshot read stock
+SNAPSHOT_NOW = {"sqlite": "CURRENT_TIMESTAMP", "postgresql": "statement_timestamp()"}
+
+
+inventory_movements = Table(
+    "inventory_movements", metadata,
+    Column("movement_id", Integer, primary_key=True),
+    Column("product_id", Integer, nullable=False),
+    Column("movement_type", Text, nullable=False),
+    Column("quantity", Float, nullable=False),  # + into stock, - out of it
+    Column("unit_cost", Float),
+    Column("sale_id", Integer),
+    Column("supplier_id", Integer),
+    Column("note", Text),
+    Column("created_at", DateTime, nullable=False, server_default=NOW),
+    sqlite_autoincrement=True,
+)
+
+stock_snapshots = Table(
+    "stock_snapshots", metadata,
+    Column("product_id", Integer, primary_key=True),
+    Column("snapshot_at", DateTime, primary_key=True),
+    Column("quantity", Float, nullable=False),
+)
+
+
+class InventoryError(Exception):
+    pass
+
+
+def create_inventory_tables(cursor):
+    create_table(cursor, inventory_movements)
+    # Delta scans: one product's movements after its snapshot
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_inventory_movements_product
+        ON inventory_movements(product_id, created_at)
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_inventory_movements_supplier
+        ON inventory_movements(supplier_id) WHERE supplier_id IS NOT NULL
+    """)
+    create_table(cursor, stock_snapshots)
+
+
+def as_timestamp(when):
+    # Compared as 'YYYY-MM-DD HH:MM:SS' (UTC, like CURRENT_TIMESTAMP);
+    # a date means its midnight, i.e. that day's opening stock
+    if isinstance(when, datetime.datetime):
+        return when.strftime("%Y-%m-%d %H:%M:%S")
+    if isinstance(when, datetime.date):
+        return f"{when.isoformat()} 00:00:00"
+    return when
+
+
+def record_movements(cursor, movements):
+    # movements: [(product_id, movement_type, quantity, unit_cost, sale_id,
+    # supplier_id, note, created_at)], created_at None meaning now.
+    # Call after products.stock_quantity already reflects them.
+    movements = [m for m in movements if m[2]]
+    if not movements:
+        return
+    cursor.executemany("""
+        INSERT INTO inventory_movements
+        (product_id, movement_type, quantity, unit_cost, sale_id, supplier_id, note, created_at)
+        VALUES (?,?,?,?,?,?,?,COALESCE(?, CURRENT_TIMESTAMP))
+    """, movements)
+
+    # A movement dated at or before a snapshot (e.g. a replayed offline sale) belongs in it
+    cursor.executemany("""
+        UPDATE stock_snapshots SET quantity = quantity + ?
+        WHERE product_id = ? AND snapshot_at >= COALESCE(?, CURRENT_TIMESTAMP)
+    """, [(m[2], m[0], m[7]) for m in movements])
+
+    product_ids = sorted({m[0] for m in movements})
+    cutoff = as_timestamp(datetime.datetime.now(datetime.timezone.utc) - SNAPSHOT_INTERVAL)
+    placeholders = ",".join("?" * len(product_ids))
+    cursor.execute(f"""
+        INSERT INTO stock_snapshots (product_id, snapshot_at, quantity)
+        SELECT p.product_id, {SNAPSHOT_NOW[cursor.dialect]}, COALESCE(p.stock_quantity, 0)
+        FROM products p
+        WHERE p.product_id IN ({placeholders})
+        AND NOT EXISTS (SELECT 1 FROM stock_snapshots s
+                        WHERE s.product_id = p.product_id AND s.snapshot_at > ?)
+        ON CONFLICT (product_id, snapshot_at) DO NOTHING
+    """, product_ids + [cutoff])
+
+
+# ---------------- WRITE JOBS ----------------
+@writes("products", *INVENTORY_TABLES)
+def receive_stock(cursor, supplier_id, lines, note=None):
+    # lines: [(product_id, quantity, unit_cost)]; a unit_cost becomes the
+    # product's purchase price, None keeps the current one
+    if cursor.execute("SELECT 1 FROM suppliers WHERE supplier_id=?", (supplier_id,)).fetchone() is None:
+        raise InventoryError("Supplier not found")
+    movements = []
+    for product_id, quantity, unit_cost in sorted(lines):
+        if quantity <= 0:
+            raise InventoryError("Received quantity must be positive")
+        cursor.execute("""
+            UPDATE products SET
+            stock_quantity = COALESCE(stock_quantity, 0) + ?,
+            purchase_price = COALESCE(?, purchase_price)
+            WHERE product_id = ?
+        """, (quantity, unit_cost, product_id))
+        if cursor.rowcount != 1:
+            raise InventoryError(f"Product #{product_id} not found")
+        movements.append((product_id, "receipt", quantity, unit_cost, None, supplier_id, note, None))
+    record_movements(cursor, movements)
+    return len(movements)
+
+
+@writes("products", *INVENTORY_TABLES)
+def adjust_stock(cursor, product_id, quantity, movement_type="adjustment", note=None, sale_id=None):
+    # quantity is signed: a recount or damage write-off, or a customer return
+    if movement_type not in ("adjustment", "return"):
+        raise InventoryError(f"Unknown adjustment type: {movement_type}")
+    cursor.execute("""
+        UPDATE products SET stock_quantity = COALESCE(stock_quantity, 0) + ?
+        WHERE product_id = ? AND COALESCE(stock_quantity, 0) + ? >= ?
+    """, (quantity, product_id, quantity, -STOCK_EPSILON))
+    if cursor.rowcount != 1:
+        if cursor.execute("SELECT 1 FROM products WHERE product_id=?", (product_id,)).fetchone() is None:
+            raise InventoryError(f"Product #{product_id} not found")
+        raise InventoryError("Stock can't go below zero")
+    record_movements(cursor, [(product_id, movement_type, quantity, None, sale_id, None, note, None)])
+
+
+@writes(*INVENTORY_TABLES)
+def open_inventory(cursor):
+    # Opening balances for products with no ledger history yet: stock that
+    # predates the ledger, or a bulk-loaded catalog
+    cursor.execute("""
+        INSERT INTO inventory_movements (product_id, movement_type, quantity, note)
+        SELECT product_id, 'adjustment', stock_quantity, 'opening balance'
+        FROM products p
+        WHERE COALESCE(stock_quantity, 0) <> 0
+        AND NOT EXISTS (SELECT 1 FROM inventory_movements m WHERE m.product_id = p.product_id)
+    """)
+    cursor.execute(f"""
+        INSERT INTO stock_snapshots (product_id, snapshot_at, quantity)
+        SELECT product_id, {SNAPSHOT_NOW[cursor.dialect]}, COALESCE(stock_quantity, 0)
+        FROM products p
+        WHERE NOT EXISTS (SELECT 1 FROM stock_snapshots s WHERE s.product_id = p.product_id)
+    """)
+
+
+# ---------------- INVENTORY API ----------------
+class Inventory:
+    # Supplier receiving, stock adjustments and stock history; catalog
+    # (optional) gets its product index patched with the new stock levels
+
+    def __init__(self, db, cache=None, catalog=None):
+        self.db = db
+        self.cache = cache if cache is not None else QueryCache(db)
+        self.catalog = catalog
+
+    def _refresh(self, product_ids):
+        if self.catalog is not None:
+            self.catalog.refresh(product_ids)
+
+    # ---- writes ----
+    def receive(self, supplier_id, lines, note=None):
+        count = self.db.write(receive_stock, supplier_id, lines, note)
+        self._refresh(pid for pid, _, _ in lines)
+        return count
+
+    def adjust(self, product_id, quantity, movement_type="adjustment", note=None, sale_id=None):
+        self.db.write(adjust_stock, product_id, quantity, movement_type, note, sale_id)
+        self._refresh([product_id])
+
+    # ---- reads ----
+    def movements(self, product_id=None, limit=MOVEMENT_HISTORY_LIMIT):
+        where, params = "", []
+        if product_id is not None:
+            where, params = "WHERE m.product_id = ?", [product_id]
+        return self.cache.read_sql(f"""
+            SELECT m.movement_id, m.created_at, m.product_id, p.name, m.movement_type,
+                   m.quantity, m.unit_cost, m.sale_id, s.name AS supplier, m.note
+            FROM inventory_movements m
+            LEFT JOIN products p ON p.product_id = m.product_id
+            LEFT JOIN suppliers s ON s.supplier_id = m.supplier_id
+            {where}
+            ORDER BY m.movement_id DESC
+            LIMIT ?
+        """, self.db.read_connection(), params=params + [limit],
+            tables=("products", "suppliers", *INVENTORY_TABLES))
+
+    def stock_at(self, product_id, when):
+        # Stock on hand just before `when`
+        when = as_timestamp(when)
+        conn = self.db.read_connection()
+        snapshot = conn.execute("""
+            SELECT snapshot_at, quantity FROM stock_snapshots
+            WHERE product_id = ? AND snapshot_at < ?
+            ORDER BY snapshot_at DESC
+            LIMIT 1
+        """, (product_id, when)).fetchone()
+        if snapshot is None:
+            delta = conn.execute("""
+                SELECT COALESCE(SUM(quantity), 0) FROM inventory_movements
+                WHERE product_id = ? AND created_at < ?
+            """, (product_id, when)).fetchone()[0]
+            return float(delta)
+        delta = conn.execute("""
+            SELECT COALESCE(SUM(quantity), 0) FROM inventory_movements
+            WHERE product_id = ? AND created_at > ? AND created_at < ?
+        """, (product_id, snapshot[0], when)).fetchone()[0]
+        return float(snapshot[1] + delta)
+
+    def stock_levels(self, when):
+        # Every product's stock just before `when`, same snapshot + delta method
+        return self.cache.read_sql("""
+            SELECT p.product_id, p.name, p.unit,
+                   COALESCE(s.quantity, 0) + COALESCE(SUM(m.quantity), 0) AS stock_quantity
+            FROM products p
+            LEFT JOIN stock_snapshots s ON s.product_id = p.product_id AND s.snapshot_at = (
+                SELECT MAX(snapshot_at) FROM stock_snapshots
+                WHERE product_id = p.product_id AND snapshot_at < ?)
+            LEFT JOIN inventory_movements m ON m.product_id = p.product_id
+                AND m.created_at < ?
+                AND (s.snapshot_at IS NULL OR m.created_at > s.snapshot_at)
+            GROUP BY p.product_id, p.name, p.unit, s.quantity
+            ORDER BY p.product_id
+        """, self.db.read_connection(), params=(as_timestamp(when),) * 2,
+            tables=("products", *INVENTORY_TABLES))
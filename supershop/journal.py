@@ -0,0 +1,407 @@
+import datetime
+import json
+import sqlite3
+import threading
+import time
+import uuid
+
+import pandas as pd
+
+from .checkout import CheckoutError, record_sale
+from .db import DATA_ERRORS, INTEGRITY_ERRORS, writes
+from .directory import CUSTOMER_LOOKUP_LIMIT, CUSTOMER_LOOKUPS, PHONE_PREFIX, Directory, like_prefix
+from .inventory import INVENTORY_TABLES
+from .migrations import run_migrations
+from .rollups import ROLLUP_TABLES
+
+# ---------------- TILL JOURNAL ----------------
+# In till mode a confirmed sale is written to a small per-till SQLite file
+# first and acknowledged at once; a background worker replays the journal
+# into the shared database. Both tables are insert-only: an entry is pending
+# until an outcome row exists for it.
+# The file also holds the till's copy of what the Sales page reads (products,
+# customers, employees), replaced wholesale by the worker, so a sale never
+# waits on the shared database.
+SYNC_INTERVAL = 2.0  # seconds between sync passes when idle
+REFERENCE_INTERVAL = 30.0  # shortest gap between refreshes of the till's copy
+REFERENCE_TABLES = {"products", "customers", "employees"}
+SYNC_BATCH = 50  # journal entries replayed per write transaction
+SYNC_MAX_BACKOFF = 60.0  # longest wait between retries while the shared DB is unavailable
+# Failures of one entry (a malformed payload, a row the shared database
+# rejects) rather than of the database: the entry is parked, the rest sync
+ENTRY_ERRORS = (CheckoutError, KeyError, TypeError, ValueError) + INTEGRITY_ERRORS + DATA_ERRORS
+
+
+def journal_path(till):
+    return f"till-{till}.journal.db"
+
+
+def load_payload(payload):
+    # None for an entry whose payload no longer parses; replay parks it
+    try:
+        sale = json.loads(payload)
+    except ValueError:
+        return None
+    return sale if isinstance(sale, dict) else None
+
+
+def utc_timestamp():
+    # Same format and zone as SQLite's CURRENT_TIMESTAMP
+    return datetime.datetime.now(datetime.timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+
+
+class TillJournal:
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode = WAL")
+        self._conn.execute("PRAGMA synchronous = FULL")  # an acknowledged sale must survive a power cut
+        with self._conn:
+            self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS entries(
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                sale_uuid TEXT NOT NULL UNIQUE,
+                created_at TEXT NOT NULL,
+                payload TEXT NOT NULL
+            )
+            """)
+            self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS outcomes(
+                sale_uuid TEXT PRIMARY KEY,
+                sale_id INTEGER,
+                failures TEXT,
+                synced_at TEXT NOT NULL
+            )
+            """)
+            self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS ref_products(
+                product_id INTEGER PRIMARY KEY,
+                data TEXT NOT NULL
+            )
+            """)
+            self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS ref_customers(
+                customer_id INTEGER PRIMARY KEY,
+                name TEXT,
+                phone TEXT
+            )
+            """)
+            # Same typeahead queries as the shared database, so the same indexes
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_ref_customers_phone ON ref_customers(phone COLLATE NOCASE)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_ref_customers_name ON ref_customers(name COLLATE NOCASE)")
+            self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS ref_employees(
+                employee_id INTEGER PRIMARY KEY,
+                name TEXT
+            )
+            """)
+            self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS ref_meta(
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                refreshed_at TEXT NOT NULL
+            )
+            """)
+
+    def append(self, customer_id, employee_id, items, total,
+               payment_method, amount_received, change_amount):
+        sale_uuid = str(uuid.uuid4())
+        payload = json.dumps({
+            "customer_id": customer_id,
+            "employee_id": employee_id,
+            "items": items,
+            "total": total,
+            "payment_method": payment_method,
+            "amount_received": amount_received,
+            "change_amount": change_amount,
+        })
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO entries (sale_uuid, created_at, payload) VALUES (?,?,?)",
+                (sale_uuid, utc_timestamp(), payload)
+            )
+        return sale_uuid
+
+    def pending(self, limit=SYNC_BATCH):
+        # Oldest first: (sale_uuid, created_at, sale dict)
+        with self._lock:
+            rows = self._conn.execute("""
+                SELECT e.sale_uuid, e.created_at, e.payload
+                FROM entries e
+                LEFT JOIN outcomes o ON o.sale_uuid = e.sale_uuid
+                WHERE o.sale_uuid IS NULL
+                ORDER BY e.seq
+                LIMIT ?
+            """, (limit,)).fetchall()
+        return [(sale_uuid, created_at, load_payload(payload)) for sale_uuid, created_at, payload in rows]
+
+    def record_outcomes(self, results):
+        # results: (sale_uuid, sale_id, failures) from replay_sales
+        now = utc_timestamp()
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO outcomes (sale_uuid, sale_id, failures, synced_at) VALUES (?,?,?,?)",
+                [(sale_uuid, sale_id, json.dumps(failures) if failures else None, now)
+                 for sale_uuid, sale_id, failures in results]
+            )
+
+    def pending_count(self):
+        with self._lock:
+            return self._conn.execute("""
+                SELECT COUNT(*) FROM entries e
+                LEFT JOIN outcomes o ON o.sale_uuid = e.sale_uuid
+                WHERE o.sale_uuid IS NULL
+            """).fetchone()[0]
+
+    def conflicts(self):
+        # Sales the shared database refused (e.g. not enough stock left) for a manager to review
+        with self._lock:
+            rows = self._conn.execute("""
+                SELECT e.sale_uuid, e.created_at, e.payload, o.failures
+                FROM entries e
+                JOIN outcomes o ON o.sale_uuid = e.sale_uuid
+                WHERE o.sale_id IS NULL
+                ORDER BY e.seq
+            """).fetchall()
+        return [{"sale_uuid": sale_uuid, "created_at": created_at,
+                 "sale": load_payload(payload), "failures": json.loads(failures)}
+                for sale_uuid, created_at, payload, failures in rows]
+
+    # ---- the till's copy of the shared database ----
+    def save_reference(self, products, customers, employees):
+        with self._lock, self._conn:
+            for table in ("ref_products", "ref_customers", "ref_employees"):
+                self._conn.execute(f"DELETE FROM {table}")
+            self._conn.executemany(
+                "INSERT INTO ref_products (product_id, data) VALUES (?,?)",
+                [(p["product_id"], json.dumps(p, default=str)) for p in products]
+            )
+            self._conn.executemany("INSERT INTO ref_customers (customer_id, name, phone) VALUES (?,?,?)", customers)
+            self._conn.executemany("INSERT INTO ref_employees (employee_id, name) VALUES (?,?)", employees)
+            self._conn.execute("INSERT OR REPLACE INTO ref_meta (id, refreshed_at) VALUES (1, ?)", (utc_timestamp(),))
+
+    def reference_refreshed_at(self):
+        # None until the sync worker has saved a copy at least once
+        with self._lock:
+            row = self._conn.execute("SELECT refreshed_at FROM ref_meta").fetchone()
+        return row[0] if row else None
+
+    def products(self):
+        # Rows for ProductIndex, or None to have it read the shared database
+        with self._lock:
+            if self._conn.execute("SELECT 1 FROM ref_meta").fetchone() is None:
+                return None
+            rows = self._conn.execute("SELECT data FROM ref_products ORDER BY product_id").fetchall()
+        return [json.loads(data) for data, in rows]
+
+    def has_customers(self):
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM ref_customers LIMIT 1").fetchone() is not None
+
+    def employee_choices(self):
+        with self._lock:
+            rows = self._conn.execute("SELECT employee_id, name FROM ref_employees").fetchall()
+        return pd.DataFrame(rows, columns=["employee_id", "name"])
+
+    def find_customers(self, text, limit=CUSTOMER_LOOKUP_LIMIT):
+        text = (text or "").strip()
+        column = "phone" if PHONE_PREFIX.fullmatch(text) else "name"
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT customer_id, name, phone FROM ref_customers {CUSTOMER_LOOKUPS['sqlite', column]} LIMIT ?",
+                (like_prefix(text), limit)
+            ).fetchall()
+        return pd.DataFrame(rows, columns=["customer_id", "name", "phone"])
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+# ---------------- REPLAY ----------------
+@writes("sales", "sale_items", "products", *ROLLUP_TABLES, *INVENTORY_TABLES)
+def replay_sales(cursor, entries):
+    # Idempotent by sale UUID: a batch that committed but was never marked
+    # in the journal just finds its sales already there next time.
+    results = []
+    for sale_uuid, created_at, sale in entries:
+        row = cursor.execute("SELECT sale_id FROM sales WHERE client_uuid=?", (sale_uuid,)).fetchone()
+        if row is not None:
+            results.append((sale_uuid, row[0], None))
+            continue
+        cursor.execute("SAVEPOINT replay")
+        try:
+            if sale is None:
+                raise ValueError("journal entry is unreadable")
+            sale_id = record_sale(cursor, sale["customer_id"], sale["employee_id"], sale["items"],
+                                  sale["total"], sale["payment_method"], sale["amount_received"],
+                                  sale["change_amount"], client_uuid=sale_uuid, created_at=created_at)
+        except ENTRY_ERRORS as e:
+            # Park it as a conflict (e.g. stock no longer covers it) rather than
+            # oversell, or hold up every later sale behind it
+            cursor.execute("ROLLBACK TO SAVEPOINT replay")
+            cursor.execute("RELEASE SAVEPOINT replay")
+            failures = e.failures if isinstance(e, CheckoutError) else [f"{type(e).__name__}: {e}"]
+            results.append((sale_uuid, None, failures))
+            continue
+        cursor.execute("RELEASE SAVEPOINT replay")
+        results.append((sale_uuid, sale_id, None))
+    return results
+
+
+class TillSync:
+    # Background worker draining the journal into the shared database.
+    # Any database error (locked, unreachable) leaves the batch pending and
+    # backs off; the next pass retries it. It also applies migrations before
+    # its first sync and keeps the till's copy of the shared data fresh.
+
+    def __init__(self, db, journal, catalog=None, batch_size=SYNC_BATCH, interval=SYNC_INTERVAL,
+                 reference_interval=REFERENCE_INTERVAL):
+        self.db = db
+        self.journal = journal
+        self.catalog = catalog
+        self.batch_size = batch_size
+        self.interval = interval
+        self.reference_interval = reference_interval
+        self.last_error = None
+        self.migrated = False
+        self._stale = True
+        self._refreshed = None  # monotonic time of the last refresh
+        db.add_commit_listener(self._note_commit)
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._thread = threading.Thread(target=self._loop, name="supershop-till-sync", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        self.nudge()  # migrate and take the first copy now, not after the first interval
+        return self
+
+    def nudge(self):
+        self._wake.set()
+
+    def _note_commit(self, tables):
+        if tables is None or tables & REFERENCE_TABLES:
+            self._stale = True
+
+    def refresh_reference(self, force=False):
+        # At most every reference_interval, and only once something changed
+        due = self._refreshed is None or time.monotonic() - self._refreshed >= self.reference_interval
+        if not (force or self._stale and due):
+            return False
+        self._stale = False  # a change during the read marks it stale again
+        try:
+            conn = self.db.read_connection()
+            products = [dict(row) for row in conn.execute("SELECT * FROM products ORDER BY product_id").fetchall()]
+            customers = [tuple(row) for row in conn.execute("SELECT customer_id, name, phone FROM customers").fetchall()]
+            employees = [tuple(row) for row in conn.execute("SELECT employee_id, name FROM employees").fetchall()]
+        except Exception:
+            self._stale = True
+            raise
+        self.journal.save_reference(products, customers, employees)
+        self._refreshed = time.monotonic()
+        if self.catalog is not None:
+            self.catalog.index.invalidate()  # reloads from the copy just saved
+        return True
+
+    def sync_once(self):
+        entries = self.journal.pending(self.batch_size)
+        if not entries:
+            return 0
+        results = self.db.write(replay_sales, entries)
+        self.journal.record_outcomes(results)
+        if self.catalog is not None:
+            # Only recorded sales changed stock, and only their payloads are known good
+            recorded = {sale_uuid for sale_uuid, sale_id, _ in results if sale_id is not None}
+            self.catalog.refresh({int(item["product_id"]) for sale_uuid, _, sale in entries
+                                  if sale_uuid in recorded for item in sale["items"]})
+        return len(entries)
+
+    def _loop(self):
+        delay = self.interval
+        while not self._stopping.is_set():
+            self._wake.wait(delay)
+            self._wake.clear()
+            try:
+                if not self.migrated:
+                    run_migrations(self.db)
+                    self.migrated = True
+                while self.sync_once() == self.batch_size:
+                    pass
+                self.refresh_reference()
+            except Exception as e:
+                self.last_error = e
+                delay = min(max(delay, self.interval) * 2, SYNC_MAX_BACKOFF)
+            else:
+                self.last_error = None
+                delay = self.interval
+
+    def stop(self):
+        self._stopping.set()
+        self._wake.set()
+        if self._thread.is_alive():
+            self._thread.join()
+        if not self.migrated:
+            return
+        try:
+            # Last chance to flush before shutdown; whatever's left stays journaled
+            while self.sync_once() == self.batch_size:
+                pass
+        except Exception as e:
+            self.last_error = e
+
+
+class Till:
+    # Checkout front for till mode: same cart and settlement rules as
+    # Checkout.confirm, but acknowledged once journaled locally
+
+    def __init__(self, name, db, checkout, catalog=None, path=None, directory=None, journal=None):
+        self.name = name
+        self.checkout = checkout
+        self.directory = directory if directory is not None else Directory(db)
+        self.journal = journal if journal is not None else TillJournal(path or journal_path(name))
+        self.sync = TillSync(db, self.journal, catalog).start()
+
+    def confirm(self, cart, customer_id, employee_id, payment_method, amount_received=None):
+        items = [dict(item) for item in cart]
+        if not items:
+            raise CheckoutError(["Cart is empty"])
+        total = sum(item['total_price'] for item in items)
+        amount_received, change_amount = self.checkout.settle(total, payment_method, amount_received)
+        sale_uuid = self.journal.append(customer_id, employee_id, items, total,
+                                        payment_method, amount_received, change_amount)
+        self.sync.nudge()
+        return sale_uuid
+
+    # ---- Sales page reads ----
+    # From the journal's copy; the shared database only until the first copy
+    # is saved (a till's very first start)
+    def has_customers(self):
+        if self.journal.reference_refreshed_at() is None:
+            return self.directory.has_customers()
+        return self.journal.has_customers()
+
+    def employee_choices(self):
+        if self.journal.reference_refreshed_at() is None:
+            return self.directory.employee_choices()
+        return self.journal.employee_choices()
+
+    def find_customers(self, text, limit=CUSTOMER_LOOKUP_LIMIT):
+        if self.journal.reference_refreshed_at() is None:
+            return self.directory.find_customers(text, limit)
+        return self.journal.find_customers(text, limit)
+
+    def receipt_number(self, sale_uuid):
+        # Printed on the memo until the sale has a shared sale_id
+        return f"{self.name}-{sale_uuid[:8]}"
+
+    def pending_count(self):
+        return self.journal.pending_count()
+
+    def conflicts(self):
+        return self.journal.conflicts()
+
+    def close(self):
+        self.sync.stop()
+        self.journal.close()
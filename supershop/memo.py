@@ -0,0 +1,236 @@
+import copy
+import datetime
+import functools
+import os
+import tempfile
+import textwrap
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from fpdf import FPDF
+from PIL import Image
+
+from .diagnostics import metrics
+
+# Next to super_shop.py, so batch jobs can render memos from any directory
+LOGO_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                         "Sarder Super Shop logo design.png")
+LOGO_PIXELS = 300  # ~250 dpi at the 30 mm it's printed; the original is 1024 px
+MEMO_WORKERS = 2
+MEMO_FORMATS = ["A4 PDF", "80 mm receipt"]
+
+SHOP_NAME = "SARDER SUPER SHOP"
+SHOP_DETAILS = ["Kaligonj Bazar, Kalkini, Madaripur", "Mobile: 01922388130",
+                "Email: mdarafathossen62@gmail.com"]
+MEMO_TITLE = "CASH MEMO / INVOICE"
+FOOTER_LINES = ["Thank You For Shopping With Us!", "Goods once sold are not refundable without receipt.",
+                "Powered by Sarder POS System"]
+
+
+# ---------------- MEMO TEMPLATE ----------------
+# Everything above the invoice details is the same on every memo, so it is
+# laid out once, with the logo decoded and downscaled once, and each memo
+# starts from a copy. Embedding the full-size logo made every memo ~0.5 MB.
+@functools.lru_cache(maxsize=1)
+def memo_template():
+    pdf = FPDF()
+    pdf.set_auto_page_break(auto=True, margin=15)
+    pdf.add_page()
+
+    # -------- LOGO --------
+    if os.path.exists(LOGO_PATH):
+        with Image.open(LOGO_PATH) as logo:
+            logo = logo.convert("RGB")
+            logo.thumbnail((LOGO_PIXELS, LOGO_PIXELS))
+            # FPDF only embeds from a file path; the image data is read right away
+            fd, path = tempfile.mkstemp(suffix=".png")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    logo.save(f, "PNG")
+                pdf.image(path, x=10, y=8, w=30)
+            finally:
+                os.remove(path)
+        pdf.ln(20)
+
+    # -------- SHOP HEADER --------
+    pdf.set_font("Arial", 'B', 18)
+    pdf.cell(0, 10, SHOP_NAME, ln=True, align='C')
+    pdf.set_font("Arial", '', 11)
+    for line in SHOP_DETAILS:
+        pdf.cell(0, 6, line, ln=True, align='C')
+    pdf.ln(5)
+
+    pdf.set_font("Arial", 'B', 12)
+    pdf.cell(0, 8, MEMO_TITLE, ln=True, align='C')
+    pdf.ln(5)
+    return pdf
+
+
+def copy_template(template):
+    # FPDF keeps a document's state in dicts and lists, and output() writes
+    # object numbers into the font and image entries; copy those two levels
+    # and share the rest (e.g. the fonts' width tables, the logo's bytes)
+    pdf = copy.copy(template)
+    for name, value in vars(template).items():
+        if isinstance(value, dict):
+            setattr(pdf, name, {k: dict(v) if isinstance(v, dict) else v for k, v in value.items()})
+        elif isinstance(value, list):
+            setattr(pdf, name, list(value))
+    return pdf
+
+
+def memo_date(created_at):
+    # A reprint shows when the sale happened, a new memo the time now
+    return str(created_at) if created_at else datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+
+# ---------------- CASH MEMO FUNCTION ----------------
+def build_cash_memo(sale_id, customer_name, cart_items, total_amount, payment_method, created_at=None):
+    # The laid-out FPDF document, not yet rendered
+    pdf = copy_template(memo_template())
+
+    # -------- INVOICE INFO --------
+    pdf.set_font("Arial", '', 11)
+    pdf.cell(95, 6, f"Invoice No: SSS-{sale_id}")
+    pdf.cell(95, 6, f"Date: {memo_date(created_at)}", ln=True)
+    pdf.cell(95, 6, f"Customer: {customer_name}")
+    pdf.cell(95, 6, f"Payment Method: {payment_method}", ln=True)
+    pdf.ln(8)
+
+    # -------- TABLE HEADER --------
+    pdf.set_font("Arial", 'B', 11)
+    pdf.cell(60, 8, "Product", 1)
+    pdf.cell(25, 8, "Unit", 1, align='C')
+    pdf.cell(25, 8, "Qty", 1, align='C')
+    pdf.cell(30, 8, "Unit Price", 1, align='C')
+    pdf.cell(30, 8, "Total", 1, align='C')
+    pdf.ln()
+
+    # -------- TABLE BODY --------
+    pdf.set_font("Arial", '', 10)
+    for item in cart_items:
+        pdf.cell(60, 8, str(item['product']), 1)
+        pdf.cell(25, 8, str(item['unit']), 1, align='C')
+        pdf.cell(25, 8, f"{item['quantity']}", 1, align='C')
+        pdf.cell(30, 8, f"{item['unit_price']:.2f}", 1, align='R')
+        pdf.cell(30, 8, f"{item['total_price']:.2f}", 1, align='R')
+        pdf.ln()
+
+    # -------- GRAND TOTAL --------
+    pdf.set_font("Arial", 'B', 13)
+    pdf.cell(110, 10, "")
+    pdf.cell(40, 10, "GRAND TOTAL", 1)
+    pdf.cell(30, 10, f"{total_amount:.2f}", 1, align='R')
+    pdf.ln(15)
+
+    # -------- FOOTER --------
+    pdf.set_font("Arial", 'I', 10)
+    pdf.cell(0, 6, "----------------------------------------------", ln=True, align='C')
+    for line in FOOTER_LINES:
+        pdf.cell(0, 6, line, ln=True, align='C')
+    return pdf
+
+
+@metrics.instrument("memo")
+def generate_cash_memo_bytes(sale_id, customer_name, cart_items, total_amount, payment_method,
+                             created_at=None):
+    pdf = build_cash_memo(sale_id, customer_name, cart_items, total_amount, payment_method, created_at)
+
+    # -------- FIXED: Save PDF to BytesIO --------
+    pdf_str = pdf.output(dest='S').encode('latin1')  # returns PDF as bytes
+    pdf_bytes = BytesIO(pdf_str)
+    pdf_bytes.seek(0)
+    return pdf_bytes
+
+
+# ---------------- THERMAL RECEIPT ----------------
+# 80 mm roll printers take plain text, so this skips PDF entirely: the same
+# memo as 48-column lines, either as text or as an ESC/POS byte stream with
+# bold/large headings and a paper cut, ready to send to the printer as is.
+RECEIPT_WIDTH = 48  # characters per line on 80 mm paper (Font A)
+RECEIPT_ENCODING = "cp437"  # the printers' default code page
+ESCPOS_STYLES = {
+    "": b"\x1ba\x00\x1bE\x00\x1d!\x00",         # left, regular
+    "center": b"\x1ba\x01\x1bE\x00\x1d!\x00",   # centered
+    "bold": b"\x1ba\x00\x1bE\x01\x1d!\x00",     # left, bold
+    "title": b"\x1ba\x01\x1bE\x01\x1d!\x11",    # centered, bold, double width and height
+}
+ESCPOS_INIT = b"\x1b@"
+ESCPOS_CUT = b"\x1dV\x42\x03"  # feed 3 lines, then partial cut
+
+
+def receipt_row(left, right, width=RECEIPT_WIDTH):
+    space = width - len(right) - 1
+    return f"{left[:space]:<{space}} {right}"
+
+
+def receipt_body(sale_id, customer_name, cart_items, total_amount, payment_method, created_at=None):
+    # (style, text) lines between the shop header and the footer
+    rule = "-" * RECEIPT_WIDTH
+    lines = [
+        ("", rule),
+        ("", receipt_row(f"Invoice: SSS-{sale_id}", memo_date(created_at))),
+        ("", f"Customer: {customer_name}"[:RECEIPT_WIDTH]),
+        ("", f"Payment: {payment_method}"[:RECEIPT_WIDTH]),
+        ("", rule),
+    ]
+    for item in cart_items:
+        lines.append(("", str(item['product'])[:RECEIPT_WIDTH]))
+        lines.append(("", receipt_row(f"  {item['quantity']:g} {item['unit']} x {item['unit_price']:.2f}",
+                                      f"{item['total_price']:.2f}")))
+    lines += [("", rule), ("bold", receipt_row("GRAND TOTAL", f"{total_amount:.2f}")), ("", rule)]
+    return lines
+
+
+RECEIPT_HEADER = [("title", SHOP_NAME)] + [("center", line) for line in SHOP_DETAILS] + [("center", MEMO_TITLE)]
+RECEIPT_FOOTER = [("center", part) for line in FOOTER_LINES for part in textwrap.wrap(line, RECEIPT_WIDTH)]
+
+
+def receipt_text(lines):
+    return "".join((text.center(RECEIPT_WIDTH).rstrip() if style in ("center", "title") else text) + "\n"
+                   for style, text in lines)
+
+
+def escpos_bytes(lines):
+    out = bytearray()
+    for style, text in lines:
+        out += ESCPOS_STYLES[style] + text.encode(RECEIPT_ENCODING, "replace") + b"\n"
+    return bytes(out)
+
+
+# Laid out once, like the PDF template
+RECEIPT_HEADER_TEXT = receipt_text(RECEIPT_HEADER)
+RECEIPT_FOOTER_TEXT = receipt_text(RECEIPT_FOOTER)
+ESCPOS_HEADER = ESCPOS_INIT + escpos_bytes(RECEIPT_HEADER)
+ESCPOS_FOOTER = escpos_bytes(RECEIPT_FOOTER) + ESCPOS_STYLES[""] + ESCPOS_CUT
+
+
+@metrics.instrument("memo")
+def generate_receipt_text(sale_id, customer_name, cart_items, total_amount, payment_method, created_at=None):
+    body = receipt_body(sale_id, customer_name, cart_items, total_amount, payment_method, created_at)
+    return RECEIPT_HEADER_TEXT + receipt_text(body) + RECEIPT_FOOTER_TEXT
+
+
+@metrics.instrument("memo")
+def generate_receipt_escpos(sale_id, customer_name, cart_items, total_amount, payment_method, created_at=None):
+    body = receipt_body(sale_id, customer_name, cart_items, total_amount, payment_method, created_at)
+    return ESCPOS_HEADER + escpos_bytes(body) + ESCPOS_FOOTER
+
+
+# ---------------- BACKGROUND RENDERING ----------------
+class MemoRenderer:
+    # Renders PDF memos on worker threads, so confirming a sale doesn't wait
+    # for the PDF; by the time the cashier clicks download it's usually done
+
+    def __init__(self, workers=MEMO_WORKERS):
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="supershop-memo")
+        self._pool.submit(memo_template)  # ready before the first sale
+
+    def submit(self, sale_id, customer_name, cart_items, total_amount, payment_method):
+        # -> Future of the PDF bytes. The lines are copied, so the cart can be cleared.
+        items = [dict(item) for item in cart_items]
+        return self._pool.submit(lambda: generate_cash_memo_bytes(
+            sale_id, customer_name, items, total_amount, payment_method).getvalue())
+
+    def close(self):
+        self._pool.shutdown()
@@ -0,0 +1,318 @@
+from sqlalchemy import Float, Text
+
+from .catalog import PRODUCT_TSVECTOR
+from .inventory import create_inventory_tables, open_inventory
+from .schema import column_type, create_table, create_tables, seed_default_data
+from .rollups import (fill_product_totals, rollup_daily, rollup_payment_daily, rollup_product_daily,
+                      rollup_product_totals)
+from .shifts import create_shift_tables, start_shift_tracking
+
+# ---------------- SCHEMA MIGRATIONS ----------------
+# Append-only: never edit or reorder an applied step, add a new one instead.
+# Every step must be safe to re-run (IF NOT EXISTS etc.).
+def migrate_base_schema(cursor):
+    create_tables(cursor)
+    seed_default_data(cursor)
+
+
+def migrate_sales_indexes(cursor):
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_sale_items_sale_id ON sale_items(sale_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_sale_items_product_id ON sale_items(product_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_sales_created_at ON sales(created_at)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_sales_customer_id ON sales(customer_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_sales_employee_id ON sales(employee_id)")
+    # Covers the Daily Sales Report: GROUP BY DATE(created_at) walks this index in order
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_sales_created_date
+        ON sales(DATE(created_at), total_amount)
+    """)
+
+
+def migrate_product_indexes(cursor):
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_products_category ON products(category)")
+
+
+def migrate_product_search(cursor):
+    if cursor.dialect == "postgresql":
+        # GIN index over the same weighted document Catalog.search ranks by
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_products_search ON products USING GIN (({PRODUCT_TSVECTOR}))")
+        return
+    # External-content FTS5 index over products, kept in sync by triggers.
+    # prefix='1 2 3' keeps typeahead queries on prebuilt prefix indexes.
+    cursor.execute("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS products_fts USING fts5(
+            name, barcode, category,
+            content='products', content_rowid='product_id',
+            prefix='1 2 3'
+        )
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS products_fts_ai AFTER INSERT ON products BEGIN
+            INSERT INTO products_fts (rowid, name, barcode, category)
+            VALUES (new.product_id, new.name, new.barcode, new.category);
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS products_fts_ad AFTER DELETE ON products BEGIN
+            INSERT INTO products_fts (products_fts, rowid, name, barcode, category)
+            VALUES ('delete', old.product_id, old.name, old.barcode, old.category);
+        END
+    """)
+    # Only searchable columns: stock updates at checkout must not touch the index
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS products_fts_au
+        AFTER UPDATE OF name, barcode, category ON products BEGIN
+            INSERT INTO products_fts (products_fts, rowid, name, barcode, category)
+            VALUES ('delete', old.product_id, old.name, old.barcode, old.category);
+            INSERT INTO products_fts (rowid, name, barcode, category)
+            VALUES (new.product_id, new.name, new.barcode, new.category);
+        END
+    """)
+    cursor.execute("INSERT INTO products_fts (products_fts) VALUES ('rebuild')")
+
+
+def create_daily_rollup_tables(cursor):
+    # Migration 5's tables as it shipped; later rollup tables come with their own step
+    create_table(cursor, rollup_daily)
+    create_table(cursor, rollup_product_daily)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_rollup_product_daily_product
+        ON rollup_product_daily(product_id)
+    """)
+    create_table(cursor, rollup_payment_daily)
+
+
+def backfill_sales_rollups(cursor):
+    # Migration 5's backfill as it shipped, from before sale_items had its own
+    # name and cost: cost is today's purchase price. Migration 6 redoes it.
+    for table in ("rollup_daily", "rollup_product_daily", "rollup_payment_daily"):
+        cursor.execute(f"DELETE FROM {table}")
+
+    cursor.execute("""
+        INSERT INTO rollup_product_daily (sale_date, product_id, quantity, revenue, cost)
+        SELECT DATE(s.created_at), si.product_id, SUM(si.quantity), SUM(si.total_price),
+               SUM(si.quantity * COALESCE(p.purchase_price, 0))
+        FROM sale_items si
+        JOIN sales s ON s.sale_id = si.sale_id
+        LEFT JOIN products p ON p.product_id = si.product_id
+        GROUP BY DATE(s.created_at), si.product_id
+    """)
+
+    cursor.execute("""
+        INSERT INTO rollup_daily (sale_date, sale_count, total_sales, revenue, cost)
+        SELECT DATE(created_at), COUNT(*), SUM(total_amount), 0, 0
+        FROM sales
+        GROUP BY DATE(created_at)
+    """)
+    cursor.execute("""
+        UPDATE rollup_daily SET
+            revenue = (SELECT COALESCE(SUM(revenue), 0) FROM rollup_product_daily r
+                       WHERE r.sale_date = rollup_daily.sale_date),
+            cost = (SELECT COALESCE(SUM(cost), 0) FROM rollup_product_daily r
+                    WHERE r.sale_date = rollup_daily.sale_date)
+    """)
+
+    cursor.execute("""
+        INSERT INTO rollup_payment_daily
+        (sale_date, payment_method, sale_count, total_amount, amount_received, change_amount)
+        SELECT DATE(created_at), payment_method, COUNT(*), SUM(total_amount),
+               SUM(amount_received), SUM(change_amount)
+        FROM sales
+        GROUP BY DATE(created_at), payment_method
+    """)
+
+
+def migrate_sales_rollups(cursor):
+    create_daily_rollup_tables(cursor)
+    backfill_sales_rollups(cursor)
+
+
+def rebuild_daily_rollups(cursor):
+    # Migration 6's rebuild as it shipped: the daily rollups again, now from
+    # the cost and name snapshotted on each line
+    for table in ("rollup_daily", "rollup_product_daily", "rollup_payment_daily"):
+        cursor.execute(f"DELETE FROM {table}")
+
+    cursor.execute("""
+        INSERT INTO rollup_product_daily (sale_date, product_id, product_name, quantity, revenue, cost)
+        SELECT DATE(s.created_at), si.product_id, MAX(si.product_name), SUM(si.quantity),
+               SUM(si.total_price), SUM(si.quantity * COALESCE(si.unit_cost, 0))
+        FROM sale_items si
+        JOIN sales s ON s.sale_id = si.sale_id
+        GROUP BY DATE(s.created_at), si.product_id
+    """)
+
+    cursor.execute("""
+        INSERT INTO rollup_daily (sale_date, sale_count, total_sales, revenue, cost)
+        SELECT DATE(created_at), COUNT(*), SUM(total_amount), 0, 0
+        FROM sales
+        GROUP BY DATE(created_at)
+    """)
+    cursor.execute("""
+        UPDATE rollup_daily SET
+            revenue = (SELECT COALESCE(SUM(revenue), 0) FROM rollup_product_daily r
+                       WHERE r.sale_date = rollup_daily.sale_date),
+            cost = (SELECT COALESCE(SUM(cost), 0) FROM rollup_product_daily r
+                    WHERE r.sale_date = rollup_daily.sale_date)
+    """)
+
+    cursor.execute("""
+        INSERT INTO rollup_payment_daily
+        (sale_date, payment_method, sale_count, total_amount, amount_received, change_amount)
+        SELECT DATE(created_at), payment_method, COUNT(*), SUM(total_amount),
+               SUM(amount_received), SUM(change_amount)
+        FROM sales
+        GROUP BY DATE(created_at), payment_method
+    """)
+
+
+def add_column_if_missing(cursor, table, column, sql_type):
+    # Portable stand-in for PRAGMA table_info: an empty SELECT still describes the columns
+    columns = [d[0] for d in cursor.execute(f"SELECT * FROM {table} LIMIT 0").description]
+    if column not in columns:
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {column_type(cursor, sql_type)}")
+
+
+def migrate_catalog_indexes(cursor):
+    # Keyset pagination sort columns (the rowid is implicitly the tiebreak)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_products_name ON products(name)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_products_stock ON products(stock_quantity)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_products_selling_price ON products(selling_price)")
+    # Partial index: the low-stock filter and Dashboard alert only visit matching rows
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_products_low_stock
+        ON products(stock_quantity) WHERE stock_quantity <= minimum_stock
+    """)
+
+
+def migrate_sale_item_snapshots(cursor):
+    # Freeze what was sold at checkout time so later product edits or
+    # deletions can't rewrite historical profit
+    add_column_if_missing(cursor, "sale_items", "product_name", Text())
+    add_column_if_missing(cursor, "sale_items", "unit", Text())
+    add_column_if_missing(cursor, "sale_items", "unit_cost", Float())
+    add_column_if_missing(cursor, "rollup_product_daily", "product_name", Text())
+
+    # Best we know for old rows is today's product record
+    cursor.execute("""
+        UPDATE sale_items SET
+            product_name = (SELECT name FROM products p WHERE p.product_id = sale_items.product_id),
+            unit = (SELECT unit FROM products p WHERE p.product_id = sale_items.product_id),
+            unit_cost = (SELECT purchase_price FROM products p WHERE p.product_id = sale_items.product_id)
+        WHERE unit_cost IS NULL
+    """)
+    cursor.execute("""
+        UPDATE sale_items SET product_name = 'Product #' || product_id
+        WHERE product_name IS NULL
+    """)
+    rebuild_daily_rollups(cursor)
+
+
+def migrate_sale_client_uuid(cursor):
+    # Offline tills tag each sale with a UUID so journal replays are idempotent
+    add_column_if_missing(cursor, "sales", "client_uuid", Text())
+    cursor.execute("""
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_sales_client_uuid
+        ON sales(client_uuid) WHERE client_uuid IS NOT NULL
+    """)
+
+
+def migrate_customer_lookup(cursor):
+    # Prefix indexes for the POS customer typeahead (Directory.find_customers)
+    if cursor.dialect == "postgresql":
+        # "C" collation lets LIKE 'prefix%' use a plain btree under any locale;
+        # with customer_id included the index also yields the result order
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_customers_phone ON customers((phone COLLATE "C"), customer_id)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_customers_name ON customers((lower(name) COLLATE "C"), customer_id)')
+        return
+    # SQLite's LIKE is case-insensitive, so it can only range-scan NOCASE indexes
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_customers_phone ON customers(phone COLLATE NOCASE)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_customers_name ON customers(name COLLATE NOCASE)")
+
+
+def migrate_inventory_ledger(cursor):
+    # Today's stock becomes each product's opening balance
+    create_inventory_tables(cursor)
+    open_inventory(cursor)
+
+
+def migrate_shifts(cursor):
+    create_shift_tables(cursor)
+    start_shift_tracking(cursor)
+
+
+def migrate_product_totals(cursor):
+    create_table(cursor, rollup_product_totals)
+    fill_product_totals(cursor)
+
+
+def migrate_catalog_sort_keys(cursor):
+    # Catalog sort keys with NULLs folded in (catalog.sort_key), so keyset
+    # paging can't skip NULL rows; they replace migration 7's column indexes
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_products_name_key
+        ON products(COALESCE(name, ''), product_id)
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_products_stock_key
+        ON products(COALESCE(stock_quantity, 0), product_id)
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_products_selling_price_key
+        ON products(COALESCE(selling_price, 0), product_id)
+    """)
+    for index in ("idx_products_name", "idx_products_stock", "idx_products_selling_price"):
+        cursor.execute(f"DROP INDEX IF EXISTS {index}")
+
+
+MIGRATIONS = [
+    (1, "base schema", migrate_base_schema),
+    (2, "sales and sale_items indexes", migrate_sales_indexes),
+    (3, "products category index", migrate_product_indexes),
+    (4, "products full-text search", migrate_product_search),
+    (5, "sales rollup tables", migrate_sales_rollups),
+    (6, "sale_items cost and name snapshots", migrate_sale_item_snapshots),
+    (7, "product catalog indexes", migrate_catalog_indexes),
+    (8, "sales client UUID for till journals", migrate_sale_client_uuid),
+    (9, "customer phone and name lookup indexes", migrate_customer_lookup),
+    (10, "inventory movements ledger and stock snapshots", migrate_inventory_ledger),
+    (11, "shift close records and totals", migrate_shifts),
+    (12, "all-time product sales rollup", migrate_product_totals),
+    (13, "catalog sort keys with NULLs", migrate_catalog_sort_keys),
+]
+
+
+MIGRATION_LOCK_ID = 7_470_001  # arbitrary advisory lock key for migrations
+
+
+def create_schema_version_table(cursor):
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS schema_version(
+        version INTEGER PRIMARY KEY,
+        name TEXT,
+        applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+
+
+def apply_migration(cursor, version, name, migrate):
+    # Re-check inside the write transaction in case another process got there first
+    if cursor.dialect == "postgresql":
+        # SQLite's BEGIN IMMEDIATE already serializes this; PostgreSQL needs a lock
+        cursor.execute("SELECT pg_advisory_xact_lock(?)", (MIGRATION_LOCK_ID,))
+    cursor.execute("SELECT 1 FROM schema_version WHERE version=?", (version,))
+    if cursor.fetchone():
+        return
+    migrate(cursor)
+    cursor.execute(
+        "INSERT INTO schema_version (version, name) VALUES (?,?)",
+        (version, name)
+    )
+
+
+def run_migrations(db):
+    db.write(create_schema_version_table)
+    # write() waits for each commit, so every step gets its own transaction
+    for version, name, migrate in MIGRATIONS:
+        db.write(apply_migration, version, name, migrate)
+
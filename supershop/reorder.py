@@ -0,0 +1,168 @@
+import datetime
+import math
+import threading
+
+import numpy as np
+import pandas as pd
+
+from .cache import QueryCache
+
+# ---------------- REORDER ENGINE ----------------
+# Daily sales velocity for the whole catalog at once: the rolling window of
+# rollup_product_daily (sale_items summed per product and day at checkout)
+# becomes one products x days NumPy matrix. Per-product velocity is cached;
+# later runs only recompute products with sales in the inventory ledger since
+# the last run, and a new day (the window moving) recomputes everything.
+VELOCITY_WINDOW_DAYS = 28
+LEAD_TIME_DAYS = 3  # from placing an order to the goods on the shelf
+COVER_DAYS = 7  # how long a delivery should last once it arrives
+SERVICE_Z = 1.65  # safety stock covering ~95% of days' demand swings
+REORDER_COLUMNS = ["product_id", "name", "unit", "supplier", "stock_quantity", "minimum_stock",
+                   "daily_velocity", "days_of_cover", "reorder_point", "suggested_quantity"]
+
+
+def daily_sales_matrix(product_ids, sales, start, days):
+    # sales: DataFrame of product_id, sale_date, quantity -> array of
+    # shape (len(product_ids), days), one column per day from start
+    matrix = np.zeros((len(product_ids), days))
+    if len(sales):
+        rows = pd.Index(product_ids).get_indexer(sales["product_id"])
+        cols = (pd.to_datetime(sales["sale_date"]) - pd.Timestamp(start)).dt.days.to_numpy()
+        keep = (rows >= 0) & (cols >= 0) & (cols < days)
+        np.add.at(matrix, (rows[keep], cols[keep]), sales["quantity"].to_numpy(dtype=float)[keep])
+    return matrix
+
+
+class ReorderEngine:
+
+    def __init__(self, db, cache=None, window_days=VELOCITY_WINDOW_DAYS,
+                 lead_time_days=LEAD_TIME_DAYS, cover_days=COVER_DAYS, service_z=SERVICE_Z):
+        self.db = db
+        self.cache = cache if cache is not None else QueryCache(db)
+        self.window_days = window_days
+        self.lead_time_days = lead_time_days
+        self.cover_days = cover_days
+        self.service_z = service_z
+        self._lock = threading.Lock()
+        self._velocity = None  # DataFrame of velocity, daily_std by product_id
+        self._window_start = None
+        self._watermark = 0  # last inventory_movements id already counted
+        self._suppliers = None  # latest supplier name by product_id
+        self._receipt_mark = 0  # last inventory_movements id already scanned for receipts
+        # Sales arrive with ledger movements, which the watermark picks up;
+        # a rollup write without any is a rebuild, so start over
+        db.add_commit_listener(self._on_commit)
+
+    def _on_commit(self, tables):
+        if tables is None:
+            # Anything may have changed (another process, an untagged write)
+            self.invalidate()
+            return
+        with self._lock:
+            if "rollup_product_daily" in tables and "inventory_movements" not in tables:
+                self._velocity = None
+            if "suppliers" in tables:
+                self._suppliers = None  # a supplier may have been renamed
+
+    def invalidate(self):
+        with self._lock:
+            self._velocity = None
+            self._suppliers = None
+
+    def _compute(self, conn, start, product_ids=None):
+        sql = "SELECT product_id, sale_date, quantity FROM rollup_product_daily WHERE sale_date >= ?"
+        params = [start.isoformat()]
+        if product_ids is not None:
+            sql += f" AND product_id IN ({','.join('?' * len(product_ids))})"
+            params += product_ids
+        sales = pd.DataFrame.from_records([tuple(row) for row in conn.execute(sql, params).fetchall()],
+                                          columns=["product_id", "sale_date", "quantity"])
+        if product_ids is None:
+            product_ids = sorted(sales["product_id"].unique())
+        matrix = daily_sales_matrix(product_ids, sales, start, self.window_days)
+        return pd.DataFrame({"velocity": matrix.mean(axis=1), "daily_std": matrix.std(axis=1)},
+                            index=pd.Index(product_ids, name="product_id"))
+
+    def _refresh(self, as_of):
+        start = as_of - datetime.timedelta(days=self.window_days - 1)
+        conn = self.db.read_connection()
+        # Read first: anything committed after this is recounted next time, never missed
+        latest = conn.execute("SELECT COALESCE(MAX(movement_id), 0) FROM inventory_movements").fetchone()[0]
+        if self._velocity is None or self._window_start != start:
+            self._velocity = self._compute(conn, start)
+        elif latest != self._watermark:
+            changed = [row[0] for row in conn.execute("""
+                SELECT DISTINCT product_id FROM inventory_movements
+                WHERE movement_id > ? AND movement_type = 'sale'
+            """, (self._watermark,)).fetchall()]
+            if changed:
+                fresh = self._compute(conn, start, changed)
+                self._velocity = pd.concat([self._velocity.drop(changed, errors="ignore"), fresh])
+        self._window_start, self._watermark = start, latest
+        return self._velocity
+
+    def _refresh_suppliers(self):
+        # Latest supplier each product was received from, topped up from the
+        # receipts since the last run, so a sale doesn't mean rereading them all
+        conn = self.db.read_connection()
+        latest = conn.execute("SELECT COALESCE(MAX(movement_id), 0) FROM inventory_movements").fetchone()[0]
+        if self._suppliers is None:
+            self._suppliers, self._receipt_mark = {}, 0
+        for product_id, supplier in conn.execute("""
+            SELECT m.product_id, s.name
+            FROM inventory_movements m
+            JOIN suppliers s ON s.supplier_id = m.supplier_id
+            WHERE m.movement_id > ? AND m.movement_id <= ? AND m.movement_type = 'receipt'
+            ORDER BY m.movement_id
+        """, (self._receipt_mark, latest)).fetchall():
+            self._suppliers[product_id] = supplier
+        self._receipt_mark = latest
+        return self._suppliers
+
+    def suggestions(self, as_of=None, all_products=False):
+        # Products at or below their reorder point (all products if asked),
+        # most urgent first. as_of is the window's last day, default today (UTC,
+        # like the rollup dates).
+        as_of = as_of or datetime.datetime.now(datetime.timezone.utc).date()
+        with self._lock:
+            velocity = self._refresh(as_of)
+            suppliers = pd.Series(self._refresh_suppliers(), dtype=object)
+        conn = self.db.read_connection()
+        products = self.cache.read_sql("""
+            SELECT product_id, name, unit, stock_quantity, minimum_stock, purchase_price FROM products
+        """, conn, tables=("products",))
+
+        df = products.set_index("product_id").join(velocity, how="left")
+        df["supplier"] = suppliers
+        stock = df["stock_quantity"].fillna(0.0).to_numpy(dtype=float)
+        minimum = df["minimum_stock"].fillna(0.0).to_numpy(dtype=float)
+        rate = df["velocity"].fillna(0.0).to_numpy(dtype=float)
+        safety = self.service_z * df["daily_std"].fillna(0.0).to_numpy(dtype=float) * math.sqrt(self.lead_time_days)
+
+        # The hand-typed minimum stays as a floor for slow movers
+        reorder_point = np.maximum(rate * self.lead_time_days + safety, minimum)
+        target = np.maximum(rate * (self.lead_time_days + self.cover_days) + safety, minimum)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            cover = np.where(rate > 0, stock / rate, np.nan)
+        df = df.assign(
+            daily_velocity=rate.round(3),
+            days_of_cover=cover.round(1),
+            reorder_point=np.ceil(reorder_point),
+            suggested_quantity=np.ceil(np.maximum(target - stock, 0.0)),
+        ).reset_index()
+        if not all_products:
+            df = df[stock <= reorder_point]
+        return df.sort_values(["days_of_cover", "product_id"], na_position="last")[
+            REORDER_COLUMNS + ["purchase_price"]].reset_index(drop=True)
+
+    def by_supplier(self, suggestions):
+        # One purchase order line per supplier: how many products, units and the cost
+        df = suggestions.assign(
+            supplier=suggestions["supplier"].fillna("(no supplier yet)"),
+            estimated_cost=suggestions["suggested_quantity"] * suggestions["purchase_price"].fillna(0.0),
+        )
+        return (df.groupby("supplier", as_index=False)
+                  .agg(products=("product_id", "count"),
+                       suggested_quantity=("suggested_quantity", "sum"),
+                       estimated_cost=("estimated_cost", "sum"))
+                  .sort_values("estimated_cost", ascending=False, ignore_index=True))
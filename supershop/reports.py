@@ -0,0 +1,147 @@
+import csv
+import datetime
+import gzip
+import os
+
+from .cache import QueryCache
+from .rollups import rebuild_rollups
+
+# ---------------- SALES EXPORT ----------------
+EXPORT_CHUNK_SIZE = 5000
+EXPORT_DIR = "exports"
+
+# dataset -> (query over a created_at range, [(column, parquet type)])
+# created_at is cast to text so both backends export the same timestamp format
+EXPORT_DATASETS = {
+    "Sales": ("""
+        SELECT s.sale_id, CAST(s.created_at AS TEXT), s.customer_id, c.name, s.employee_id, e.name,
+               s.payment_method, s.total_amount, s.amount_received, s.change_amount
+        FROM sales s
+        LEFT JOIN customers c ON c.customer_id = s.customer_id
+        LEFT JOIN employees e ON e.employee_id = s.employee_id
+        WHERE s.created_at >= ? AND s.created_at < ?
+        ORDER BY s.created_at, s.sale_id
+    """, [("sale_id", "int64"), ("created_at", "string"),
+          ("customer_id", "int64"), ("customer_name", "string"),
+          ("employee_id", "int64"), ("employee_name", "string"),
+          ("payment_method", "string"), ("total_amount", "float64"),
+          ("amount_received", "float64"), ("change_amount", "float64")]),
+    "Sale lines": ("""
+        SELECT s.sale_id, CAST(s.created_at AS TEXT), s.payment_method, si.item_id, si.product_id,
+               si.product_name, si.unit, si.quantity, si.unit_price, si.total_price, si.unit_cost
+        FROM sales s
+        JOIN sale_items si ON si.sale_id = s.sale_id
+        WHERE s.created_at >= ? AND s.created_at < ?
+        ORDER BY s.created_at, s.sale_id, si.item_id
+    """, [("sale_id", "int64"), ("created_at", "string"), ("payment_method", "string"),
+          ("item_id", "int64"), ("product_id", "int64"), ("product_name", "string"),
+          ("unit", "string"), ("quantity", "float64"), ("unit_price", "float64"),
+          ("total_price", "float64"), ("unit_cost", "float64")]),
+}
+
+
+def iter_export_chunks(conn, dataset, start_date, end_date, chunk_size=EXPORT_CHUNK_SIZE):
+    # A single SELECT is one consistent snapshot in WAL mode, and never blocks the tills
+    sql, _ = EXPORT_DATASETS[dataset]
+    end = end_date + datetime.timedelta(days=1)
+    cursor = conn.cursor()
+    try:
+        cursor.execute(sql, (start_date.isoformat(), end.isoformat()))
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            yield [tuple(row) for row in rows]
+    finally:
+        cursor.close()
+
+
+def write_export_csv(chunks, columns, path, compress):
+    count = 0
+    opener = gzip.open if compress else open
+    with opener(path, "wt", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow([name for name, _ in columns])
+        for rows in chunks:
+            writer.writerows(rows)
+            count += len(rows)
+    return count
+
+
+def write_export_parquet(chunks, columns, path, compress):
+    import pyarrow as pa  # only needed for Parquet exports
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([(name, pa.type_for_alias(kind)) for name, kind in columns])
+    count = 0
+    # One row group per chunk, so only a chunk is ever held in memory
+    with pq.ParquetWriter(path, schema, compression="gzip" if compress else "snappy") as writer:
+        for rows in chunks:
+            arrays = [pa.array(values, type=field.type)
+                      for values, field in zip(zip(*rows), schema)]
+            writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+            count += len(rows)
+    return count
+
+
+def export_sales(conn, dataset, start_date, end_date, fmt="csv", compress=False,
+                 directory=EXPORT_DIR, chunk_size=EXPORT_CHUNK_SIZE):
+    os.makedirs(directory, exist_ok=True)
+    slug = dataset.lower().replace(" ", "_")
+    extension = ".parquet" if fmt == "parquet" else (".csv.gz" if compress else ".csv")
+    path = os.path.join(directory, f"{slug}_{start_date}_{end_date}{extension}")
+
+    _, columns = EXPORT_DATASETS[dataset]
+    chunks = iter_export_chunks(conn, dataset, start_date, end_date, chunk_size)
+    if fmt == "parquet":
+        count = write_export_parquet(chunks, columns, path, compress)
+    else:
+        count = write_export_csv(chunks, columns, path, compress)
+    return path, count
+
+# ---------------- REPORTS API ----------------
+class Reports:
+    # Dashboard figures read the rollup tables maintained by checkout, so
+    # their cost doesn't grow with sales history
+
+    def __init__(self, db, cache=None):
+        self.db = db
+        self.cache = cache if cache is not None else QueryCache(db)
+
+    def _read(self, sql, tables):
+        return self.cache.read_sql(sql, self.db.read_connection(), tables=tables)
+
+    def totals(self):
+        # (revenue, profit)
+        row = self._read(
+            "SELECT COALESCE(SUM(revenue), 0) AS revenue, COALESCE(SUM(cost), 0) AS cost FROM rollup_daily",
+            ("rollup_daily",)
+        ).iloc[0]
+        return float(row['revenue']), float(row['revenue'] - row['cost'])
+
+    def revenue_by_product(self):
+        return self._read("""
+            SELECT product_id, product_name AS name, revenue AS total_price
+            FROM rollup_product_totals
+            ORDER BY product_id
+        """, ("rollup_product_totals",))
+
+    def daily_sales(self):
+        return self._read("""
+            SELECT sale_date, total_sales
+            FROM rollup_daily
+            ORDER BY sale_date
+        """, ("rollup_daily",))
+
+    def rebuild_rollups(self):
+        self.db.write(rebuild_rollups)
+
+    def export_sales(self, dataset, start_date, end_date, fmt="csv", compress=False,
+                     directory=EXPORT_DIR, chunk_size=EXPORT_CHUNK_SIZE):
+        return export_sales(self.db.read_connection(), dataset, start_date, end_date,
+                            fmt, compress, directory, chunk_size)
+
+    def archive_memos(self, start_date=None, end_date=None, sale_ids=None, fmt="zip", **options):
+        # Imported here so `python -m supershop.archive` doesn't find itself already loaded
+        from .archive import archive_memos
+        return archive_memos(self.db.read_connection(), start_date, end_date, sale_ids, fmt, **options)
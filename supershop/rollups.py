@@ -0,0 +1,154 @@
+from sqlalchemy import Column, Date, Float, Integer, Table, Text
+
+from .db import writes
+from .schema import metadata
+
+# ---------------- SALES ROLLUPS ----------------
+# Summary tables kept current by checkout (same transaction as the sale) so
+# the Dashboard never has to scan raw sales history. Migrations 5 and 12
+# create the tables.
+ROLLUP_TABLES = ["rollup_daily", "rollup_product_daily", "rollup_payment_daily", "rollup_product_totals"]
+
+
+rollup_daily = Table(
+    "rollup_daily", metadata,
+    Column("sale_date", Date, primary_key=True),
+    Column("sale_count", Integer, nullable=False, server_default="0"),
+    Column("total_sales", Float, nullable=False, server_default="0"),
+    Column("revenue", Float, nullable=False, server_default="0"),
+    Column("cost", Float, nullable=False, server_default="0"),
+)
+
+rollup_product_daily = Table(
+    "rollup_product_daily", metadata,
+    Column("sale_date", Date, primary_key=True),
+    Column("product_id", Integer, primary_key=True),
+    Column("quantity", Float, nullable=False, server_default="0"),
+    Column("revenue", Float, nullable=False, server_default="0"),
+    Column("cost", Float, nullable=False, server_default="0"),
+)
+
+rollup_payment_daily = Table(
+    "rollup_payment_daily", metadata,
+    Column("sale_date", Date, primary_key=True),
+    Column("payment_method", Text, primary_key=True),
+    Column("sale_count", Integer, nullable=False, server_default="0"),
+    Column("total_amount", Float, nullable=False, server_default="0"),
+    Column("amount_received", Float, nullable=False, server_default="0"),
+    Column("change_amount", Float, nullable=False, server_default="0"),
+)
+
+
+# All-time totals per product, so Revenue by Product reads one row per
+# product instead of summing one per product per day
+rollup_product_totals = Table(
+    "rollup_product_totals", metadata,
+    Column("product_id", Integer, primary_key=True),
+    Column("product_name", Text),  # the name it was last sold under
+    Column("quantity", Float, nullable=False, server_default="0"),
+    Column("revenue", Float, nullable=False, server_default="0"),
+    Column("cost", Float, nullable=False, server_default="0"),
+)
+
+
+def add_sale_to_rollups(cursor, sale_date, payment_method, total,
+                        amount_received, change_amount, lines):
+    # lines: [(product_id, product_name, quantity, revenue, cost)], one per product
+    revenue = sum(line[3] for line in lines)
+    cost = sum(line[4] for line in lines)
+
+    cursor.execute("""
+        INSERT INTO rollup_daily (sale_date, sale_count, total_sales, revenue, cost)
+        VALUES (?, 1, ?, ?, ?)
+        ON CONFLICT(sale_date) DO UPDATE SET
+            sale_count = rollup_daily.sale_count + 1,
+            total_sales = rollup_daily.total_sales + excluded.total_sales,
+            revenue = rollup_daily.revenue + excluded.revenue,
+            cost = rollup_daily.cost + excluded.cost
+    """, (sale_date, total, revenue, cost))
+
+    cursor.executemany("""
+        INSERT INTO rollup_product_daily (sale_date, product_id, product_name, quantity, revenue, cost)
+        VALUES (?, ?, ?, ?, ?, ?)
+        ON CONFLICT(sale_date, product_id) DO UPDATE SET
+            product_name = excluded.product_name,
+            quantity = rollup_product_daily.quantity + excluded.quantity,
+            revenue = rollup_product_daily.revenue + excluded.revenue,
+            cost = rollup_product_daily.cost + excluded.cost
+    """, [(sale_date,) + tuple(line) for line in lines])
+
+    cursor.executemany("""
+        INSERT INTO rollup_product_totals (product_id, product_name, quantity, revenue, cost)
+        VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT(product_id) DO UPDATE SET
+            product_name = excluded.product_name,
+            quantity = rollup_product_totals.quantity + excluded.quantity,
+            revenue = rollup_product_totals.revenue + excluded.revenue,
+            cost = rollup_product_totals.cost + excluded.cost
+    """, [tuple(line) for line in lines])
+
+    cursor.execute("""
+        INSERT INTO rollup_payment_daily
+        (sale_date, payment_method, sale_count, total_amount, amount_received, change_amount)
+        VALUES (?, ?, 1, ?, ?, ?)
+        ON CONFLICT(sale_date, payment_method) DO UPDATE SET
+            sale_count = rollup_payment_daily.sale_count + 1,
+            total_amount = rollup_payment_daily.total_amount + excluded.total_amount,
+            amount_received = rollup_payment_daily.amount_received + excluded.amount_received,
+            change_amount = rollup_payment_daily.change_amount + excluded.change_amount
+    """, (sale_date, payment_method, total, amount_received, change_amount))
+
+
+def fill_product_totals(cursor):
+    # From the daily rollup, with each product's latest name
+    cursor.execute("DELETE FROM rollup_product_totals")
+    cursor.execute("""
+        INSERT INTO rollup_product_totals (product_id, product_name, quantity, revenue, cost)
+        SELECT d.product_id,
+               (SELECT l.product_name FROM rollup_product_daily l
+                WHERE l.product_id = d.product_id ORDER BY l.sale_date DESC LIMIT 1),
+               SUM(d.quantity), SUM(d.revenue), SUM(d.cost)
+        FROM rollup_product_daily d
+        GROUP BY d.product_id
+    """)
+
+
+@writes(*ROLLUP_TABLES)
+def rebuild_rollups(cursor):
+    # Backfill from raw history, using the cost and name snapshotted on each line
+    for table in ROLLUP_TABLES:
+        cursor.execute(f"DELETE FROM {table}")
+
+    cursor.execute("""
+        INSERT INTO rollup_product_daily (sale_date, product_id, product_name, quantity, revenue, cost)
+        SELECT DATE(s.created_at), si.product_id, MAX(si.product_name), SUM(si.quantity),
+               SUM(si.total_price), SUM(si.quantity * COALESCE(si.unit_cost, 0))
+        FROM sale_items si
+        JOIN sales s ON s.sale_id = si.sale_id
+        GROUP BY DATE(s.created_at), si.product_id
+    """)
+
+    cursor.execute("""
+        INSERT INTO rollup_daily (sale_date, sale_count, total_sales, revenue, cost)
+        SELECT DATE(created_at), COUNT(*), SUM(total_amount), 0, 0
+        FROM sales
+        GROUP BY DATE(created_at)
+    """)
+    cursor.execute("""
+        UPDATE rollup_daily SET
+            revenue = (SELECT COALESCE(SUM(revenue), 0) FROM rollup_product_daily r
+                       WHERE r.sale_date = rollup_daily.sale_date),
+            cost = (SELECT COALESCE(SUM(cost), 0) FROM rollup_product_daily r
+                    WHERE r.sale_date = rollup_daily.sale_date)
+    """)
+
+    cursor.execute("""
+        INSERT INTO rollup_payment_daily
+        (sale_date, payment_method, sale_count, total_amount, amount_received, change_amount)
+        SELECT DATE(created_at), payment_method, COUNT(*), SUM(total_amount),
+               SUM(amount_received), SUM(change_amount)
+        FROM sales
+        GROUP BY DATE(created_at), payment_method
+    """)
+
+    fill_product_totals(cursor)
@@ -0,0 +1,114 @@
+from sqlalchemy import Column, Date, DateTime, Float, Integer, MetaData, Table, Text, text
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.schema import CreateTable
+
+# ---------------- PORTABLE DDL ----------------
+# Tables are declared once and compiled for the backend the write cursor
+# belongs to: AUTOINCREMENT on SQLite, SERIAL and double precision on PostgreSQL.
+DIALECTS = {"sqlite": sqlite.dialect(), "postgresql": postgresql.dialect()}
+NOW = text("CURRENT_TIMESTAMP")
+
+metadata = MetaData()
+
+
+def create_table(cursor, table):
+    ddl = CreateTable(table, if_not_exists=True).compile(dialect=DIALECTS[cursor.dialect])
+    cursor.execute(str(ddl))
+
+
+def column_type(cursor, sql_type):
+    return sql_type.compile(dialect=DIALECTS[cursor.dialect])
+
+
+# Base schema as of migration 1; later migrations add columns to these
+products = Table(
+    "products", metadata,
+    Column("product_id", Integer, primary_key=True),
+    Column("name", Text),
+    Column("barcode", Text, unique=True),
+    Column("category", Text),
+    Column("unit", Text),
+    Column("purchase_price", Float),
+    Column("selling_price", Float),
+    Column("stock_quantity", Float),
+    Column("minimum_stock", Float),
+    sqlite_autoincrement=True,
+)
+
+customers = Table(
+    "customers", metadata,
+    Column("customer_id", Integer, primary_key=True),
+    Column("name", Text),
+    Column("phone", Text),
+    Column("address", Text),
+    Column("created_at", DateTime, server_default=NOW),
+    sqlite_autoincrement=True,
+)
+
+employees = Table(
+    "employees", metadata,
+    Column("employee_id", Integer, primary_key=True),
+    Column("name", Text),
+    Column("role", Text),
+    Column("salary", Float),
+    Column("hired_date", Date),
+    sqlite_autoincrement=True,
+)
+
+suppliers = Table(
+    "suppliers", metadata,
+    Column("supplier_id", Integer, primary_key=True),
+    Column("name", Text),
+    Column("phone", Text),
+    Column("address", Text),
+    sqlite_autoincrement=True,
+)
+
+sales = Table(
+    "sales", metadata,
+    Column("sale_id", Integer, primary_key=True),
+    Column("customer_id", Integer),
+    Column("employee_id", Integer),
+    Column("total_amount", Float),
+    Column("payment_method", Text),
+    Column("amount_received", Float),
+    Column("change_amount", Float),
+    Column("created_at", DateTime, server_default=NOW),
+    sqlite_autoincrement=True,
+)
+
+sale_items = Table(
+    "sale_items", metadata,
+    Column("item_id", Integer, primary_key=True),
+    Column("sale_id", Integer),
+    Column("product_id", Integer),
+    Column("quantity", Float),
+    Column("unit_price", Float),
+    Column("total_price", Float),
+    sqlite_autoincrement=True,
+)
+
+
+# ---------------- CREATE TABLES IF NOT EXISTS ----------------
+def create_tables(cursor):
+    for table in (products, customers, employees, suppliers, sales, sale_items):
+        create_table(cursor, table)
+
+# ---------------- AUTO INSERT DEFAULT DATA ----------------
+def seed_default_data(cursor):
+
+    # Default Customer
+    cursor.execute("SELECT COUNT(*) FROM customers")
+    if cursor.fetchone()[0] == 0:
+        cursor.execute("""
+            INSERT INTO customers (name, phone, address)
+            VALUES ('Walk-in Customer', 'N/A', 'Local')
+        """)
+
+    # Default Employee
+    cursor.execute("SELECT COUNT(*) FROM employees")
+    if cursor.fetchone()[0] == 0:
+        cursor.execute("""
+            INSERT INTO employees (name, role, salary, hired_date)
+            VALUES ('Admin', 'Manager', 0, CURRENT_DATE)
+        """)
@@ -0,0 +1,277 @@
+import pandas as pd
+from sqlalchemy import Column, DateTime, Float, Integer, Table, Text
+
+from .cache import QueryCache
+from .checkout import PAYMENT_METHODS
+from .db import writes
+from .inventory import SNAPSHOT_NOW
+from .memo import RECEIPT_WIDTH, SHOP_NAME, receipt_row, receipt_text
+from .schema import NOW, create_table, metadata
+
+# ---------------- SHIFT CLOSE / Z-REPORT ----------------
+# A shift is the run of sales after the previous close, by sale_id, so its
+# totals are one primary-key range scan however much history sits before it.
+# Closing stores the shift and its per-payment-method and per-employee totals
+# as rows no one can change afterwards (triggers reject UPDATE and DELETE).
+# Offline sales a till syncs later land in the shift open when they sync.
+SHIFT_TABLES = ["shifts", "shift_totals"]
+SHIFT_GROUPS = {"payment_method": "Payment Method", "employee": "Employee"}
+SHIFT_HISTORY_LIMIT = 100
+SHIFT_LOCK_ID = 7_470_002  # advisory lock key, next to the migrations'
+METHOD_ORDER = {method: i for i, method in enumerate(PAYMENT_METHODS)}
+TOTAL_COLUMNS = ["group_key", "label", "sale_count", "total_amount", "amount_received", "change_amount"]
+
+
+shifts = Table(
+    "shifts", metadata,
+    Column("shift_id", Integer, primary_key=True),
+    Column("opened_at", DateTime),
+    Column("closed_at", DateTime, nullable=False, server_default=NOW),
+    Column("after_sale_id", Integer, nullable=False),  # the window is (after, last]
+    Column("last_sale_id", Integer, nullable=False),
+    Column("closed_by", Integer),
+    Column("sale_count", Integer, nullable=False),
+    Column("total_amount", Float, nullable=False),
+    Column("opening_float", Float, nullable=False),
+    Column("cash_expected", Float, nullable=False),
+    Column("cash_counted", Float, nullable=False),
+    Column("cash_difference", Float, nullable=False),  # + over, - short
+    Column("note", Text),
+    sqlite_autoincrement=True,
+)
+
+shift_totals = Table(
+    "shift_totals", metadata,
+    Column("shift_id", Integer, primary_key=True),
+    Column("group_type", Text, primary_key=True),  # a SHIFT_GROUPS key
+    Column("group_key", Text, primary_key=True),
+    Column("label", Text),  # employee name as it was at close
+    Column("sale_count", Integer, nullable=False),
+    Column("total_amount", Float, nullable=False),
+    Column("amount_received", Float, nullable=False),
+    Column("change_amount", Float, nullable=False),
+)
+
+
+class ShiftError(Exception):
+    pass
+
+
+def create_shift_tables(cursor):
+    create_table(cursor, shifts)
+    create_table(cursor, shift_totals)
+    if cursor.dialect == "postgresql":
+        cursor.execute("""
+            CREATE OR REPLACE FUNCTION reject_shift_change() RETURNS trigger AS $$
+            BEGIN
+                RAISE EXCEPTION 'closed shifts are immutable';
+            END
+            $$ LANGUAGE plpgsql
+        """)
+        for table in SHIFT_TABLES:
+            cursor.execute(f"""
+                CREATE OR REPLACE TRIGGER {table}_immutable BEFORE UPDATE OR DELETE ON {table}
+                FOR EACH ROW EXECUTE FUNCTION reject_shift_change()
+            """)
+        return
+    for table in SHIFT_TABLES:
+        for action in ("UPDATE", "DELETE"):
+            cursor.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS {table}_no_{action.lower()} BEFORE {action} ON {table}
+                BEGIN SELECT RAISE(ABORT, 'closed shifts are immutable'); END
+            """)
+
+
+def start_shift_tracking(cursor):
+    # Sales from before shifts existed belong to no shift: an empty record
+    # marks where the first real shift starts
+    cursor.execute(f"""
+        INSERT INTO shifts
+        (opened_at, closed_at, after_sale_id, last_sale_id, sale_count, total_amount,
+         opening_float, cash_expected, cash_counted, cash_difference, note)
+        SELECT {SNAPSHOT_NOW[cursor.dialect]}, {SNAPSHOT_NOW[cursor.dialect]}, latest.m, latest.m,
+               0, 0, 0, 0, 0, 0, 'shift tracking started'
+        FROM (SELECT MAX(sale_id) AS m FROM sales) latest
+        WHERE latest.m IS NOT NULL AND NOT EXISTS (SELECT 1 FROM shifts)
+    """)
+
+
+def window_totals(conn, after_sale_id, last_sale_id=None):
+    # Totals for sales after after_sale_id, up to last_sale_id (None: all so far):
+    # [(group_type, group_key, label, sale_count, total_amount, amount_received, change_amount)]
+    # One pass over the sale_id range; grouping by both columns at once also
+    # keeps the planner off the employee_id index, which would mean a full scan
+    where, params = "sale_id > ?", [after_sale_id]
+    if last_sale_id is not None:
+        where, params = where + " AND sale_id <= ?", params + [last_sale_id]
+    groups = conn.execute(f"""
+        SELECT payment_method, employee_id, COUNT(*), COALESCE(SUM(total_amount), 0),
+               COALESCE(SUM(amount_received), 0), COALESCE(SUM(change_amount), 0)
+        FROM sales
+        WHERE {where}
+        GROUP BY payment_method, employee_id
+    """, params).fetchall()
+
+    methods = {method: [0, 0.0, 0.0, 0.0] for method in PAYMENT_METHODS}
+    employees = {}
+    for method, employee_id, *values in groups:
+        for total in (methods.setdefault(method or "(none)", [0, 0.0, 0.0, 0.0]),
+                      employees.setdefault(employee_id, [0, 0.0, 0.0, 0.0])):
+            for i, value in enumerate(values):
+                total[i] += value
+
+    names = {}
+    ids = [employee_id for employee_id in employees if employee_id is not None]
+    if ids:
+        names = dict(tuple(row) for row in conn.execute(
+            f"SELECT employee_id, name FROM employees WHERE employee_id IN ({','.join('?' * len(ids))})",
+            ids).fetchall())
+    rows = [("payment_method", method, method) + tuple(values) for method, values in methods.items()]
+    for employee_id, values in employees.items():
+        label = names.get(employee_id) or ("(none)" if employee_id is None else f"Employee #{employee_id}")
+        rows.append(("employee", "" if employee_id is None else str(employee_id), label) + tuple(values))
+    return rows
+
+
+def cash_expected(totals, opening_float):
+    # Change comes out of the drawer, so cash sales add their total
+    return opening_float + sum(row[4] for row in totals if row[0] == "payment_method" and row[1] == "Cash")
+
+
+# ---------------- WRITE JOBS ----------------
+@writes(*SHIFT_TABLES)
+def close_shift(cursor, closed_by, opening_float, cash_counted, note=None):
+    if opening_float < 0 or cash_counted < 0:
+        raise ShiftError("Cash amounts can't be negative")
+    if cursor.dialect == "postgresql":
+        # One close at a time; then wait out sales already in flight and hold
+        # new ones until we commit, so no lower sale_id can commit after the line
+        cursor.execute("SELECT pg_advisory_xact_lock(?)", (SHIFT_LOCK_ID,))
+        cursor.execute("LOCK TABLE sales IN SHARE MODE")
+
+    previous = cursor.execute("""
+        SELECT last_sale_id, closed_at FROM shifts ORDER BY shift_id DESC LIMIT 1
+    """).fetchone()
+    after_sale_id, opened_at = (previous[0], previous[1]) if previous else (0, None)
+    last_sale_id = cursor.execute("SELECT COALESCE(MAX(sale_id), 0) FROM sales").fetchone()[0]
+
+    totals = window_totals(cursor, after_sale_id, last_sale_id)
+    sale_count = sum(row[3] for row in totals if row[0] == "payment_method")
+    total_amount = sum(row[4] for row in totals if row[0] == "payment_method")
+    expected = cash_expected(totals, opening_float)
+
+    # The first shift opens with its first sale (or now, if it had none)
+    cursor.execute(f"""
+        INSERT INTO shifts
+        (opened_at, closed_at, after_sale_id, last_sale_id, closed_by, sale_count, total_amount,
+         opening_float, cash_expected, cash_counted, cash_difference, note)
+        VALUES (COALESCE(?, (SELECT MIN(created_at) FROM sales WHERE sale_id > ? AND sale_id <= ?),
+                         {SNAPSHOT_NOW[cursor.dialect]}),
+                {SNAPSHOT_NOW[cursor.dialect]}, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        RETURNING shift_id
+    """, (opened_at, after_sale_id, last_sale_id, after_sale_id, last_sale_id, closed_by,
+          sale_count, total_amount, opening_float, expected, cash_counted, cash_counted - expected, note))
+    shift_id = cursor.fetchone()[0]
+    cursor.executemany("""
+        INSERT INTO shift_totals
+        (shift_id, group_type, group_key, label, sale_count, total_amount, amount_received, change_amount)
+        VALUES (?,?,?,?,?,?,?,?)
+    """, [(shift_id,) + tuple(row) for row in totals])
+    return shift_id
+
+
+# ---------------- SHIFTS API ----------------
+class Shifts:
+    # Reports are dicts of the shift's figures plus a DataFrame per SHIFT_GROUPS
+    # key; current() is the open shift so far (an X-report), report() a closed one
+
+    def __init__(self, db, cache=None):
+        self.db = db
+        self.cache = cache if cache is not None else QueryCache(db)
+
+    # ---- writes ----
+    def close(self, closed_by, opening_float, cash_counted, note=None):
+        return self.db.write(close_shift, closed_by, opening_float, cash_counted, note)
+
+    # ---- reads ----
+    def _report(self, shift, totals):
+        # Payment methods in the POS's order, employees by name
+        report = dict(shift)
+        totals = sorted(totals, key=lambda row: (METHOD_ORDER.get(row[1], len(METHOD_ORDER))
+                                                 if row[0] == "payment_method" else 0, row[2]))
+        for group in SHIFT_GROUPS:
+            report[group] = pd.DataFrame([row[1:] for row in totals if row[0] == group], columns=TOTAL_COLUMNS)
+        return report
+
+    def current(self, opening_float=0.0):
+        conn = self.db.read_connection()
+        previous = conn.execute("""
+            SELECT last_sale_id, closed_at FROM shifts ORDER BY shift_id DESC LIMIT 1
+        """).fetchone()
+        after_sale_id, opened_at = (previous[0], previous[1]) if previous else (0, None)
+        totals = window_totals(conn, after_sale_id)
+        payments = [row for row in totals if row[0] == "payment_method"]
+        return self._report({
+            "shift_id": None,
+            "opened_at": opened_at,
+            "closed_at": None,
+            "after_sale_id": after_sale_id,
+            "sale_count": sum(row[3] for row in payments),
+            "total_amount": sum(row[4] for row in payments),
+            "opening_float": opening_float,
+            "cash_expected": cash_expected(totals, opening_float),
+        }, totals)
+
+    def report(self, shift_id):
+        conn = self.db.read_connection()
+        row = conn.execute("""
+            SELECT s.*, e.name AS closed_by_name
+            FROM shifts s
+            LEFT JOIN employees e ON e.employee_id = s.closed_by
+            WHERE s.shift_id = ?
+        """, (shift_id,)).fetchone()
+        if row is None:
+            raise ShiftError(f"Shift #{shift_id} not found")
+        totals = [tuple(t) for t in conn.execute("""
+            SELECT group_type, group_key, label, sale_count, total_amount, amount_received, change_amount
+            FROM shift_totals
+            WHERE shift_id = ?
+        """, (shift_id,)).fetchall()]
+        return self._report(dict(row), totals)
+
+    def history(self, limit=SHIFT_HISTORY_LIMIT):
+        return self.cache.read_sql("""
+            SELECT s.shift_id, s.opened_at, s.closed_at, e.name AS closed_by, s.sale_count,
+                   s.total_amount, s.cash_expected, s.cash_counted, s.cash_difference, s.note
+            FROM shifts s
+            LEFT JOIN employees e ON e.employee_id = s.closed_by
+            ORDER BY s.shift_id DESC
+            LIMIT ?
+        """, self.db.read_connection(), params=(limit,), tables=("employees", *SHIFT_TABLES))
+
+
+# ---------------- PRINTED Z-REPORT ----------------
+def z_report_text(report):
+    # 80 mm receipt layout, like the thermal cash memo; times to the second
+    rule = "-" * RECEIPT_WIDTH
+    title = f"Z-REPORT  SHIFT #{report['shift_id']}" if report["shift_id"] else "X-REPORT (SHIFT OPEN)"
+    lines = [("title", SHOP_NAME), ("center", title), ("", rule),
+             ("", receipt_row("Opened", str(report["opened_at"] or "-")[:19]))]
+    if report["closed_at"]:
+        lines.append(("", receipt_row("Closed", str(report["closed_at"])[:19])))
+    if report.get("closed_by_name"):
+        lines.append(("", receipt_row("Closed by", report["closed_by_name"])))
+    lines += [("", receipt_row("Sales", str(report["sale_count"]))),
+              ("bold", receipt_row("TOTAL", f"{report['total_amount']:.2f}"))]
+    for group, heading in SHIFT_GROUPS.items():
+        lines += [("", rule), ("bold", f"By {heading.lower()}")]
+        for _, row in report[group].iterrows():
+            lines.append(("", receipt_row(f"{row['label']} ({row['sale_count']})", f"{row['total_amount']:.2f}")))
+    lines += [("", rule), ("", receipt_row("Opening float", f"{report['opening_float']:.2f}")),
+              ("bold", receipt_row("Cash expected", f"{report['cash_expected']:.2f}"))]
+    if report.get("cash_counted") is not None:
+        lines += [("", receipt_row("Cash counted", f"{report['cash_counted']:.2f}")),
+                  ("bold", receipt_row("Over / short", f"{report['cash_difference']:+.2f}"))]
+    if report.get("note"):
+        lines += [("", rule), ("", f"Note: {report['note']}"[:RECEIPT_WIDTH])]
+    return receipt_text(lines + [("", rule)])
@@ -0,0 +1,53 @@
+from .cache import QueryCache
+from .catalog import Catalog
+from .checkout import Checkout
+from .db import DATABASE, ConnectionManager
+from .directory import Directory
+from .inventory import Inventory
+from .journal import Till, TillJournal, journal_path
+from .memo import MemoRenderer
+from .migrations import run_migrations
+from .reorder import ReorderEngine
+from .reports import Reports
+from .shifts import Shifts
+
+
+class Shop:
+    # Everything the POS needs over one database, usable without Streamlit:
+    #     with Shop("supershop.db") as shop:
+    #         shop.catalog.lookup_barcode("123")
+    # database is a SQLite path or a SQLAlchemy URL; it defaults to
+    # $SUPERSHOP_DATABASE_URL, else supershop.db.
+    # Passing a till name turns on till mode: shop.till journals sales locally
+    # and syncs them to the shared database in the background.
+
+    def __init__(self, database=DATABASE, till=None):
+        self.db = ConnectionManager(database)
+        # A till has to start while the shared database is locked or down:
+        # its sync worker migrates once it gets through
+        journal = TillJournal(journal_path(till)) if till else None
+        if journal is None:
+            run_migrations(self.db)
+        self.cache = QueryCache(self.db)
+        self.catalog = Catalog(self.db, self.cache, loader=journal.products if journal else None)
+        self.directory = Directory(self.db, self.cache)
+        self.checkout = Checkout(self.db, self.catalog)
+        self.reports = Reports(self.db, self.cache)
+        self.inventory = Inventory(self.db, self.cache, self.catalog)
+        self.reorder = ReorderEngine(self.db, self.cache)
+        self.shifts = Shifts(self.db, self.cache)
+        self.memos = MemoRenderer()
+        self.till = Till(till, self.db, self.checkout, self.catalog,
+                         directory=self.directory, journal=journal) if till else None
+
+    def close(self):
+        if self.till is not None:
+            self.till.close()
+        self.memos.close()
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,114 @@
+import json
+import threading
+import urllib.error
+import urllib.request
+
+import pytest
+
+from supershop import Shop
+from supershop.api import ApiError, PosApi, make_server
+
+
+@pytest.fixture
+def api(tmp_path):
+    with Shop(str(tmp_path / "pos.db")) as shop:
+        shop.catalog.add("Soap", "1001", "Toiletries", "pcs", 30.0, 40.0, 10, 2)
+        yield PosApi(shop)
+
+
+@pytest.fixture
+def server(api):
+    server = make_server(api.shop, port=0)
+    server.RequestHandlerClass.api = api
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+def get(url):
+    try:
+        with urllib.request.urlopen(url) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read())
+
+
+def open_cart(api, quantity=1):
+    _, cart = api.handle("POST", ["carts"], {})
+    api.handle("POST", ["carts", cart["cart_id"], "items"], {"barcode": "1001", "quantity": quantity})
+    return cart["cart_id"]
+
+
+def test_concurrent_checkouts_ring_up_one_sale(api):
+    cart_id = open_cart(api)
+    body = {"customer_id": 1, "employee_id": 1, "payment_method": "Card"}
+    start = threading.Barrier(8)
+    results = []
+
+    def checkout():
+        start.wait()
+        results.append(api.handle("POST", ["carts", cart_id, "checkout"], body))
+
+    threads = [threading.Thread(target=checkout) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(results) == 8
+    assert {status for status, _ in results} == {200}
+    assert len({payload["sale_id"] for _, payload in results}) == 1
+    conn = api.shop.db.read_connection()
+    assert conn.execute("SELECT COUNT(*) FROM sales").fetchone()[0] == 1
+    assert conn.execute("SELECT stock_quantity FROM products").fetchone()[0] == 9
+
+
+def test_checked_out_cart_is_read_only(api):
+    cart_id = open_cart(api)
+    api.handle("POST", ["carts", cart_id, "checkout"], {"customer_id": 1, "employee_id": 1,
+                                                        "payment_method": "Card"})
+    with pytest.raises(ApiError) as e:
+        api.handle("POST", ["carts", cart_id, "items"], {"barcode": "1001"})
+    assert e.value.status == 409
+
+
+@pytest.mark.parametrize("value", ["nan", "inf", "-inf", float("nan"), float("inf"), 0, -1])
+def test_rejects_bad_quantities(api, value):
+    _, cart = api.handle("POST", ["carts"], {})
+    with pytest.raises(ApiError) as e:
+        api.handle("POST", ["carts", cart["cart_id"], "items"], {"barcode": "1001", "quantity": value})
+    assert e.value.status == 400
+
+
+@pytest.mark.parametrize("body", [{"product_id": "inf"}, {"product_id": "nan"}])
+def test_rejects_non_finite_ids(api, body):
+    _, cart = api.handle("POST", ["carts"], {})
+    with pytest.raises(ApiError) as e:
+        api.handle("POST", ["carts", cart["cart_id"], "items"], body)
+    assert e.value.status == 400
+
+
+def test_rejects_negative_cash(api):
+    cart_id = open_cart(api)
+    with pytest.raises(ApiError) as e:
+        api.handle("POST", ["carts", cart_id, "checkout"], {"customer_id": 1, "employee_id": 1,
+                                                            "amount_received": -100})
+    assert e.value.status == 400
+
+
+def test_barcode_in_path_is_url_decoded(api, server):
+    api.shop.catalog.add("Shampoo", "SH/200 ml", "Toiletries", "pcs", 80.0, 100.0, 5, 1)
+    status, product = get(f"{server}/products/SH%2F200%20ml")
+    assert status == 200
+    assert product["name"] == "Shampoo"
+
+
+def test_server_error_hides_details(api, server, monkeypatch):
+    def broken(*args):
+        raise RuntimeError("database password is hunter2")
+
+    monkeypatch.setattr(api, "handle", broken)
+    status, payload = get(f"{server}/products/1001")
+    assert status == 500
+    assert payload == {"error": "Internal server error"}
@@ -0,0 +1,29 @@
+import pytest
+
+from supershop import Shop
+from supershop.catalog import CATALOG_SORTS
+
+
+@pytest.fixture
+def shop(tmp_path):
+    with Shop(str(tmp_path / "pos.db")) as shop:
+        for i in range(12):
+            shop.catalog.add(f"Item {i:02d}", f"B{i}", "Food", "pcs", 1.0, 2.0 + i, i, 1)
+        # Rows from before the form required these columns
+        shop.db.write(lambda cursor: cursor.execute(
+            "UPDATE products SET name=NULL, stock_quantity=NULL, selling_price=NULL WHERE product_id % 3 = 0"))
+        yield shop
+
+
+@pytest.mark.parametrize("label", list(CATALOG_SORTS))
+def test_paging_visits_every_product_once(shop, label):
+    sort_column, direction = CATALOG_SORTS[label]
+    seen, after = [], None
+    while True:
+        page, has_more = shop.catalog.page(sort_column, direction, after, page_size=5)
+        seen += page["product_id"].tolist()
+        if not has_more:
+            break
+        last = page.iloc[-1]
+        after = (last[sort_column], int(last["product_id"]))
+    assert sorted(seen) == list(range(1, 13))
@@ -0,0 +1,45 @@
+import threading
+
+import pytest
+
+from supershop.db import ConnectionManager, writes
+
+
+@writes("notes")
+def add_note(cursor, text):
+    cursor.execute("CREATE TABLE IF NOT EXISTS notes (text TEXT)")
+    cursor.execute("INSERT INTO notes (text) VALUES (?)", (text,))
+    return text
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = ConnectionManager(str(tmp_path / "pos.db"))
+    yield db
+    db.close()
+
+
+def test_failing_listener_does_not_stop_the_writer(db):
+    def broken(tables):
+        raise RuntimeError("listener failed")
+
+    seen = []
+    db.add_commit_listener(broken)
+    db.add_commit_listener(seen.append)
+    assert db.write(add_note, "one") == "one"
+    assert db.write(add_note, "two") == "two"
+    assert seen == [{"notes"}, {"notes"}]
+
+
+def test_failing_idle_check_does_not_stop_the_writer(db, monkeypatch):
+    failed = threading.Event()
+
+    def broken():
+        failed.set()
+        raise RuntimeError("data_version failed")
+
+    monkeypatch.setattr(db, "_check_external_writes", broken)
+    monkeypatch.setattr("supershop.db.EXTERNAL_CHECK_INTERVAL", 0.01)
+    assert failed.wait(5)
+    monkeypatch.undo()
+    assert db.write(add_note, "after") == "after"
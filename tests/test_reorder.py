@@ -0,0 +1,50 @@
+import datetime
+
+import pytest
+
+from supershop import Cart, Shop
+
+
+@pytest.fixture
+def shop(tmp_path):
+    with Shop(str(tmp_path / "pos.db")) as shop:
+        shop.catalog.add("Soap", "1001", "Toiletries", "pcs", 30.0, 40.0, 10, 20)
+        yield shop
+
+
+def sell(shop, product_id, quantity):
+    cart = Cart()
+    cart.add(shop.catalog.get(product_id), quantity)
+    shop.checkout.confirm(cart, 1, 1, "Card")
+
+
+def supplier_of(shop, product_id):
+    rows = shop.reorder.suggestions(datetime.datetime.now(datetime.timezone.utc).date(), all_products=True)
+    return rows.set_index("product_id").loc[product_id, "supplier"]
+
+
+def test_supplier_follows_receipts_and_renames(shop):
+    acme = shop.directory.add_supplier("ACME", "0170", "Dhaka")
+    shop.inventory.receive(acme, [(1, 5, None)])
+    assert supplier_of(shop, 1) == "ACME"
+
+    sell(shop, 1, 2)
+    assert supplier_of(shop, 1) == "ACME"
+
+    other = shop.directory.add_supplier("Bengal Traders", "0180", "Khulna")
+    shop.inventory.receive(other, [(1, 5, None)])
+    assert supplier_of(shop, 1) == "Bengal Traders"
+
+    shop.db.write(lambda cursor: cursor.execute("UPDATE suppliers SET name='BT Ltd' WHERE supplier_id=?",
+                                                (other,)))
+    assert supplier_of(shop, 1) == "BT Ltd"
+
+
+def test_untagged_write_invalidates(shop):
+    today = datetime.datetime.now(datetime.timezone.utc).date()
+    sell(shop, 1, 4)
+    assert shop.reorder.suggestions(today, all_products=True)["daily_velocity"].iloc[0] > 0
+
+    # No table list: e.g. a rollup rebuild or another process clearing history
+    shop.db.write(lambda cursor: cursor.execute("DELETE FROM rollup_product_daily"))
+    assert shop.reorder.suggestions(today, all_products=True)["daily_velocity"].iloc[0] == 0